@@ -0,0 +1,171 @@
+"""
+Benchmark reading training history from the partitioned Parquet store.
+
+Writes synthetic exporter samples (a 30s step, several series per metric)
+for --days into a store laid out like the exporter's (date and metric
+partitions, zstd Parquet; notebook/metrics_store.py) and, unless
+--skip-csv, into one CSV of the former exporter's format. Then reads the
+training frame (per-minute means of the five model metrics) over the
+whole range and over its last week, each in a fresh process, and
+reports wall time and peak RSS. The store is read with read_resampled(),
+the CSV with pandas read_csv and a pivot, as before.
+
+The store path can be a directory (default: a temporary one) or an
+s3://bucket/prefix URI on an S3-compatible server (S3_ENDPOINT_URL).
+
+Usage:
+    python bench_metrics_store.py --days 90 --series 10
+    S3_ENDPOINT_URL=http://localhost:9000 python bench_metrics_store.py --store s3://metrics/bench
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'notebook'))
+
+from training_data import NUMERIC_COLUMNS  # noqa: E402
+
+START = np.datetime64('2026-01-01T00:00:00', 's')
+STEP = 30
+# The exporter also writes metrics the model does not use; reads skip them
+METRICS = NUMERIC_COLUMNS + ['cpu_allocation_efficiency', 'memory_allocation_efficiency',
+                             'network_latency']
+
+
+def day_table(day: int, series: int, seed: int):
+    """One day of samples with the store's columns and partition columns"""
+    import pyarrow as pa
+
+    from metrics_store import LABEL_COLUMNS
+
+    rng = np.random.default_rng(seed + day)
+    per_series = 86400 // STEP
+    times = (START + np.timedelta64(day, 'D')).astype(np.int64) + STEP * np.arange(per_series)
+    count = per_series * series * len(METRICS)
+    timestamps = np.tile(times, series * len(METRICS)) * 1000
+    columns = {
+        'timestamp': pa.array(timestamps, pa.timestamp('ms', tz='UTC')),
+        'value': pa.array(rng.normal(50.0, 10.0, count)),
+    }
+    pods = np.repeat(np.tile(np.arange(series), len(METRICS)), per_series)
+    for label in LABEL_COLUMNS:
+        if label == 'pod':
+            indices, values = pods, [f"pod-{i}" for i in range(series)]
+        else:
+            indices, values = np.zeros(count), ['default']
+        columns[label] = pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), values)
+    columns['labels'] = pa.nulls(count, pa.string())
+    columns['date'] = pa.array([str(START.astype('datetime64[D]') + day)] * count, pa.string())
+    columns['metric'] = pa.array(np.repeat(METRICS, per_series * series))
+    return pa.table(columns)
+
+
+def write_data(store: str, csv_path: str, days: int, series: int, seed: int):
+    from metrics_store import write_samples
+
+    for day in range(days):
+        table = day_table(day, series, seed)
+        write_samples(table, store, f"bench-{day}")
+        if csv_path:
+            frame = table.drop(['date', 'labels']).to_pandas()
+            frame = frame.rename(columns={'metric': 'metric_name'})
+            frame['timestamp'] = (frame['timestamp'].dt.tz_localize(None)
+                                  .dt.strftime('%Y-%m-%dT%H:%M:%S'))
+            frame.to_csv(csv_path, mode='a', header=day == 0, index=False)
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def worker(kind: str, path: str, start: str, end: str) -> dict:
+    import pandas as pd
+
+    from metrics_store import read_resampled
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if kind == 'store':
+        frame = read_resampled(path, start, end)
+    else:
+        samples = pd.read_csv(path, parse_dates=['timestamp'])
+        samples = samples[(samples['timestamp'] >= start) & (samples['timestamp'] < end)
+                          & samples['metric_name'].isin(NUMERIC_COLUMNS)]
+        frame = samples.pivot_table(index=pd.Grouper(key='timestamp', freq='1min'),
+                                    columns='metric_name', values='value', aggfunc='mean')
+        frame = frame[NUMERIC_COLUMNS].dropna().reset_index()
+    elapsed = time.perf_counter() - started
+    return {'seconds': elapsed, 'rows': len(frame),
+            'checksum': float(frame[NUMERIC_COLUMNS].to_numpy().sum()),
+            'import_rss_mb': baseline / 1024,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def measure(kind: str, path: str, start, end) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', kind, path, str(start), str(end)],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--series', type=int, default=4, help="series per metric")
+    parser.add_argument('--store', help="store directory or s3:// URI (default: temporary)")
+    parser.add_argument('--skip-csv', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--worker', nargs=4, metavar=('KIND', 'PATH', 'START', 'END'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(*args.worker)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='bench-metrics-store-')
+    try:
+        store = args.store or os.path.join(workdir, 'store')
+        csv_path = None if args.skip_csv else os.path.join(workdir, 'prometheus_metrics.csv')
+        samples = args.days * args.series * len(METRICS) * 86400 // STEP
+        print(f"days={args.days} series/metric={args.series} metrics={len(METRICS)} "
+              f"samples={samples}")
+        started = time.perf_counter()
+        write_data(store, csv_path, args.days, args.series, args.seed)
+        print(f"written in {time.perf_counter() - started:.1f}s")
+        if not store.startswith('s3://'):
+            print(f"store: {directory_size(store) / 2**20:10.1f} MB")
+        if csv_path:
+            print(f"csv:   {os.path.getsize(csv_path) / 2**20:10.1f} MB")
+
+        end = START + np.timedelta64(args.days, 'D')
+        ranges = {'all': (START, end), 'last week': (max(START, end - np.timedelta64(7, 'D')), end)}
+        for name, (start, stop) in ranges.items():
+            results = {'store': measure('store', store, start, stop)}
+            if csv_path:
+                results['csv'] = measure('csv', csv_path, start, stop)
+            for kind, result in results.items():
+                print(f"{name:>9} {kind:>5}: {result['seconds']:8.2f} s  "
+                      f"peak RSS {result['peak_rss_mb']:7.0f} MB "
+                      f"(+{result['peak_rss_mb'] - result['import_rss_mb']:.0f} MB)  "
+                      f"rows {result['rows']}")
+            if csv_path:
+                assert results['store']['rows'] == results['csv']['rows']
+                assert np.isclose(results['store']['checksum'], results['csv']['checksum']), \
+                    "store and CSV reads diverged"
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
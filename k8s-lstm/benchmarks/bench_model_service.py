@@ -0,0 +1,389 @@
+"""
+Benchmark the model service (deployment/main.py) against stored baselines.
+
+Sweeps inference backend, batch size, sequence length and concurrency,
+with the FastAPI app driven in-process (through its ASGI interface, no
+network) and over HTTP (a uvicorn process), and records latency
+percentiles and throughput per scenario, plus peak RSS and
+startup-to-ready time per backend. Results are written as JSON and
+compared against a baseline: any figure worse than the baseline by more
+than --tolerance is reported as a regression and the exit status is 1.
+Baselines are only comparable on the same host and settings; the
+versions of TensorFlow, FastAPI & co. are recorded with them.
+
+Batch size 1 goes to /predict, larger batches to /predict/batch. Every
+request carries fresh random sequences, so the prediction cache never
+answers it. Other service settings (DYNAMIC_BATCHING, INFERENCE_WORKERS,
+...) are read from the environment as usual.
+
+Usage:
+    python bench_model_service.py --model-dir ../deployment/models --backends keras,onnx \\
+        --baseline baselines/model_service.json --output results.json
+    python bench_model_service.py --model-dir ../deployment/models \\
+        --save-baseline baselines/model_service.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEPLOYMENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'deployment')
+sys.path.insert(0, DEPLOYMENT_DIR)
+
+from preprocessing import FEATURE_NAMES  # noqa: E402
+from wire_format import TENSOR_CONTENT_TYPE, encode_tensor  # noqa: E402
+
+MODEL_FILES = {'keras': 'lstm_model.h5', 'tflite': 'lstm_model.tflite', 'onnx': 'lstm_model.onnx'}
+MODES = ('inprocess', 'http')
+
+# Roughly the value ranges of the notebook dataset, in FEATURE_NAMES order
+FEATURE_RANGES = ((0.0, 1000.0), (40.0, 90.0), (0.0, 200000.0))
+
+# Packages whose upgrades the baselines should catch
+PACKAGES = ('tensorflow', 'tensorflow-cpu', 'onnxruntime', 'tflite-runtime', 'fastapi',
+            'starlette', 'pydantic', 'uvicorn', 'httpx', 'numpy')
+
+# Result fields compared with the baseline; +1: higher is worse, -1: lower is worse
+SCENARIO_FIELDS = {'p50_ms': 1, 'p95_ms': 1, 'p99_ms': 1, 'throughput_rps': -1}
+SERVER_FIELDS = {'startup_seconds': 1, 'peak_rss_mb': 1}
+
+
+def parse_list(text: str) -> List[int]:
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def scenario_key(mode: str, backend: str, scenario: Dict) -> str:
+    return (f"{mode}/{backend}/batch{scenario['batch_size']}"
+            f"/seq{scenario['sequence_length']}/conc{scenario['concurrency']}")
+
+
+def make_payloads(count: int, batch_size: int, sequence_length: int, wire: str, seed: int = 0):
+    """Request bodies of fresh random sequences, and the path and headers to send them with"""
+    rng = np.random.default_rng(seed)
+    low, high = np.array(FEATURE_RANGES).T
+    shape = (count, batch_size, sequence_length, len(FEATURE_NAMES))
+    data = rng.uniform(low, high, shape).astype(np.float32)
+    if batch_size == 1:
+        path, data = '/predict', data[:, 0]
+    else:
+        path = '/predict/batch'
+    if wire == 'binary':
+        headers = {'Content-Type': TENSOR_CONTENT_TYPE, 'Accept': TENSOR_CONTENT_TYPE}
+        bodies = [encode_tensor(array) for array in data]
+    else:
+        headers = {'Content-Type': 'application/json'}
+        bodies = [json.dumps({'data': array.tolist()}).encode() for array in data]
+    return path, headers, bodies
+
+
+async def run_scenario(client, scenario: Dict, args) -> Dict:
+    """Closed loop: concurrency clients send the scenario's requests back to back"""
+    path, headers, bodies = make_payloads(
+        args.warmup + args.requests, scenario['batch_size'], scenario['sequence_length'], args.wire)
+    result = dict(scenario)
+
+    # Warmup, which also tells whether the backend takes this shape at all
+    # (the TFLite model has a fixed sequence length)
+    for body in bodies[:args.warmup]:
+        response = await client.post(path, content=body, headers=headers)
+        if response.status_code != 200:
+            result['error'] = f"{response.status_code} {response.text[:200]}"
+            return result
+
+    queue = iter(bodies[args.warmup:])
+    latencies, statuses = [], {}
+
+    async def client_loop():
+        for body in queue:
+            start = time.perf_counter()
+            response = await client.post(path, content=body, headers=headers)
+            latency = time.perf_counter() - start
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(latency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(scenario['concurrency'])))
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        result['error'] = f"no successful requests: {statuses}"
+        return result
+    p50, p95, p99 = (np.percentile(latencies, [50, 95, 99]) * 1000).tolist()
+    result.update({
+        'requests': args.requests,
+        'errors': args.requests - len(latencies),
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'mean_ms': float(np.mean(latencies) * 1000),
+        'throughput_rps': len(latencies) / elapsed,
+        'sequences_per_second': len(latencies) * scenario['batch_size'] / elapsed,
+    })
+    return result
+
+
+async def run_scenarios(client, scenarios: List[Dict], args, label: str) -> List[Dict]:
+    results = []
+    for scenario in scenarios:
+        result = await run_scenario(client, scenario, args)
+        if 'error' in result:
+            print(f"  {label} batch={scenario['batch_size']} seq={scenario['sequence_length']} "
+                  f"conc={scenario['concurrency']}: skipped ({result['error']})", file=sys.stderr)
+        else:
+            print(f"  {label} batch={scenario['batch_size']} seq={scenario['sequence_length']} "
+                  f"conc={scenario['concurrency']}: p50 {result['p50_ms']:.1f}ms "
+                  f"p99 {result['p99_ms']:.1f}ms {result['throughput_rps']:.0f} req/s",
+                  file=sys.stderr)
+        results.append(result)
+    return results
+
+
+def service_env(args, backend: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        'INFERENCE_BACKEND': backend,
+        'MODEL_PATH': os.path.abspath(os.path.join(args.model_dir, MODEL_FILES[backend])),
+        'STREAM_MODEL_PATH': os.path.abspath(os.path.join(args.model_dir, MODEL_FILES['keras'])),
+        'SCALERS_PATH': os.path.abspath(args.scalers_path),
+        'LOG_LEVEL': env.get('LOG_LEVEL', 'WARNING'),
+    })
+    return env
+
+
+def worker(config: Dict):
+    """
+    In-process mode, run in a fresh interpreter per backend (main.py
+    reads its settings at import): import the app, run its startup and
+    drive it through httpx's ASGI transport. Prints the results as JSON.
+    """
+    import httpx
+
+    args = argparse.Namespace(**config['args'])
+    started = time.perf_counter()
+    import main
+
+    async def run():
+        await main.app.router.startup()
+        ready = time.perf_counter() - started
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench',
+                                         timeout=args.timeout) as client:
+                results = await run_scenarios(client, config['scenarios'], args,
+                                              f"inprocess/{config['backend']}")
+        finally:
+            await main.app.router.shutdown()
+        return ready, results
+
+    ready, results = asyncio.run(run())
+    print(json.dumps({
+        'startup_seconds': ready,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'results': results,
+    }))
+
+
+def run_inprocess(args, backend: str, scenarios: List[Dict]):
+    config = {'backend': backend, 'scenarios': scenarios, 'args': vars(args)}
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config)],
+        env=service_env(args, backend), cwd=DEPLOYMENT_DIR, stdout=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"in-process benchmark of {backend} exited with {process.returncode}")
+    report = json.loads(process.stdout.decode().strip().splitlines()[-1])
+    return {'startup_seconds': report['startup_seconds'],
+            'peak_rss_mb': report['peak_rss_mb']}, report['results']
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """High-water RSS of a running process (Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_http(args, backend: str, scenarios: List[Dict]):
+    import httpx
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    started = time.perf_counter()
+    service = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=DEPLOYMENT_DIR, env=service_env(args, backend))
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + args.startup_timeout
+        while True:
+            if service.poll() is not None:
+                raise RuntimeError(f"{backend} model service exited with {service.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(
+                    f"{backend} model service not ready after {args.startup_timeout}s")
+            try:
+                if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        ready = time.perf_counter() - started
+
+        async def run():
+            limits = httpx.Limits(max_connections=max(s['concurrency'] for s in scenarios))
+            async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                         timeout=args.timeout) as client:
+                return await run_scenarios(client, scenarios, args, f"http/{backend}")
+
+        results = asyncio.run(run())
+        return {'startup_seconds': ready, 'peak_rss_mb': peak_rss_mb(service.pid)}, results
+    finally:
+        service.terminate()
+        service.wait()
+
+
+def environment() -> Dict:
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    return {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'versions': versions,
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions of report against baseline, beyond the relative tolerance"""
+    regressions = []
+    for section, fields in (('servers', SERVER_FIELDS), ('scenarios', SCENARIO_FIELDS)):
+        previous = baseline.get(section, {})
+        for key, current in report[section].items():
+            if key not in previous or 'error' in current or 'error' in previous[key]:
+                continue
+            for field, direction in fields.items():
+                old, new = previous[key].get(field), current.get(field)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if change * direction > tolerance:
+                    regressions.append(f"{key} {field}: {old:.2f} -> {new:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--model-dir', default=os.path.join(DEPLOYMENT_DIR, 'models'),
+                        help="directory with lstm_model.h5 / .tflite / .onnx")
+    parser.add_argument('--scalers-path', default=os.path.join(DEPLOYMENT_DIR, 'scalers'))
+    parser.add_argument('--backends', default='keras', help="comma separated: keras,tflite,onnx")
+    parser.add_argument('--modes', default=','.join(MODES), help="comma separated: inprocess,http")
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--sequence-lengths', default='1,12,24,96')
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--requests', type=int, default=100, help="measured requests per scenario")
+    parser.add_argument('--warmup', type=int, default=5, help="unmeasured requests per scenario")
+    parser.add_argument('--wire', choices=('json', 'binary'), default='json')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    parser.add_argument('--output', default=None, help="write the results JSON here")
+    parser.add_argument('--baseline', default=None, help="compare against this results JSON")
+    parser.add_argument('--save-baseline', default=None, help="store the results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="relative change tolerated before a figure counts as a regression")
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(json.loads(args.worker))
+        return
+
+    backends = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    for backend in backends:
+        if backend not in MODEL_FILES:
+            parser.error(f"unknown backend {backend}, expected one of {', '.join(MODEL_FILES)}")
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode}, expected one of {', '.join(MODES)}")
+    scenarios = [{'batch_size': batch_size, 'sequence_length': length, 'concurrency': concurrency}
+                 for batch_size in parse_list(args.batch_sizes)
+                 for length in parse_list(args.sequence_lengths)
+                 for concurrency in parse_list(args.concurrency)]
+
+    report = {'environment': environment(),
+              'settings': {name: getattr(args, name) for name in (
+                  'requests', 'warmup', 'wire', 'batch_sizes', 'sequence_lengths', 'concurrency')},
+              'servers': {}, 'scenarios': {}}
+    for backend in backends:
+        for mode in modes:
+            run = run_inprocess if mode == 'inprocess' else run_http
+            server, results = run(args, backend, scenarios)
+            report['servers'][f"{mode}/{backend}"] = server
+            print(f"{mode}/{backend}: ready in {server['startup_seconds']:.2f}s, "
+                  f"peak RSS {server['peak_rss_mb'] or 0:.0f} MB", file=sys.stderr)
+            for result in results:
+                report['scenarios'][scenario_key(mode, backend, result)] = result
+
+    print(f"{'scenario':44} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'seq/s':>9}")
+    for key, result in report['scenarios'].items():
+        if 'error' in result:
+            print(f"{key:44} skipped: {result['error']}")
+            continue
+        print(f"{key:44} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {result['p99_ms']:8.1f} "
+              f"{result['throughput_rps']:8.1f} {result['sequences_per_second']:9.1f}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if not args.baseline:
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; store one with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    old_versions = baseline.get('environment', {}).get('versions', {})
+    for package, version in report['environment']['versions'].items():
+        if old_versions.get(package, version) != version:
+            print(f"{package}: {old_versions[package]} -> {version}")
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {args.tolerance:.0%} of the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+"""
+Fake Prometheus serving recorded metrics on a virtual clock.
+
+Answers /api/v1/query and /api/v1/query_range from the notebook dataset
+(kubernetes_performance_metrics_dataset.csv), from the Parquet store the
+metrics exporter (k8s-manifests/metrics-data/data-sync.yml) writes, or
+from a CSV of the former exporter, as if the recording were happening
+now. The virtual clock starts at the first
+sample and either runs freely at --speed times real time or is advanced
+step by step (replay.py).
+
+Queries are matched, not evaluated: a query is recognised as one of the
+collector's METRICS_QUERIES, either raw, wrapped in an aggregation
+("avg by (namespace) (...)") or as a recording rule name
+("namespace:disk_io:avg"), or as a bare metric name. Instant queries
+return the latest sample of every series within the lookback window,
+aggregated as asked; unknown queries return an empty result.
+
+Usage:
+    python fake_prometheus.py --data ../notebook/data/kubernetes_performance_metrics_dataset.csv \\
+        --speed 100 --port 9090
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+DATASET_TIME_FORMAT = '%m/%d/%Y %H:%M'
+
+# Numeric columns of the notebook dataset, each replayed as one metric
+DATASET_METRICS = (
+    'cpu_allocation_efficiency', 'memory_allocation_efficiency', 'disk_io',
+    'network_latency', 'node_temperature', 'node_cpu_usage', 'node_memory_usage',
+    'pod_lifetime_seconds',
+)
+
+AGGREGATIONS = ('avg', 'sum', 'max', 'min', 'count')
+
+_AGGREGATED = re.compile(
+    r'^(avg|sum|max|min|count)\s*(?:by\s*\(([\w\s,]*)\))?\s*\((.*)\)$', re.S)
+_RECORDING_RULE = re.compile(r'^(\w+):(\w+):(\w+)$')
+
+
+def _normalize(query: str) -> str:
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+class VirtualClock:
+    """
+    Time of the recording being replayed. Runs at speed times real time
+    from start (0: stands still) and moves on by advance(), so a driver
+    can step it exactly one collection interval per cycle.
+    """
+
+    def __init__(self, start: float, speed: float = 0.0):
+        self.start = start
+        self.speed = speed
+        self._origin = time.monotonic()
+        self._offset = 0.0
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        with self._lock:
+            elapsed = (time.monotonic() - self._origin) * self.speed if self.speed else 0.0
+            return self.start + self._offset + elapsed
+
+    def advance(self, seconds: float):
+        with self._lock:
+            self._offset += seconds
+
+
+class SeriesSet:
+    """Every sample of one metric: parallel arrays sorted by time"""
+
+    def __init__(self,
+                 labels: List[Dict[str, str]],
+                 series: Sequence[int],
+                 times: Sequence[float],
+                 values: Sequence[float]):
+        order = np.argsort(np.asarray(times, dtype=np.float64), kind='stable')
+        self.labels = labels
+        self.series = np.asarray(series, dtype=np.intp)[order]
+        self.times = np.asarray(times, dtype=np.float64)[order]
+        self.values = np.asarray(values, dtype=np.float64)[order]
+        self._groups: Dict[Tuple[str, ...], Tuple[np.ndarray, List[Dict[str, str]]]] = {}
+
+    def groups(self, by: Tuple[str, ...]) -> Tuple[np.ndarray, List[Dict[str, str]]]:
+        """Group of every series when aggregating by the given labels, and the group labels"""
+        cached = self._groups.get(by)
+        if cached is None:
+            keys: Dict[Tuple[str, ...], int] = {}
+            codes = np.fromiter(
+                (keys.setdefault(tuple(labels.get(label, '') for label in by), len(keys))
+                 for labels in self.labels), dtype=np.intp, count=len(self.labels))
+            group_labels = [{label: value for label, value in zip(by, key) if value}
+                            for key in keys]
+            cached = self._groups[by] = (codes, group_labels)
+        return cached
+
+    def latest(self, t: float, lookback: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Series with a sample in (t - lookback, t] and the value of their newest one"""
+        lo = np.searchsorted(self.times, t - lookback, side='right')
+        hi = np.searchsorted(self.times, t, side='right')
+        # Newest first, so unique() keeps each series' latest sample
+        series, first = np.unique(self.series[lo:hi][::-1], return_index=True)
+        return series, self.values[hi - 1 - first]
+
+
+class ReplayData:
+    """Recorded metrics by name, with the time span they cover"""
+
+    def __init__(self, metrics: Dict[str, SeriesSet]):
+        self.metrics = metrics
+        times = np.concatenate([s.times for s in metrics.values()])
+        self.start = float(times.min())
+        self.end = float(times.max())
+        steps = np.diff(np.unique(times))
+        # Sampling interval of the recording (the dataset has one row set per minute)
+        self.resolution = float(steps.min()) if steps.size else 60.0
+
+    def targets(self, label: str) -> List[str]:
+        return sorted({labels[label] for s in self.metrics.values()
+                       for labels in s.labels if labels.get(label)})
+
+
+def load_dataset_csv(path: str, copies: int = 1) -> ReplayData:
+    """
+    The notebook dataset: one row per pod sample, every numeric column a
+    metric labelled with pod and namespace. copies > 1 replays the data
+    that many times over as extra namespaces ("dev-1", ...), each copy
+    rotated in time by one more sampling interval so they differ.
+    """
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    times = np.array([datetime.strptime(row['timestamp'], DATASET_TIME_FORMAT).timestamp()
+                      for row in rows])
+    start, end = times.min(), times.max()
+    steps = np.diff(np.unique(times))
+    resolution = steps.min() if steps.size else 60.0
+
+    metrics = {}
+    for metric in DATASET_METRICS:
+        if metric not in rows[0]:
+            continue
+        values = np.array([float(row[metric] or 'nan') for row in rows])
+        labels, series, sample_times, sample_values = [], [], [], []
+        for copy in range(copies):
+            suffix = f"-{copy}" if copy else ''
+            first = len(labels)
+            labels.extend({'pod': row['pod_name'] + suffix,
+                           'namespace': row['namespace'] + suffix} for row in rows)
+            series.append(np.arange(first, first + len(rows)))
+            sample_times.append(
+                start + (times - start + copy * resolution) % (end - start + resolution))
+            sample_values.append(values)
+        metrics[metric] = SeriesSet(labels, np.concatenate(series),
+                                    np.concatenate(sample_times), np.concatenate(sample_values))
+    return ReplayData(metrics)
+
+
+def load_exporter_csv(path: str) -> ReplayData:
+    """The exporter output: timestamp, metric_name, value and one column per label"""
+    samples: Dict[str, Tuple[Dict, List, List, List]] = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            metric = row.pop('metric_name')
+            t = datetime.fromisoformat(row.pop('timestamp')).timestamp()
+            value = float(row.pop('value'))
+            series_ids, series, times, values = samples.setdefault(metric, ({}, [], [], []))
+            key = tuple(sorted((label, v) for label, v in row.items() if v))
+            series.append(series_ids.setdefault(key, len(series_ids)))
+            times.append(t)
+            values.append(value)
+    return ReplayData({
+        metric: SeriesSet([dict(key) for key in series_ids], series, times, values)
+        for metric, (series_ids, series, times, values) in samples.items()})
+
+
+def load_exporter_store(uri: str) -> ReplayData:
+    """The exporter's Parquet store (notebook/metrics_store.py), a directory or s3:// URI"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'notebook'))
+    from metrics_store import LABEL_COLUMNS, read_samples
+
+    table = read_samples(uri)
+    metrics = {}
+    for metric in sorted(set(table.column('metric').to_pylist())):
+        samples = table.filter(pc.equal(table.column('metric'), metric))
+        label_values = zip(*(samples.column(label).to_pylist() for label in LABEL_COLUMNS))
+        series_ids: Dict[Tuple, int] = {}
+        series = [series_ids.setdefault((values, extra), len(series_ids))
+                  for values, extra in zip(label_values, samples.column('labels').to_pylist())]
+        labels = [{**{label: v for label, v in zip(LABEL_COLUMNS, values) if v},
+                   **json.loads(extra or '{}')} for values, extra in series_ids]
+        times = samples.column('timestamp').cast(pa.int64()).to_numpy() / 1000.0
+        metrics[metric] = SeriesSet(labels, series, times,
+                                    samples.column('value').to_numpy(zero_copy_only=False))
+    return ReplayData(metrics)
+
+
+def load_replay_data(path: str, copies: int = 1) -> ReplayData:
+    """
+    The exporter's store (a directory or s3:// URI) or either CSV format,
+    told apart by the former exporter's metric_name column
+    """
+    if os.path.isdir(path) or path.startswith('s3://'):
+        if copies != 1:
+            raise ValueError("copies is only supported for the notebook dataset")
+        return load_exporter_store(path)
+    with open(path, newline='') as f:
+        header = next(csv.reader(f))
+    if 'metric_name' in header:
+        if copies != 1:
+            raise ValueError("copies is only supported for the notebook dataset")
+        return load_exporter_csv(path)
+    return load_dataset_csv(path, copies)
+
+
+class FakePrometheus:
+    """Evaluates the collector's queries over ReplayData at virtual time"""
+
+    def __init__(self,
+                 data: ReplayData,
+                 clock: VirtualClock,
+                 queries: Optional[Dict[str, str]] = None,
+                 lookback: Optional[float] = None):
+        self.data = data
+        self.clock = clock
+        # Prometheus looks back 5m for the latest sample; the recording's
+        # own resolution keeps one minute of the dataset from blending into the next
+        self.lookback = lookback or data.resolution
+        self._raw = {_normalize(query): name for name, query in (queries or {}).items()}
+        self.requests = 0
+
+    def parse(self, query: str) -> Tuple[Optional[str], Optional[str], Tuple[str, ...]]:
+        """(metric, aggregation or None, by-labels) of a query; metric None if unknown"""
+        query = _normalize(query)
+        match = _RECORDING_RULE.match(query)
+        if match:
+            level, metric, aggregation = match.groups()
+            by = () if level == 'cluster' else (level,)
+            return (metric if metric in self.data.metrics else None), aggregation, by
+        aggregation, by = None, ()
+        match = _AGGREGATED.match(query)
+        if match:
+            aggregation = match.group(1)
+            by = tuple(label.strip() for label in (match.group(2) or '').split(',')
+                       if label.strip())
+            query = _normalize(match.group(3))
+        metric = self._raw.get(query, query)
+        return (metric if metric in self.data.metrics else None), aggregation, by
+
+    def evaluate(self,
+                 metric: str,
+                 t: float,
+                 aggregation: Optional[str] = None,
+                 by: Tuple[str, ...] = ()) -> List[Tuple[Dict[str, str], float]]:
+        """(labels, value) of every output series at virtual time t"""
+        series_set = self.data.metrics[metric]
+        series, values = series_set.latest(t, self.lookback)
+        if aggregation is None:
+            return [(series_set.labels[i], v) for i, v in zip(series.tolist(), values.tolist())]
+
+        codes, group_labels = series_set.groups(by)
+        codes = codes[series]
+        present = np.unique(codes)
+        if aggregation in ('sum', 'avg', 'count'):
+            counts = np.bincount(codes, minlength=len(group_labels))
+            if aggregation == 'count':
+                result = counts.astype(np.float64)
+            else:
+                result = np.bincount(codes, weights=values, minlength=len(group_labels))
+                if aggregation == 'avg':
+                    result = result / np.maximum(counts, 1)
+        else:
+            reduce = np.maximum if aggregation == 'max' else np.minimum
+            result = np.full(len(group_labels), -np.inf if aggregation == 'max' else np.inf)
+            reduce.at(result, codes, values)
+        return [(group_labels[g], v) for g, v in zip(present.tolist(), result[present].tolist())]
+
+    def instant(self, query: str, t: Optional[float] = None) -> List[Dict]:
+        """Result of an instant query; t is in the caller's (wall clock) time"""
+        virtual = self.clock.now()
+        offset = 0.0 if t is None else virtual - time.time()
+        at = virtual if t is None else t + offset
+        metric, aggregation, by = self.parse(query)
+        if metric is None:
+            return []
+        return [{'metric': labels, 'value': [at - offset, repr(value)]}
+                for labels, value in self.evaluate(metric, at, aggregation, by)]
+
+    def range(self, query: str, start: float, end: float, step: float) -> List[Dict]:
+        """
+        Result of a range query. start and end are wall clock times and are
+        read relative to now, so "the last 10 minutes" of the recording
+        come back, with timestamps in wall clock time.
+        """
+        offset = self.clock.now() - time.time()
+        metric, aggregation, by = self.parse(query)
+        if metric is None or step <= 0:
+            return []
+        matrix: Dict[Tuple, Dict] = {}
+        for t in np.arange(start, end + step / 2, step).tolist():
+            for labels, value in self.evaluate(metric, t + offset, aggregation, by):
+                key = tuple(sorted(labels.items()))
+                entry = matrix.setdefault(key, {'metric': labels, 'values': []})
+                entry['values'].append([t, repr(value)])
+        return list(matrix.values())
+
+    def serve(self, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+        """Start the HTTP API in a background thread; port 0 picks a free one"""
+        server = ThreadingHTTPServer((host, port), _handler(self))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='fake-prometheus', daemon=True).start()
+        return server
+
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def _parse_step(value: str) -> float:
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def _handler(prometheus: FakePrometheus):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, as the collector's pooled transport expects
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def _params(self) -> Dict[str, str]:
+            params = parse_qs(urlparse(self.path).query)
+            if self.command == 'POST':
+                length = int(self.headers.get('Content-Length') or 0)
+                params.update(parse_qs(self.rfile.read(length).decode()))
+            return {name: values[-1] for name, values in params.items()}
+
+        def _reply(self, status: int, body: Dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self):
+            path = urlparse(self.path).path
+            params = self._params()
+            prometheus.requests += 1
+            try:
+                if path == '/api/v1/query':
+                    t = _parse_time(params['time']) if params.get('time') else None
+                    result = {'resultType': 'vector',
+                              'result': prometheus.instant(params['query'], t)}
+                elif path == '/api/v1/query_range':
+                    result = {'resultType': 'matrix',
+                              'result': prometheus.range(params['query'],
+                                                         _parse_time(params['start']),
+                                                         _parse_time(params['end']),
+                                                         _parse_step(params['step']))}
+                elif path in ('/-/healthy', '/-/ready'):
+                    self._reply(200, {'status': 'success'})
+                    return
+                else:
+                    self._reply(404, {'status': 'error', 'errorType': 'not_found',
+                                      'error': f"unknown path {path}"})
+                    return
+            except (KeyError, ValueError) as e:
+                self._reply(400, {'status': 'error', 'errorType': 'bad_data', 'error': str(e)})
+                return
+            self._reply(200, {'status': 'success', 'data': result})
+
+        do_GET = _handle
+        do_POST = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--data', required=True,
+                        help="notebook dataset, exporter store directory / s3:// URI "
+                             "or former exporter CSV (prometheus_metrics.csv)")
+    parser.add_argument('--copies', type=int, default=1,
+                        help="replay the dataset this many times as extra namespaces")
+    parser.add_argument('--speed', type=float, default=100.0,
+                        help="virtual seconds per real second")
+    parser.add_argument('--lookback', type=float, default=None,
+                        help="seconds an instant query looks back (default: data resolution)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9090)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'metrics-collector'))
+    from prometheus_collector import METRICS_QUERIES
+
+    data = load_replay_data(args.data, args.copies)
+    clock = VirtualClock(data.start, args.speed)
+    prometheus = FakePrometheus(data, clock, METRICS_QUERIES, args.lookback)
+    server = prometheus.serve(args.host, args.port)
+    print(f"Serving {len(data.metrics)} metrics, {datetime.fromtimestamp(data.start)} to "
+          f"{datetime.fromtimestamp(data.end)}, at {args.speed:g}x on "
+          f"http://{args.host}:{server.server_address[1]}")
+    try:
+        while clock.now() <= data.end + prometheus.lookback:
+            time.sleep(1)
+        print("Reached the end of the recording")
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""
+Replay recorded metrics through the collector -> model -> alert pipeline.
+
+Serves the notebook dataset (or exporter output) from a fake Prometheus
+(fake_prometheus.py) and runs the real PrometheusMetricsCollector
+against it, one collection cycle per collection interval of virtual
+time, as fast as the pipeline allows (or at --speed). Predictions come
+from the model service (started here, or at --model URL) or the
+embedded model; alerts go through the real AlertManager to stub Slack
+and deployment trigger webhooks.
+
+Reports cycles per second, the virtual speed reached, the latency from
+a sample becoming visible to its alert arriving at the webhook, the
+alert counts, and how far ahead of (or behind) the actual threshold
+breaches in the recording the alerts came.
+
+Any collector or alert setting is read from the environment as usual
+(SEQUENCE_LENGTH, ALERT_CPU_THRESHOLD, ALERT_RULES, MODEL_WIRE_FORMAT,
+...). Alert cooldowns are wall clock seconds, so ALERT_COOLDOWN_SECONDS
+defaults to 0 here. The range query cache is turned off: virtual time
+moves faster than the wall clock it keys on.
+
+Usage:
+    python replay.py --copies 50 --model-path ./models/lstm_model.h5 --scalers-path ./scalers
+    python replay.py --model embedded --target-label '' --time-series --json
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'metrics-collector'))
+
+from fake_prometheus import FakePrometheus, VirtualClock, load_replay_data  # noqa: E402
+
+DEFAULT_DATA = os.path.join(
+    HERE, '..', 'notebook', 'data', 'kubernetes_performance_metrics_dataset.csv')
+DEPLOYMENT_DIR = os.path.join(HERE, '..', 'deployment')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class WebhookStub:
+    """Slack and deployment trigger endpoints recording what arrives and when"""
+
+    def __init__(self):
+        self.slack: List[tuple] = []  # (wall time, message text)
+        self.triggers: List[float] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+                if self.path == '/slack':
+                    stub.slack.append((time.time(), body.get('text', '')))
+                else:
+                    stub.triggers.append(time.time())
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def delivered(self) -> Dict[tuple, float]:
+        """Arrival time of every alert, keyed (metric label, target, timestamp)"""
+        arrivals = {}
+        for received, text in self.slack:
+            label = target = None
+            for line in text.splitlines():
+                if line.startswith('*') and line.endswith(':'):
+                    # "*CPU Usage* (prod):" or "*CPU Usage*:"
+                    label, _, target = line[1:-1].partition('*')
+                    target = target.strip()[1:-1]
+                elif line.startswith('• Time: ') and label is not None:
+                    arrivals.setdefault((label, target, line[len('• Time: '):]), received)
+        return arrivals
+
+
+def start_model_service(args) -> subprocess.Popen:
+    """Run the model service (uvicorn main:app) and wait until it is healthy"""
+    port = free_port()
+    env = dict(os.environ)
+    if args.model_path:
+        env['MODEL_PATH'] = env['STREAM_MODEL_PATH'] = os.path.abspath(args.model_path)
+    if args.scalers_path:
+        env['SCALERS_PATH'] = os.path.abspath(args.scalers_path)
+    log = open(args.service_log, 'w') if args.service_log else subprocess.DEVNULL
+    service = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=DEPLOYMENT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+
+    import requests
+    deadline = time.monotonic() + args.service_timeout
+    while time.monotonic() < deadline:
+        if service.poll() is not None:
+            raise SystemExit(f"Model service exited with {service.returncode}; "
+                             f"rerun with --service-log to see why")
+        try:
+            if requests.get(f"{url}/health", timeout=1).status_code == 200:
+                service.url = url
+                return service
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    service.terminate()
+    raise SystemExit(f"Model service not healthy after {args.service_timeout:.0f}s")
+
+
+def percentiles(values, unit_scale=1000.0, unit='ms') -> str:
+    if not len(values):
+        return 'n/a'
+    p50, p95 = np.percentile(values, [50, 95]) * unit_scale
+    return f"p50 {p50:.1f}{unit}  p95 {p95:.1f}{unit}  max {np.max(values) * unit_scale:.1f}{unit}"
+
+
+def detection(truth: Dict[tuple, np.ndarray],
+              fired: Dict[tuple, List[int]],
+              interval: float) -> Dict:
+    """
+    Compare alerts with the breaches actually recorded. For every breach
+    (a run of cycles above the rule's threshold), the first alert since
+    the value was last below the threshold detects it; the lag is that
+    alert's virtual time minus the breach start, negative when it was
+    predicted ahead.
+    """
+    lags, breaches = [], 0
+    for key, above in truth.items():
+        cycles = sorted(fired.get(key, ()))
+        edges = np.flatnonzero(np.diff(np.concatenate([[False], above, [False]]).astype(np.int8)))
+        previous_end = -1
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            breaches += 1
+            i = bisect_right(cycles, previous_end)
+            if i < len(cycles) and cycles[i] < end:
+                lags.append((cycles[i] - start) * interval)
+            previous_end = end - 1
+    return {'breaches': breaches, 'detected': len(lags), 'lags': lags}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--data', default=DEFAULT_DATA,
+                        help="notebook dataset, exporter store directory / s3:// URI "
+                             "or former exporter CSV (prometheus_metrics.csv)")
+    parser.add_argument('--copies', type=int, default=1,
+                        help="replay the dataset this many times as extra namespaces")
+    parser.add_argument('--target-label', default='namespace',
+                        help="TARGET_LABEL of the collector; '' for one cluster-wide target")
+    parser.add_argument('--time-series', action='store_true',
+                        help="cluster-wide range queries (USE_TIME_SERIES)")
+    parser.add_argument('--interval', type=float, default=None,
+                        help="virtual seconds per cycle (default: COLLECTION_INTERVAL or 10)")
+    parser.add_argument('--cycles', type=int, default=None,
+                        help="default: the whole recording")
+    parser.add_argument('--speed', type=float, default=0,
+                        help="virtual seconds per real second; 0 runs as fast as possible")
+    parser.add_argument('--model', default='serve',
+                        help="'serve' (start the model service), 'embedded' or a model service URL")
+    parser.add_argument('--model-path', default=None)
+    parser.add_argument('--scalers-path', default=None)
+    parser.add_argument('--service-log', default=None)
+    parser.add_argument('--service-timeout', type=float, default=180)
+    parser.add_argument('--log-level', default='ERROR')
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    data = load_replay_data(args.data, args.copies)
+    clock = VirtualClock(data.start)
+    interval = args.interval or float(os.getenv('COLLECTION_INTERVAL', '10'))
+    cycles = args.cycles or int((data.end - data.start) // interval) + 1
+
+    webhooks = WebhookStub()
+    service = None
+    if args.model == 'serve':
+        service = start_model_service(args)
+        model_url = service.url
+    elif args.model == 'embedded':
+        os.environ['INFERENCE_MODE'] = 'embedded'
+        if args.model_path:
+            os.environ['EMBEDDED_MODEL_PATH'] = args.model_path
+        if args.scalers_path:
+            os.environ['EMBEDDED_SCALERS_PATH'] = args.scalers_path
+        model_url = None
+    else:
+        model_url = args.model.rstrip('/')
+
+    if model_url:
+        os.environ['MODEL_ENDPOINT'] = f"{model_url}/predict"
+    os.environ['TARGET_LABEL'] = args.target_label
+    os.environ['COLLECTION_INTERVAL'] = str(int(interval))
+    os.environ['SLACK_WEBHOOK_URL'] = f"{webhooks.url}/slack"
+    os.environ['API_GATEWAY_URL'] = f"{webhooks.url}/trigger"
+    os.environ['RANGE_QUERY_CACHE'] = 'false'
+    os.environ.setdefault('ALERT_COOLDOWN_SECONDS', '0')
+    os.environ.setdefault('METRICS_PORT', str(free_port()))
+
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    from alert_rules import FORECAST_METRICS
+    from preprocessing import TARGET_NAMES
+    from prometheus_collector import METRICS_QUERIES, PrometheusMetricsCollector
+    # After the import: alert_manager configures the root logger
+    logging.getLogger().setLevel(args.log_level)
+
+    prometheus = FakePrometheus(data, clock, METRICS_QUERIES)
+    server = prometheus.serve()
+    os.environ['PROMETHEUS_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+    collector = PrometheusMetricsCollector()
+    engine = collector.alert_manager.rules
+
+    # Alerts as the rule engine raises them, with the cycle they came from
+    cycle = 0
+    raised: List[tuple] = []
+    evaluate = engine.evaluate
+
+    def recording_evaluate(targets, forecast):
+        alerts = evaluate(targets, forecast)
+        raised.extend((cycle, time.time(), alert) for alert in alerts)
+        return alerts
+    engine.evaluate = recording_evaluate
+
+    # What actually happened: the recorded value of each rule's metric
+    # per target, aggregated the way the collector queries it
+    actual = dict(zip(FORECAST_METRICS, TARGET_NAMES))
+    by = (args.target_label,) if args.target_label else ()
+    truth_rules = [rule for rule in engine.rules
+                   if rule.type == 'threshold' and actual[rule.metric] in data.metrics]
+    truth: Dict[tuple, np.ndarray] = {}
+
+    visible: List[float] = []  # wall time each cycle's samples became visible
+    durations = []
+    published = 0
+    started = time.perf_counter()
+    try:
+        for cycle in range(cycles):
+            if cycle:
+                clock.advance(interval)
+            tick = time.monotonic()
+            visible.append(time.time())
+            collector.cycle_deadline_at = tick + collector.cycle_deadline
+            try:
+                published += collector.run_cycle(args.time_series)
+            finally:
+                collector.cycle_deadline_at = None
+            durations.append(time.monotonic() - tick)
+
+            for rule in truth_rules:
+                for labels, value in prometheus.evaluate(
+                        actual[rule.metric], clock.now(), 'avg', by):
+                    target = labels.get(args.target_label, '') if by else ''
+                    threshold = rule.overrides.get(target, {}).get('threshold', rule.threshold)
+                    above = truth.setdefault((rule.name, target), np.zeros(cycles, dtype=bool))
+                    above[cycle] = value > threshold if rule.operator == '>' else value < threshold
+
+            if args.speed:
+                pause = tick + interval / args.speed - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+        elapsed = time.perf_counter() - started
+    finally:
+        # Deliver what is still queued before counting arrivals
+        collector.stop()
+        server.shutdown()
+        if service:
+            service.terminate()
+            service.wait()
+
+    labels = {rule.name: rule.label for rule in engine.rules}
+    delivered = webhooks.delivered()
+    to_alert, to_webhook, end_to_end = [], [], []
+    fired: Dict[tuple, List[int]] = {}
+    counts: Dict[str, int] = {}
+    for alert_cycle, created, alert in raised:
+        counts[alert['rule']] = counts.get(alert['rule'], 0) + 1
+        fired.setdefault((alert['rule'], alert.get('target', '')), []).append(alert_cycle)
+        arrived = delivered.get((labels[alert['rule']], alert.get('target', ''),
+                                 alert['timestamp']))
+        to_alert.append(created - visible[alert_cycle])
+        if arrived is not None:
+            to_webhook.append(arrived - created)
+            end_to_end.append(arrived - visible[alert_cycle])
+    detected = detection(truth, fired, interval)
+
+    report = {
+        'data': os.path.basename(args.data),
+        'targets': len(data.targets(args.target_label)) if args.target_label else 1,
+        'model': 'embedded' if args.model == 'embedded' else 'service',
+        'interval_seconds': interval,
+        'cycles': cycles,
+        'cycles_published': published,
+        'wall_seconds': elapsed,
+        'cycles_per_second': cycles / elapsed,
+        'virtual_speed': cycles * interval / elapsed,
+        'cycle_ms': dict(zip(('p50', 'p95', 'max'), (
+            *(np.percentile(durations, [50, 95]) * 1000).tolist(), max(durations) * 1000))),
+        'alerts': len(raised),
+        'alerts_by_rule': counts,
+        'alerts_delivered': len(end_to_end),
+        'slack_messages': len(webhooks.slack),
+        'failover_triggers': len(webhooks.triggers),
+        'latency_ms': {
+            name: dict(zip(('p50', 'p95', 'max'), (
+                *(np.percentile(values, [50, 95]) * 1000).tolist(), max(values) * 1000)))
+            for name, values in (('sample_to_alert', to_alert), ('alert_to_webhook', to_webhook),
+                                 ('end_to_end', end_to_end)) if values},
+        'breaches': detected['breaches'],
+        'breaches_detected': detected['detected'],
+        'detection_lag_seconds': dict(zip(('p50', 'p95'), np.percentile(
+            detected['lags'], [50, 95]).tolist())) if detected['lags'] else {},
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['data']}: {report['targets']} targets, {cycles} cycles of {interval:g}s "
+          f"({report['model']} model)")
+    print(f"throughput:       {report['cycles_per_second']:.1f} cycles/s in {elapsed:.1f}s, "
+          f"virtual speed {report['virtual_speed']:.0f}x")
+    print(f"cycle time:       {percentiles(durations)}")
+    print(f"predictions:      {published}/{cycles} cycles")
+    print(f"alerts:           {len(raised)} raised {counts}, {len(end_to_end)} delivered in "
+          f"{len(webhooks.slack)} Slack messages, {len(webhooks.triggers)} failover triggers")
+    print(f"sample -> alert:  {percentiles(to_alert)}")
+    print(f"alert -> webhook: {percentiles(to_webhook)}")
+    print(f"end to end:       {percentiles(end_to_end)}")
+    breaches = detected['breaches']
+    print(f"breaches:         {detected['detected']}/{breaches} detected"
+          + (f", lag {percentiles(detected['lags'], 1.0, 's')} virtual "
+             f"(negative: ahead)" if detected['lags'] else ''))
+
+
+if __name__ == '__main__':
+    main()
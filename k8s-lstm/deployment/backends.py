@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Model artifact each backend loads when MODEL_PATH is not set
+DEFAULT_MODEL_PATHS = {
+    "keras": "./models/lstm_model.h5",
+    "tflite": "./models/lstm_model.tflite",
+    "onnx": "./models/lstm_model.onnx",
+}
+
+
+class KerasBackend:
+    """
+    Full TensorFlow backend serving the HDF5 model.
+
+    The model is loaded without its training configuration (the custom
+    loss is not needed for inference). With fast_inference the forward
+    pass goes through the pre-traced InferenceEngine instead of
+    model.predict. intra_op_threads / inter_op_threads size TensorFlow's
+    thread pools, which default to every core of the host rather than the
+    pod's CPU limit.
+    """
+
+    name = "keras"
+
+    def __init__(self,
+                 model_path: str,
+                 fast_inference: bool = True,
+                 batch_buckets: str = "1,8,32",
+                 length_buckets: str = "1,12,24",
+                 intra_op_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None):
+        import tensorflow as tf
+        from tensorflow import keras
+
+        try:
+            if intra_op_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            if inter_op_threads:
+                tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Thread pools can only be sized before TensorFlow initializes
+            logger.warning(f"Could not set TensorFlow thread counts: {e}")
+
+        self.model = keras.models.load_model(model_path, compile=False)
+        self.engine = None
+        if fast_inference:
+            from inference_engine import InferenceEngine, parse_buckets
+            self.engine = InferenceEngine(
+                self.model,
+                batch_buckets=parse_buckets(batch_buckets),
+                length_buckets=parse_buckets(length_buckets))
+
+    def warmup(self):
+        if self.engine:
+            self.engine.warmup()
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        if self.engine:
+            return self.engine.predict(x)
+        return self.model.predict(x, verbose=0)
+
+    def info(self) -> Dict:
+        return {
+            "input_shape": str(self.model.input_shape),
+            "output_shape": str(self.model.output_shape),
+            "layers": len(self.model.layers),
+        }
+
+
+class TFLiteBackend:
+    """
+    TensorFlow Lite backend (float or dynamic-range quantized model).
+
+    Uses the standalone tflite-runtime interpreter when installed, so the
+    serving image does not need TensorFlow. The stacked LSTMs only convert
+    to TFLite builtins with a fixed [1, sequence_length, features] input,
+    so batches are run one row at a time. The interpreter is not thread
+    safe and is guarded by a lock.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._lock = threading.Lock()
+
+    def warmup(self):
+        self.predict(np.zeros([1] + list(self._input["shape"][1:]), dtype=np.float32))
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        expected = tuple(self._input["shape"][1:])
+        if x.shape[1:] != expected:
+            raise ValueError(f"TFLite model expects sequences shaped {expected}, got {x.shape[1:]}")
+
+        outputs = []
+        with self._lock:
+            for row in x:
+                self.interpreter.set_tensor(self._input["index"], row[np.newaxis])
+                self.interpreter.invoke()
+                outputs.append(self.interpreter.get_tensor(self._output["index"])[0])
+        return np.stack(outputs)
+
+    def info(self) -> Dict:
+        return {
+            "input_shape": str(tuple(self._input["shape"])),
+            "output_shape": str(tuple(self._output["shape"])),
+            "input_dtype": np.dtype(self._input["dtype"]).name,
+        }
+
+
+class ONNXBackend:
+    """
+    ONNX Runtime backend (float or int8 dynamically quantized model).
+
+    The exported graph keeps dynamic batch and sequence_length axes, and
+    InferenceSession.run is safe to call from several threads.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input = self.session.get_inputs()[0]
+        self._output = self.session.get_outputs()[0]
+
+    def warmup(self):
+        shape = [d if isinstance(d, int) else 1 for d in self._input.shape]
+        self.predict(np.zeros(shape, dtype=np.float32))
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        return self.session.run([self._output.name], {self._input.name: x})[0]
+
+    def info(self) -> Dict:
+        return {
+            "input_shape": str(self._input.shape),
+            "output_shape": str(self._output.shape),
+        }
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": ONNXBackend,
+}
+
+
+def create_backend(name: str, model_path: Optional[str] = None, **options):
+    """
+    Load the model with the named backend (keras, tflite or onnx), warm it
+    up and return it, recording load_seconds and warmup_seconds on it.
+    Options are passed to the backend constructor.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unsupported inference backend: {name} "
+                         f"(expected one of {', '.join(BACKENDS)})")
+
+    model_path = model_path or DEFAULT_MODEL_PATHS[name]
+    if not os.path.exists(model_path):
+        raise ValueError(f"Model file not found: {model_path}")
+
+    start = time.perf_counter()
+    backend = BACKENDS[name](model_path, **options)
+    loaded = time.perf_counter()
+    backend.warmup()
+    backend.load_seconds = loaded - start
+    backend.warmup_seconds = time.perf_counter() - loaded
+    logger.info(f"Loaded {name} model from {model_path} in {backend.load_seconds:.2f}s "
+                f"(warmup {backend.warmup_seconds:.2f}s)")
+    return backend
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DynamicBatcher:
+    """
+    Coalesces concurrent single-sequence requests into one model invocation.
+
+    The first queued request opens a batch; requests arriving within
+    max_wait_ms join it until max_batch_size is reached. Sequences of
+    different lengths cannot be stacked, so each batch is split by shape
+    before inference. infer_fn receives [batch, sequence_length, features]
+    and returns one result per row; it runs in executor (the loop's default
+    one when None) so the event loop keeps serving requests while the model
+    is busy.
+    """
+
+    def __init__(self,
+                 infer_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0,
+                 executor: Optional[Executor] = None):
+        self.infer_fn = infer_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the batching worker on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Dynamic batcher started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait * 1000:.1f})")
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, sequence: np.ndarray) -> np.ndarray:
+        """Queue one [sequence_length, features] sequence and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((sequence, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        """Wait for one request, then gather more until the batch is full or the wait expires"""
+        items = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+
+            by_shape = {}
+            for sequence, future in items:
+                by_shape.setdefault(sequence.shape, []).append((sequence, future))
+
+            for group in by_shape.values():
+                batch = np.stack([sequence for sequence, _ in group])
+                try:
+                    results = await loop.run_in_executor(self.executor, self.infer_fn, batch)
+                except Exception as e:
+                    for _, future in group:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                logger.debug(f"Ran batch of {len(group)} sequences, shape {batch.shape}")
+                for (_, future), result in zip(group, results):
+                    if not future.done():
+                        future.set_result(result)
@@ -0,0 +1,84 @@
+import asyncio
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+def cpu_limit() -> float:
+    """
+    CPUs available to this container: the cgroup CPU quota when one is set
+    (a Kubernetes CPU limit), otherwise the CPUs the process may run on
+    """
+    available = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            value, period = f.read().split()
+        if value != 'max':
+            quota = int(value) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                value = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if value > 0:
+                quota = value / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is None:
+        return float(available or 1)
+    return min(quota, float(available or quota))
+
+
+def default_threads(processes: int = 1) -> int:
+    """Math library threads per process so all processes together fit the CPU limit"""
+    return max(1, math.floor(cpu_limit() / max(1, processes)))
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pool for model calls with a bounded number of pending
+    requests.
+
+    Requests take a slot before they queue for the pool and give it back
+    when done; once max_pending slots are taken, try_acquire() fails and
+    the caller should reject the request instead of letting it wait. Slots
+    are only taken and released on the event loop thread.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 64):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        self.pending = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return False
+        self.pending += 1
+        return True
+
+    def release(self):
+        self.pending -= 1
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) on the inference pool without blocking the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,98 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+
+# Prometheus metrics of the model service. With several uvicorn processes,
+# set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all of them.
+
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+# Stages of a prediction: decode -> scale -> forward (or stream) -> inverse -> encode
+stage_duration = Histogram(
+    "model_stage_duration_seconds",
+    "Time spent in each stage of serving a prediction",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+request_duration = Histogram(
+    "model_request_duration_seconds",
+    "End-to-end HTTP request latency",
+    ["route", "method"],
+    buckets=LATENCY_BUCKETS
+)
+requests_total = Counter(
+    "model_requests_total",
+    "HTTP requests by route and status code",
+    ["route", "method", "status"]
+)
+batch_size = Histogram(
+    "model_batch_size",
+    "Sequences per model forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+sequence_length = Histogram(
+    "model_sequence_length",
+    "Timesteps per sequence passed to the model",
+    buckets=(1, 6, 12, 24, 48, 96)
+)
+requests_pending = Gauge(
+    "model_requests_pending",
+    "Prediction requests holding an inference slot (queued or running)",
+    multiprocess_mode="livesum"
+)
+forward_in_progress = Gauge(
+    "model_forward_in_progress",
+    "Model forward passes currently running",
+    multiprocess_mode="livesum"
+)
+requests_rejected = Counter(
+    "model_requests_rejected_total",
+    "Prediction requests rejected because the inference queue was full"
+)
+cache_hits = Counter(
+    "model_prediction_cache_hits_total",
+    "Sequences served from the prediction cache"
+)
+cache_misses = Counter(
+    "model_prediction_cache_misses_total",
+    "Sequences not in the prediction cache (absent or expired)"
+)
+cache_evictions = Counter(
+    "model_prediction_cache_evictions_total",
+    "Prediction cache entries dropped, by reason (lru: size limits, expired: TTL)",
+    ["reason"]
+)
+model_load_seconds = Gauge(
+    "model_load_seconds",
+    "Time taken to load the model",
+    ["backend"],
+    multiprocess_mode="max"
+)
+model_warmup_seconds = Gauge(
+    "model_warmup_seconds",
+    "Time taken by the warmup forward passes after loading",
+    ["backend"],
+    multiprocess_mode="max"
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Record the duration of the enclosed block as one serving stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.labels(name).observe(time.perf_counter() - start)
+
+
+def render_metrics():
+    """Exposition body and content type for GET /metrics"""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,16 +1,28 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
 import logging
 import os
-import pickle
-from typing import List
+from typing import Dict, List, Optional
+import time
 import uvicorn
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from starlette.routing import Match
+from backends import create_backend
+from batcher import DynamicBatcher
+from executor import InferenceExecutor, default_threads
+from instrumentation import (batch_size, forward_in_progress, model_load_seconds,
+                             model_warmup_seconds, render_metrics, request_duration,
+                             requests_pending, requests_rejected, requests_total,
+                             sequence_length, stage)
+from numpy_lstm import NumpyLSTM
+from prediction_cache import PredictionCache
+from preprocessing import PreprocessingSpec
+from streaming import StreamingEngine
+from wire_format import TENSOR_CONTENT_TYPE, decode_tensor, encode_tensor
+
+# Configure logging; per-request details are logged at DEBUG
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -20,8 +32,40 @@ app = FastAPI(
 )
 
 # Global variable to store the model
-model = None
-scaler_features, scaler_targets = None, None
+backend = None
+preprocessing = None
+
+# Inference backend: keras (full TensorFlow), tflite or onnx
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras").lower()
+
+# Pre-traced tf.function fast path replacing model.predict (keras backend)
+FAST_INFERENCE = os.getenv("FAST_INFERENCE", "true").lower() == "true"
+
+# LRU + TTL cache of model outputs keyed on the quantized input sequence
+PREDICTION_CACHE = os.getenv("PREDICTION_CACHE", "true").lower() == "true"
+cache = None
+
+# Stateful per-target streams advanced one timestep per call (NumPy, from the .h5 weights)
+STREAMING = os.getenv("STREAMING", "true").lower() == "true"
+streams = None
+
+# Uvicorn worker processes (uvicorn reads WEB_CONCURRENCY too); each loads its own model
+PROCESSES = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Dedicated inference thread pool, and how many requests may wait for it
+# before new ones are rejected with 429
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "64"))
+RETRY_AFTER_SECONDS = os.getenv("RETRY_AFTER_SECONDS", "1")
+inference = None
+
+# Math library threads per process, by default the pod's CPU limit split
+# across the worker processes
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS") or default_threads(PROCESSES))
+
+# Dynamic micro-batching of concurrent /predict requests
+DYNAMIC_BATCHING = os.getenv("DYNAMIC_BATCHING", "true").lower() == "true"
+batcher = None
 
 
 class PredictionRequest(BaseModel):
@@ -35,67 +79,249 @@ class PredictionResponse(BaseModel):
     status: str
 
 
-def disaster_aware_loss(threshold=0.7, disaster_penalty_weight=2.0):
-    """Custom loss function that penalizes disaster threshold breaches more"""
-    def loss_fn(y_true, y_pred):
-        # Standard MSE loss
-        loss = tf.keras.losses.MeanSquaredError(
-            reduction='sum_over_batch_size',
-            name='mean_squared_error'
-        )
-        mse_loss = loss.call(y_true, y_pred)
+class BatchPredictionRequest(BaseModel):
+    data: List[List[List[float]]]  # [batch, sequence_length, features]
 
-        # Additional penalty for predictions that miss disaster conditions
-        disaster_mask = tf.cast(y_true > threshold, tf.float32)
-        disaster_errors = tf.abs(y_pred - y_true) * disaster_mask
-        disaster_penalty = tf.reduce_mean(
-            disaster_errors) * disaster_penalty_weight
 
-        return mse_loss + disaster_penalty
+class TargetPrediction(BaseModel):
+    cpu_usage: List[float]  # forecast over the prediction horizon
+    mem_usage: List[float]
 
-    return loss_fn
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[TargetPrediction]
+    status: str
+
+
+class StreamRequest(BaseModel):
+    steps: Dict[str, List[List[float]]]  # new timesteps per stream: [k, features]
+    window: Optional[int] = None  # window the client primes streams with; must match STREAM_WINDOW
+
+
+class StreamPrediction(BaseModel):
+    cpu_usage: List[float]  # forecast over the prediction horizon
+    mem_usage: List[float]
+    steps: int  # timesteps the stream has seen
+    new: bool  # the stream was opened by this request
+
+
+class StreamResponse(BaseModel):
+    predictions: Dict[str, StreamPrediction]
+    status: str
 
 
 def load_scalers():
-    """Load the fitted scalers"""
-    global scaler_features, scaler_targets
-    path = "./scalers"
-    with open(f"{path}/feature_scaler.pkl", 'rb') as f:
-        scaler_features = pickle.load(f)
-    with open(f"{path}/target_scaler.pkl", 'rb') as f:
-        scaler_targets = pickle.load(f)
+    """Load the input/output scaling derived from the fitted scalers"""
+    global preprocessing
+    path = os.getenv("SCALERS_PATH", "./scalers")
+    preprocessing = PreprocessingSpec.load(path)
     print(f"Scalers loaded from {path}")
 
-    return scaler_features, scaler_targets
+    return preprocessing
 
 
 def load_model():
+    """Load the model with the configured inference backend"""
+    global backend
+    if INFERENCE_BACKEND == "keras":
+        options = {
+            "fast_inference": FAST_INFERENCE,
+            "batch_buckets": os.getenv("INFERENCE_BATCH_BUCKETS", "1,8,32"),
+            "length_buckets": os.getenv("INFERENCE_LENGTH_BUCKETS", "1,12,24"),
+            "intra_op_threads": INFERENCE_THREADS,
+            "inter_op_threads": int(os.getenv("INFERENCE_INTER_OP_THREADS", "1")),
+        }
+    else:
+        options = {"num_threads": INFERENCE_THREADS}
+    try:
+        backend = create_backend(INFERENCE_BACKEND, os.getenv("MODEL_PATH"), **options)
+    except Exception as e:
+        raise ValueError(f"Unable to load model: {e}")
+    return backend
+
+
+def forward(x_scaled: np.ndarray) -> np.ndarray:
+    """One backend forward pass, recorded with its batch shape"""
+    batch_size.observe(len(x_scaled))
+    sequence_length.observe(x_scaled.shape[1])
+    with forward_in_progress.track_inprogress(), stage("forward"):
+        return backend.predict(x_scaled)
+
+
+def run_inference(input_data: np.ndarray) -> np.ndarray:
+    """
+    Scale a [batch, sequence_length, features] array, run one forward pass
+    and inverse-scale the output to [batch, horizon, targets]
     """
-    Load model from different formats
+    with stage("scale"):
+        x_scaled = preprocessing.transform_features(input_data)
+    if cache:
+        predictions = cache.predict(x_scaled, forward)
+    else:
+        predictions = forward(x_scaled)
+    with stage("inverse"):
+        return preprocessing.inverse_targets(predictions)
+
+
+def run_stream(steps: Dict[str, np.ndarray]) -> Dict[str, StreamPrediction]:
+    """Scale the new timesteps, advance each stream and inverse-scale the forecasts"""
+    with stage("scale"):
+        scaled = {
+            stream_id: preprocessing.transform_features(values)
+            for stream_id, values in steps.items()
+        }
+    with forward_in_progress.track_inprogress(), stage("stream"):
+        results = streams.push(scaled)
+    with stage("inverse"):
+        forecasts = preprocessing.inverse_targets(
+            np.stack([forecast for forecast, _, _ in results.values()]))
+    return {
+        stream_id: StreamPrediction(
+            cpu_usage=forecast[:, 0].tolist(),
+            mem_usage=forecast[:, 1].tolist(),
+            steps=seen,
+            new=new)
+        for (stream_id, (_, seen, new)), forecast in zip(results.items(), forecasts)
+    }
+
+
+def request_body_schema(model: type) -> dict:
+    """OpenAPI request body accepting the JSON model or a binary tensor"""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": model.model_json_schema()},
+                TENSOR_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    }
+
+
+async def read_input(request: Request, model: type, ndim: int) -> np.ndarray:
+    """Read the request body and decode it into a float32 array"""
+    content_type = request.headers.get("content-type", "application/json")
+    content_type = content_type.split(";")[0].strip().lower()
+    body = await request.body()
+
+    with stage("decode"):
+        return decode_input(body, content_type, model, ndim)
+
 
-    Args:
-        model_name: Name of the model files
-        load_format: h5'
+def decode_input(body: bytes, content_type: str, model: type, ndim: int) -> np.ndarray:
+    """
+    Decode a request body by content type: a binary tensor is viewed in
+    place, JSON is validated against the pydantic model
+    """
+    if content_type == TENSOR_CONTENT_TYPE:
+        try:
+            input_data = decode_tensor(body)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    elif content_type == "application/json":
+        try:
+            input_data = np.array(model.model_validate_json(body).data, dtype=np.float32)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        except ValueError:
+            raise HTTPException(status_code=422, detail="data rows must all have the same length")
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported content type {content_type}, "
+                   f"expected application/json or {TENSOR_CONTENT_TYPE}")
+
+    if input_data.ndim != ndim:
+        raise HTTPException(
+            status_code=422,
+            detail=f"data must have {ndim} dimensions, got shape {list(input_data.shape)}")
+    return input_data
+
+
+def accepts_tensor(request: Request) -> bool:
+    return TENSOR_CONTENT_TYPE in request.headers.get("accept", "")
+
+
+async def inference_slot():
+    """
+    Hold a place in the inference queue for the duration of the request,
+    rejecting it with 429 when the queue is full so overload is shed early
+    instead of piling up behind the model
     """
+    if inference is None:
+        raise HTTPException(status_code=503, detail="Model not loaded",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+    if not inference.try_acquire():
+        requests_rejected.inc()
+        raise HTTPException(status_code=429, detail="Inference queue is full",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+    requests_pending.inc()
     try:
-        global model
-        model_path = os.getenv("MODEL_PATH", "./models/lstm_model.h5")
-        model = keras.models.load_model(
-            model_path,
-            custom_objects={'loss_fn': disaster_aware_loss()}
-        )
-        print(f"✓ HDF5 model loaded from: {model_path}")
+        yield
+    finally:
+        requests_pending.dec()
+        inference.release()
 
-    except Exception:
-        raise ValueError("Unable to load model")
-    return model
+
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    """Count requests and observe their latency per route template"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = next((route.path for route in app.router.routes
+                  if route.matches(request.scope)[0] == Match.FULL), "unmatched")
+    request_duration.labels(route, request.method).observe(time.perf_counter() - start)
+    requests_total.labels(route, request.method, response.status_code).inc()
+    return response
 
 
 @app.on_event("startup")
 async def startup_event():
     """Load model on startup"""
+    global batcher, cache, inference, streams
     load_model()
     load_scalers()
+    model_load_seconds.labels(backend.name).set(backend.load_seconds)
+    model_warmup_seconds.labels(backend.name).set(backend.warmup_seconds)
+    inference = InferenceExecutor(workers=INFERENCE_WORKERS, max_pending=INFERENCE_MAX_PENDING)
+    logger.info(f"Inference pool: {INFERENCE_WORKERS} workers, {INFERENCE_THREADS} threads, "
+                f"{PROCESSES} processes")
+    if STREAMING and PROCESSES > 1:
+        # Stream state lives in one process; pushes landing on another
+        # process would keep reopening the stream
+        logger.warning("Streaming disabled: not supported with WEB_CONCURRENCY > 1")
+    elif STREAMING:
+        stream_model_path = os.getenv("STREAM_MODEL_PATH", "./models/lstm_model.h5")
+        if os.path.exists(stream_model_path):
+            streams = StreamingEngine(
+                NumpyLSTM.from_h5(stream_model_path),
+                window=int(os.getenv("STREAM_WINDOW", "24")),
+                idle_seconds=float(os.getenv("STREAM_IDLE_SECONDS", "300")),
+                max_streams=int(os.getenv("STREAM_MAX_STREAMS", "10000")))
+        else:
+            logger.warning(f"Streaming disabled: {stream_model_path} not found")
+    if PREDICTION_CACHE:
+        # precision is in scaled (standardized) feature units
+        cache = PredictionCache(
+            max_entries=int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.getenv("PREDICTION_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "300")),
+            precision=float(os.getenv("PREDICTION_CACHE_PRECISION", "0.001")))
+    if DYNAMIC_BATCHING:
+        batcher = DynamicBatcher(
+            run_inference,
+            max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "32")),
+            max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "5")),
+            executor=inference.pool)
+        batcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if batcher:
+        await batcher.stop()
+    if inference:
+        inference.shutdown()
 
 
 @app.get("/")
@@ -107,77 +333,207 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Kubernetes"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    if backend is None:
+        raise HTTPException(status_code=503, detail="Model not loaded",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
     return {"status": "healthy", "model_loaded": True}
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
-    """Make predictions using the LSTM model"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+@app.post("/predict", response_model=PredictionResponse,
+          openapi_extra=request_body_schema(PredictionRequest))
+async def predict(request: Request, _: None = Depends(inference_slot)):
+    """
+    Make predictions using the LSTM model. Accepts a JSON body or a binary
+    [sequence_length, features] tensor; a client sending
+    Accept: application/x-float32-tensor gets the [horizon, targets]
+    forecast back as a tensor.
+    """
+    if backend is None:
+        raise HTTPException(status_code=503, detail="Model not loaded",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+    input_data = await read_input(request, PredictionRequest, ndim=2)
 
     try:
-        # Convert input data to numpy array
-        input_data = np.array(request.data)
+        logger.debug("Input shape: %s", input_data.shape)
 
-        # Reshape if necessary (assuming input needs to be 3D for LSTM)
-        if len(input_data.shape) == 2:
-            input_data = np.expand_dims(input_data, axis=0)
+        # Make prediction; concurrent requests are coalesced into one batch
+        if batcher:
+            predictions = await batcher.submit(input_data)
+        else:
+            predictions = await inference.run(run_inference, input_data[np.newaxis])
+            predictions = predictions[0]
 
-        x_reshaped = input_data.reshape(-1, input_data.shape[-1])
-        x_reshaped_scaled = scaler_features.transform(
-            x_reshaped).reshape(input_data.shape)
+        with stage("encode"):
+            if accepts_tensor(request):
+                return Response(content=encode_tensor(predictions), media_type=TENSOR_CONTENT_TYPE)
 
-        logger.info(f"Input shape: {input_data.shape}")
+            cpu_usage, mem_usage = predictions[0], predictions[1]
 
-        # Make prediction
-        predictions = model.predict(x_reshaped_scaled)
-        predictions = predictions.reshape(-1, predictions.shape[-1])
+            # Convert predictions to list
+            # if len(predictions.shape) > 1:
+            #     pred_list = predictions.flatten().tolist()
+            # else:
+            #     pred_list = predictions.tolist()
 
-        # Inverse transform the predictions
-        predictions = scaler_targets.inverse_transform(predictions)
-        cpu_usage, mem_usage = predictions[0], predictions[1]
-        predictions = {"cpu_usage": cpu_usage, "mem_usage": mem_usage}
+            logger.debug("Predictions: cpu_usage=%s mem_usage=%s", cpu_usage, mem_usage)
 
-        # Convert predictions to list
-        # if len(predictions.shape) > 1:
-        #     pred_list = predictions.flatten().tolist()
-        # else:
-        #     pred_list = predictions.tolist()
+            return PredictionResponse(
+                cpu_usage=cpu_usage.tolist(),
+                mem_usage=mem_usage.tolist(),
+                # predictions=predictions,
+                status="success"
+            )
 
-        logger.info(f"Predictions: {predictions}")
+    except Exception as e:
+        logger.error(f"Error during prediction: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}")
 
-        return PredictionResponse(
-            cpu_usage=cpu_usage.tolist(),
-            mem_usage=mem_usage.tolist(),
-            # predictions=predictions,
-            status="success"
-        )
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse,
+          openapi_extra=request_body_schema(BatchPredictionRequest))
+async def predict_batch(request: Request, _: None = Depends(inference_slot)):
+    """
+    Make predictions for a batch of sequences in one model invocation.
+    Accepts JSON or a binary [batch, sequence_length, features] tensor, and
+    returns a [batch, horizon, targets] tensor when the client accepts one.
+    """
+    if backend is None:
+        raise HTTPException(status_code=503, detail="Model not loaded",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+
+    input_data = await read_input(request, BatchPredictionRequest, ndim=3)
+
+    try:
+        logger.debug("Batch input shape: %s", input_data.shape)
+
+        # One forward pass for the whole batch: [batch, horizon, targets]
+        predictions = await inference.run(run_inference, input_data)
+
+        with stage("encode"):
+            if accepts_tensor(request):
+                return Response(content=encode_tensor(predictions), media_type=TENSOR_CONTENT_TYPE)
+
+            return BatchPredictionResponse(
+                predictions=[
+                    TargetPrediction(
+                        cpu_usage=forecast[:, 0].tolist(),
+                        mem_usage=forecast[:, 1].tolist())
+                    for forecast in predictions
+                ],
+                status="success"
+            )
 
     except Exception as e:
-        logger.error(f"Error during prediction: {str(e)}")
+        logger.error(f"Error during batch prediction: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Prediction error: {str(e)}")
 
 
+@app.post("/predict/stream", response_model=StreamResponse)
+async def predict_stream(request: StreamRequest, _: None = Depends(inference_slot)):
+    """
+    Push new timesteps to per-target streams and get each stream's forecast.
+    A stream is opened on first use; prime it with a full window, then push
+    one timestep per cycle. The service keeps the LSTM state in between, so
+    a cycle costs one recurrent step instead of the whole window.
+    """
+    if streams is None:
+        raise HTTPException(status_code=503, detail="Streaming not enabled")
+    if not request.steps:
+        raise HTTPException(status_code=422, detail="steps must not be empty")
+    if request.window is not None and request.window != streams.window:
+        # Forecasts of a stream primed with another window silently drift from /predict
+        raise HTTPException(
+            status_code=422,
+            detail=f"window {request.window} does not match the stream window {streams.window} "
+                   f"(STREAM_WINDOW)")
+
+    steps = {}
+    for stream_id, values in request.steps.items():
+        try:
+            steps[stream_id] = np.array(values, dtype=np.float32)
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"{stream_id}: rows must all have the same length")
+        if steps[stream_id].ndim != 2 or not len(steps[stream_id]) \
+                or steps[stream_id].shape[1] != preprocessing.feature_scale.size:
+            raise HTTPException(
+                status_code=422,
+                detail=f"{stream_id}: steps must be shaped [k, {preprocessing.feature_scale.size}]")
+
+    try:
+        predictions = await inference.run(run_stream, steps)
+        return StreamResponse(predictions=predictions, status="success")
+
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error during stream prediction: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction error: {str(e)}")
+
+
+@app.delete("/predict/stream/{stream_id}")
+async def close_stream(stream_id: str):
+    """Close a stream and free its state"""
+    if streams is None:
+        raise HTTPException(status_code=503, detail="Streaming not enabled")
+    if not streams.close(stream_id):
+        raise HTTPException(status_code=404, detail=f"Unknown stream {stream_id}")
+    return {"status": "closed"}
+
+
+@app.get("/predict/stream/stats")
+async def stream_stats():
+    """Open streams and evictions"""
+    if streams is None:
+        return {"enabled": False}
+    return {"enabled": True, **streams.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: per-stage latency, batch shapes, queue depth, model load times"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/inference/stats")
+async def inference_stats():
+    """Inference pool size, queued requests and rejections"""
+    if inference is None:
+        raise HTTPException(status_code=503, detail="Model not loaded",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+    return {**inference.stats(), "threads": INFERENCE_THREADS, "processes": PROCESSES}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Prediction cache size and hit/miss/eviction counters"""
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
 @app.get("/model/info")
 async def model_info():
     """Get model information"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    if backend is None:
+        raise HTTPException(status_code=503, detail="Model not loaded",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
 
     try:
         return {
-            "input_shape": str(model.input_shape),
-            "output_shape": str(model.output_shape),
+            **backend.info(),
             "model_type": "LSTM",
-            "layers": len(model.layers)
+            "backend": backend.name
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting model info: {str(e)}")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=PROCESSES)
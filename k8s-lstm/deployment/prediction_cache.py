@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from instrumentation import cache_evictions, cache_hits, cache_misses
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of model outputs keyed on quantized input sequences.
+
+    Keys are a hash of the (already scaled) sequence rounded to a multiple
+    of precision, so inputs that differ by less than the precision share an
+    entry. Entries expire after ttl_seconds; the least recently used ones
+    are evicted once max_entries or max_bytes is exceeded.
+    Safe to use from the inference executor threads. Hits, misses and
+    evictions are counted here for /cache/stats and exported on /metrics.
+    """
+
+    def __init__(self,
+                 max_entries: int = 10000,
+                 max_bytes: int = 16 * 1024 * 1024,
+                 ttl_seconds: float = 300.0,
+                 precision: float = 1e-3):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.precision = precision
+        self._entries: 'OrderedDict[bytes, Tuple[float, np.ndarray]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, sequence: np.ndarray) -> bytes:
+        """Hash of one [sequence_length, features] sequence quantized to precision"""
+        quantized = np.round(sequence / self.precision).astype(np.int64)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.asarray(quantized.shape, dtype=np.int64).tobytes())
+        digest.update(quantized.tobytes())
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    cache_hits.inc()
+                    return value
+                self._remove(key)
+                self.expirations += 1
+                cache_evictions.labels('expired').inc()
+            self.misses += 1
+            cache_misses.inc()
+            return None
+
+    def put(self, key: bytes, value: np.ndarray):
+        value = np.array(value, copy=True)
+        value.setflags(write=False)
+        size = value.nbytes + len(key)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+                cache_evictions.labels('lru').inc()
+
+    def _remove(self, key: bytes):
+        _, value = self._entries.pop(key)
+        self._bytes -= value.nbytes + len(key)
+
+    def predict(self, x: np.ndarray, predict_fn) -> np.ndarray:
+        """
+        Outputs for a [batch, sequence_length, features] array, running
+        predict_fn only on the rows that are not cached
+        """
+        keys = [self.key(row) for row in x]
+        cached: List[Optional[np.ndarray]] = [self.get(key) for key in keys]
+        missing = [i for i, value in enumerate(cached) if value is None]
+
+        if len(missing) == len(keys):
+            outputs = predict_fn(x)
+            for key, output in zip(keys, outputs):
+                self.put(key, output)
+            return outputs
+
+        if missing:
+            computed = predict_fn(x[missing])
+            for i, output in zip(missing, computed):
+                self.put(keys[i], output)
+                cached[i] = output
+        return np.stack(cached)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
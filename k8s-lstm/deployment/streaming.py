@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from numpy_lstm import NumpyLSTM
+
+logger = logging.getLogger(__name__)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-x))
+
+
+class StreamingEngine:
+    """
+    Stateful one-step-at-a-time inference for many streams (one per target).
+
+    Each stream keeps the (h, c) state of every LSTM layer plus the attention
+    keys and values of its last `window` timesteps. Pushing a timestep
+    advances the LSTMs by one step and attends from the newest step over the
+    stored keys/values, so a forecast costs O(1) recurrent steps instead of
+    re-running the whole window. The attention has no positional encoding,
+    so the ring buffer order does not matter.
+
+    A stream primed with exactly `window` timesteps gives the same forecast
+    as the windowed model, so a stream opened with more than one timestep
+    must be opened with exactly `window` (a single timestep opens a stream
+    a client lost, which it then re-primes). After that its LSTM state also carries history
+    older than the window, which the windowed model (zero state at the
+    window start) discards, so forecasts drift slightly from /predict.
+
+    State lives in preallocated arrays indexed by a per-stream slot, so all
+    streams pushed in one call are advanced in a single batched step.
+    Streams idle for longer than idle_seconds are evicted, and the least
+    recently used ones once max_streams is reached.
+    """
+
+    def __init__(self,
+                 model: NumpyLSTM,
+                 window: int = 24,
+                 idle_seconds: float = 300.0,
+                 max_streams: int = 10000,
+                 initial_capacity: int = 64):
+        self.window = window
+        self.idle_seconds = idle_seconds
+        self.max_streams = max_streams
+        self._parse(model)
+
+        units = [lstm[0] for lstm in self._lstms]
+        self._h = [np.zeros((0, u), dtype=np.float32) for u in units]
+        self._c = [np.zeros((0, u), dtype=np.float32) for u in units]
+        self._keys = np.zeros((0, window, self._heads, self._key_dim), dtype=np.float32)
+        self._values = np.zeros_like(self._keys)
+        self._count = np.zeros(0, dtype=np.int64)
+        self._capacity = 0
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self._grow(initial_capacity)
+
+    def _parse(self, model: NumpyLSTM):
+        """Split the model into LSTM stack, self-attention and output head"""
+        layers = [layer for layer in model.layers if layer[0] not in ('InputLayer', 'Dropout')]
+        self._lstms = []
+        while layers and layers[0][0] == 'LSTM':
+            _, config, params, _ = layers.pop(0)
+            if (config.get('activation', 'tanh'), config.get('recurrent_activation', 'sigmoid')) \
+                    != ('tanh', 'sigmoid') or not config.get('return_sequences'):
+                raise ValueError(f"Unsupported LSTM layer for streaming: {config['name']}")
+            self._lstms.append((config['units'], params['kernel'],
+                                params['recurrent_kernel'], params.get('bias')))
+        if not self._lstms or not layers or layers[0][0] != 'MultiHeadAttention':
+            raise ValueError("Streaming needs an LSTM stack followed by MultiHeadAttention")
+        _, config, attention, _ = layers.pop(0)
+        self._heads, self._key_dim = config['num_heads'], config['key_dim']
+        # Projections as plain 2D matmuls: [units, heads * key_dim] and back
+        self._attention = {name: value.reshape(-1) for name, value in attention.items()
+                           if name.endswith('/bias')}
+        for name in ('query', 'key', 'value'):
+            kernel = attention[f'{name}/kernel']
+            self._attention[f'{name}/kernel'] = kernel.reshape(kernel.shape[0], -1)
+        kernel = attention['attention_output/kernel']
+        self._attention['attention_output/kernel'] = kernel.reshape(-1, kernel.shape[-1])
+        self._scale = float(self._key_dim) ** -0.5
+        if not layers or layers[0][0] != 'Lambda' or layers[0][1]['name'] != 'last_timestep':
+            raise ValueError("Streaming needs the attention output reduced to its last timestep")
+        layers.pop(0)
+        self._head = [step for _, _, _, step in layers if step is not None]
+
+    def _grow(self, capacity: int):
+        """Resize the state arrays to hold capacity streams"""
+        def resize(array: np.ndarray) -> np.ndarray:
+            resized = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            resized[:len(array)] = array
+            return resized
+
+        self._h = [resize(h) for h in self._h]
+        self._c = [resize(c) for c in self._c]
+        self._keys = resize(self._keys)
+        self._values = resize(self._values)
+        self._count = resize(self._count)
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def _project(self, x: np.ndarray, name: str) -> np.ndarray:
+        """[n, units] -> [n, heads, key_dim] query/key/value projection"""
+        y = x @ self._attention[f'{name}/kernel']
+        if f'{name}/bias' in self._attention:
+            y += self._attention[f'{name}/bias']
+        return y.reshape(len(x), self._heads, self._key_dim)
+
+    def _open(self, stream_id: str, in_use: set) -> int:
+        if len(self._slots) >= self.max_streams:
+            # Evict the least recently used stream not taking part in this push
+            candidates = {k: v for k, v in self._last_used.items() if k not in in_use}
+            if candidates:
+                self._close(min(candidates, key=candidates.get))
+                self.evictions += 1
+        if not self._free:
+            self._grow(self._capacity * 2)
+        slot = self._free.pop()
+        for h, c in zip(self._h, self._c):
+            h[slot] = 0.0
+            c[slot] = 0.0
+        self._count[slot] = 0
+        self._slots[stream_id] = slot
+        return slot
+
+    def _close(self, stream_id: str) -> bool:
+        slot = self._slots.pop(stream_id, None)
+        self._last_used.pop(stream_id, None)
+        if slot is None:
+            return False
+        self._free.append(slot)
+        return True
+
+    def _advance(self, slots: np.ndarray, x: np.ndarray):
+        """Advance the given streams by one timestep of scaled features x [n, features]"""
+        for layer, (units, kernel, recurrent, bias) in enumerate(self._lstms):
+            h, c = self._h[layer][slots], self._c[layer][slots]
+            z = x @ kernel + h @ recurrent
+            if bias is not None:
+                z += bias
+            i = _sigmoid(z[:, :units])
+            f = _sigmoid(z[:, units:2 * units])
+            c = f * c + i * np.tanh(z[:, 2 * units:3 * units])
+            h = _sigmoid(z[:, 3 * units:]) * np.tanh(c)
+            self._h[layer][slots], self._c[layer][slots] = h, c
+            x = h
+
+        position = self._count[slots] % self.window
+        self._keys[slots, position] = self._project(x, 'key')
+        self._values[slots, position] = self._project(x, 'value')
+        self._count[slots] += 1
+
+    def _forecast(self, slots: np.ndarray) -> np.ndarray:
+        """Model output for the newest timestep of the given streams"""
+        query = self._project(self._h[-1][slots], 'query') * self._scale
+        keys, values = self._keys[slots], self._values[slots]
+
+        # [n, heads, window, key_dim] @ [n, heads, key_dim, 1] -> [n, heads, window]
+        scores = (keys.transpose(0, 2, 1, 3) @ query[..., None])[..., 0]
+        # Streams with fewer than window steps only attend to the filled slots
+        filled = np.arange(self.window) < np.minimum(self._count[slots], self.window)[:, None]
+        scores = np.where(filled[:, None, :], scores, -np.inf)
+        scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        scores /= scores.sum(axis=-1, keepdims=True)
+
+        # [n, heads, 1, window] @ [n, heads, window, key_dim] -> [n, heads * key_dim]
+        context = (scores[:, :, None, :] @ values.transpose(0, 2, 1, 3)).reshape(len(slots), -1)
+        output = context @ self._attention['attention_output/kernel']
+        if 'attention_output/bias' in self._attention:
+            output += self._attention['attention_output/bias']
+        for step in self._head:
+            output = step(output)
+        return output
+
+    def push(self, steps: Dict[str, np.ndarray]) -> Dict[str, Tuple[np.ndarray, int, bool]]:
+        """
+        Append scaled [k, features] timesteps to each stream, opening streams
+        that do not exist. Raises ValueError, before changing any stream, when
+        a stream would be primed with a window other than `window`. Returns (forecast, steps seen, newly opened) per
+        stream, the forecast being the model output after its last timestep.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+
+            stream_ids = list(steps)
+            for stream_id in stream_ids:
+                primed = len(steps[stream_id])
+                if stream_id not in self._slots and primed > 1 and primed != self.window:
+                    raise ValueError(
+                        f"{stream_id}: streams are primed with {self.window} timesteps, got {primed}")
+            in_use = set(stream_ids)
+            opened = set()
+            for stream_id in stream_ids:
+                if stream_id not in self._slots:
+                    self._open(stream_id, in_use)
+                    opened.add(stream_id)
+                self._last_used[stream_id] = now
+
+            slots = np.array([self._slots[stream_id] for stream_id in stream_ids], dtype=np.intp)
+            lengths = np.array([len(steps[stream_id]) for stream_id in stream_ids])
+            # Streams that pushed several timesteps (e.g. to prime a new
+            # stream with a full window) advance together step by step
+            for t in range(int(lengths.max(initial=0))):
+                active = np.flatnonzero(lengths > t)
+                x = np.stack([steps[stream_ids[i]][t] for i in active]).astype(np.float32)
+                self._advance(slots[active], x)
+
+            forecasts = self._forecast(slots)
+            return {
+                stream_id: (forecasts[i], int(self._count[slots[i]]), stream_id in opened)
+                for i, stream_id in enumerate(stream_ids)
+            }
+
+    def close(self, stream_id: str) -> bool:
+        with self._lock:
+            return self._close(stream_id)
+
+    def _evict_idle(self, now: float):
+        idle = [stream_id for stream_id, last_used in self._last_used.items()
+                if now - last_used > self.idle_seconds]
+        for stream_id in idle:
+            self._close(stream_id)
+        if idle:
+            self.evictions += len(idle)
+            logger.info(f"Evicted {len(idle)} idle streams")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "streams": len(self._slots),
+                "capacity": self._capacity,
+                "window": self.window,
+                "evictions": self.evictions,
+            }
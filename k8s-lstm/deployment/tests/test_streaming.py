@@ -0,0 +1,82 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from numpy_lstm import NumpyLSTM  # noqa: E402
+from streaming import StreamingEngine  # noqa: E402
+
+tf = pytest.importorskip('tensorflow')
+
+FEATURES, TARGETS, HORIZON, HIDDEN, WINDOW = 3, 2, 4, 8, 12
+
+
+def build_model(seed: int = 0):
+    """A small model of the notebook's architecture, with random (non-zero) biases"""
+    layers = tf.keras.layers
+    inputs = layers.Input(shape=(None, FEATURES), name='input_sequences')
+    x = inputs
+    for i in range(2):
+        x = layers.LSTM(HIDDEN, return_sequences=True, name=f"lstm_{i + 1}")(x)
+    x = layers.MultiHeadAttention(num_heads=4, key_dim=HIDDEN // 4, name='multi_head_attention')(x, x)
+    x = layers.Lambda(lambda x: x[:, -1, :], name='last_timestep')(x)
+    x = layers.Dropout(0.2, name='dropout_final')(x)
+    x = layers.Dense(HIDDEN // 2, activation='relu', name='dense_1')(x)
+    x = layers.Dropout(0.2, name='dropout_dense')(x)
+    x = layers.Dense(TARGETS * HORIZON, name='output_dense')(x)
+    output = layers.Reshape((HORIZON, TARGETS), name='output_reshape')(x)
+    model = tf.keras.Model(inputs=inputs, outputs=output)
+
+    rng = np.random.default_rng(seed)
+    model.set_weights([rng.normal(0, 0.5, w.shape).astype(np.float32) for w in model.get_weights()])
+    return model
+
+
+@pytest.fixture(scope='module')
+def model(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('model') / 'lstm_model.h5')
+    keras_model = build_model()
+    keras_model.save(path, save_format='h5')
+    return keras_model, NumpyLSTM.from_h5(path)
+
+
+def _steps(steps: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(steps, FEATURES)).astype(np.float32)
+
+
+def test_primed_streams_match_keras(model):
+    keras_model, numpy_model = model
+    engine = StreamingEngine(numpy_model, window=WINDOW)
+    windows = {f"target-{i}": _steps(WINDOW, i) for i in range(3)}
+
+    results = engine.push(windows)
+    expected = keras_model.predict(np.stack(list(windows.values())), verbose=0)
+    for i, stream_id in enumerate(windows):
+        forecast, seen, new = results[stream_id]
+        assert (seen, new) == (WINDOW, True)
+        np.testing.assert_allclose(forecast, expected[i], rtol=1e-4, atol=1e-5)
+
+
+def test_stream_pushed_step_by_step_matches_keras(model):
+    keras_model, numpy_model = model
+    engine = StreamingEngine(numpy_model, window=WINDOW)
+    history = _steps(WINDOW, 7)
+
+    engine.push({'target': history[:1]})
+    for t in range(1, WINDOW):
+        forecast, seen, _ = engine.push({'target': history[t:t + 1]})['target']
+        # Until the window is full the stream sees exactly the pushed steps
+        assert seen == t + 1
+        expected = keras_model.predict(history[None, :t + 1], verbose=0)[0]
+        np.testing.assert_allclose(forecast, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_priming_with_another_window_is_rejected(model):
+    _, numpy_model = model
+    engine = StreamingEngine(numpy_model, window=WINDOW)
+    with pytest.raises(ValueError):
+        engine.push({'target': _steps(WINDOW - 1, 0)})
+    assert engine.stats()['streams'] == 0
@@ -0,0 +1,41 @@
+import struct
+
+import numpy as np
+
+# Binary alternative to the JSON request/response bodies. A tensor is sent
+# as a little-endian uint32 ndim, ndim uint32 dimensions, then the values as
+# raw little-endian float32 in C order. The header is a multiple of 4 bytes,
+# so the values can be viewed in place without copying.
+# The collector has an identical copy of this module.
+TENSOR_CONTENT_TYPE = "application/x-float32-tensor"
+
+MAX_DIMS = 8
+
+
+def encode_tensor(array: np.ndarray) -> bytes:
+    """Serialize an array as a float32 tensor body"""
+    array = np.ascontiguousarray(array, dtype='<f4')
+    header = struct.pack(f'<I{array.ndim}I', array.ndim, *array.shape)
+    return header + array.tobytes()
+
+
+def decode_tensor(body: bytes) -> np.ndarray:
+    """
+    View a float32 tensor body as an array without copying the values.
+    The array is read-only; raises ValueError on a malformed body.
+    """
+    if len(body) < 4:
+        raise ValueError("Tensor body is too short")
+    (ndim,) = struct.unpack_from('<I', body)
+    if not 0 < ndim <= MAX_DIMS:
+        raise ValueError(f"Tensor has an invalid number of dimensions: {ndim}")
+
+    offset = 4 + 4 * ndim
+    if len(body) < offset:
+        raise ValueError("Tensor header is truncated")
+    shape = struct.unpack_from(f'<{ndim}I', body, 4)
+
+    expected = offset + 4 * int(np.prod(shape, dtype=np.int64))
+    if len(body) != expected:
+        raise ValueError(f"Tensor body is {len(body)} bytes, expected {expected} for shape {shape}")
+    return np.frombuffer(body, dtype='<f4', offset=offset).reshape(shape)
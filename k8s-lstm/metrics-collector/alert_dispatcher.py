@@ -0,0 +1,160 @@
+import logging
+import random
+import threading
+from typing import Callable, Dict, List, Optional
+
+from telemetry import alert_dispatch_duration, alert_queue_depth, alerts_dropped
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchLane:
+    """
+    Background delivery for one channel (a webhook or the failover
+    trigger) on its own thread, so a slow channel delays neither the
+    collection loop nor the other channels.
+
+    Alerts queue up in a bounded pending list (the oldest are dropped
+    beyond max_pending). The worker takes everything pending at once and
+    sends it as one message; alerts raised while a send is being retried
+    (e.g. during a webhook outage) are merged into the retry instead of
+    queueing up as separate messages. send(alerts) returns True on
+    success; False or an exception is retried with full-jitter
+    exponential backoff unless retryable(exception) says otherwise.
+    """
+
+    def __init__(self,
+                 name: str,
+                 send: Callable[[List[Dict]], bool],
+                 max_pending: int = 100,
+                 max_attempts: int = 5,
+                 backoff: float = 1.0,
+                 backoff_max: float = 60.0,
+                 retryable: Callable[[Exception], bool] = lambda e: True):
+        self.name = name
+        self.send = send
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.retryable = retryable
+        self._pending: List[Dict] = []
+        self._busy = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name=f"alert-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, alerts: List[Dict]):
+        """Queue alerts for delivery; never blocks on the network"""
+        with self._cond:
+            self._pending.extend(alerts)
+            self._trim()
+            self._cond.notify()
+
+    def _trim(self):
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            alerts_dropped.labels(self.name).inc(overflow)
+            logger.warning(f"{self.name}: alert queue full, dropped {overflow} oldest alerts")
+        alert_queue_depth.labels(self.name).set(len(self._pending))
+
+    def _take_pending(self) -> List[Dict]:
+        alerts, self._pending = self._pending, []
+        alert_queue_depth.labels(self.name).set(0)
+        return alerts
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch = self._take_pending()
+                self._busy = True
+
+            self._deliver(batch)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _deliver(self, batch: List[Dict]):
+        attempt = 0
+        while True:
+            try:
+                with alert_dispatch_duration.labels(self.name).time():
+                    if self.send(batch):
+                        return
+                retry = True
+            except Exception as e:
+                logger.error(f"{self.name}: delivery failed: {e}")
+                retry = self.retryable(e)
+
+            attempt += 1
+            if not retry or attempt >= self.max_attempts:
+                alerts_dropped.labels(self.name).inc(len(batch))
+                logger.error(f"{self.name}: giving up on {len(batch)} alerts after {attempt} attempts")
+                return
+
+            delay = random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+            logger.info(f"{self.name}: retrying in {delay:.1f}s (attempt {attempt + 1})")
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped, timeout=delay)
+                # Coalesce alerts raised during the outage into the retry
+                batch = batch + self._take_pending()
+                overflow = len(batch) - self.max_pending
+                if overflow > 0:
+                    del batch[:overflow]
+                    alerts_dropped.labels(self.name).inc(overflow)
+                if self._stopped:
+                    # Shutting down: one last attempt, no more backoff
+                    attempt = max(attempt, self.max_attempts - 1)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far has been handled"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._busy, timeout=timeout)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Deliver what is pending (without further backoff) and stop the worker"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+class AlertDispatcher:
+    """
+    Fans alerts out to one DispatchLane per channel. The failover trigger
+    lane is submitted to first, and since every lane has its own worker,
+    the trigger never waits behind a slow notification webhook.
+    """
+
+    def __init__(self):
+        self.trigger_lane: Optional[DispatchLane] = None
+        self.notification_lanes: List[DispatchLane] = []
+
+    def add_trigger(self, lane: DispatchLane):
+        self.trigger_lane = lane
+
+    def add_notification(self, lane: DispatchLane):
+        self.notification_lanes.append(lane)
+
+    @property
+    def lanes(self) -> List[DispatchLane]:
+        return ([self.trigger_lane] if self.trigger_lane else []) + self.notification_lanes
+
+    def submit(self, alerts: List[Dict]):
+        for lane in self.lanes:
+            lane.submit(alerts)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return all([lane.flush(timeout) for lane in self.lanes])
+
+    def stop(self, timeout: Optional[float] = None):
+        for lane in self.lanes:
+            lane.stop(timeout)
@@ -1,10 +1,13 @@
 import logging
 import os
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 import requests
-from datetime import datetime
-import requests
-import json
+import numpy as np
+from urllib3.exceptions import NewConnectionError
+from alert_dispatcher import AlertDispatcher, DispatchLane
+from alert_rules import RuleEngine, default_rules, forecast_array, load_rules
+from http_transport import CircuitOpenError, HTTPTransport, get_transport
+from telemetry import alert_dispatch_duration
 
 # Configure logging
 logging.basicConfig(
@@ -14,8 +17,24 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def failed_before_sending(error: Exception) -> bool:
+    """
+    Whether a request failed before any of it reached the upstream: the
+    circuit was open, or the connection was never established. Only such
+    failures may be retried for the deployment trigger; after a reset, a
+    read timeout or any HTTP response the trigger may already be running.
+    """
+    if isinstance(error, (CircuitOpenError, requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        # requests wraps refused and unresolvable connections in a
+        # MaxRetryError whose reason is a NewConnectionError
+        return isinstance(getattr(error.args[0], 'reason', None), NewConnectionError)
+    return False
+
+
 class AlertManager:
-    def __init__(self):
+    def __init__(self, transport: HTTPTransport = None):
         # Alert thresholds (can be configured via env vars)
         self.cpu_threshold = float(
             os.getenv(
@@ -34,24 +53,86 @@ class AlertManager:
                 'ALERT_COOLDOWN_SECONDS',
                 '300'))  # 5 minutes
         self.api_gateway_url = os.getenv('API_GATEWAY_URL')
-        # Track last alert times to prevent alert flooding
-        self.last_alert_times: Dict[str, datetime] = {}
 
-    def _is_cooldown_active(self, metric_name: str) -> bool:
-        """Check if the cooldown period is still active for a specific metric"""
-        if metric_name not in self.last_alert_times:
-            return False
+        # Declarative rules (JSON, inline or from a file) evaluated over the
+        # whole forecast horizon of all targets at once. Without them, one
+        # rule per threshold above. Cooldowns are tracked per (rule, target)
+        # to prevent alert flooding
+        rules_source = os.getenv('ALERT_RULES') or os.getenv('ALERT_RULES_FILE')
+        rules = load_rules(rules_source) if rules_source else \
+            default_rules(self.cpu_threshold, self.memory_threshold)
+        self.rules = RuleEngine(rules, default_cooldown=self.alert_cooldown)
+        logger.info(f"Alert rules: {', '.join(rule.name for rule in rules)}")
+
+        # Webhooks and the API gateway go through the shared pooled transport
+        self.transport = transport or get_transport()
+        for upstream in ('slack', 'teams', 'api_gateway'):
+            self.transport.register_upstream(
+                upstream, headers={"Content-Type": "application/json"})
+
+        # Sharded collectors: only the replica owning the failover decision
+        # calls the deployment trigger; the others delegate to it
+        self.failover_owner: Callable[[], bool] = lambda: True
+        self.delegate_failover: Optional[Callable[[List[Dict]], None]] = None
 
-        time_since_last_alert = datetime.now(
-        ) - self.last_alert_times[metric_name]
-        return time_since_last_alert.total_seconds() < self.alert_cooldown
+        # Background dispatch: checks only queue alerts, one worker per
+        # channel delivers them with retries, and the failover trigger has
+        # its own lane so it never waits behind a notification webhook
+        self.dispatcher: Optional[AlertDispatcher] = None
+        if os.getenv('ALERT_ASYNC_DISPATCH', 'true').lower() == 'true':
+            self.dispatcher = self._build_dispatcher()
 
-    def trigger_deployment(self):
+    def _build_dispatcher(self) -> AlertDispatcher:
+        options = {
+            'max_pending': int(os.getenv('ALERT_QUEUE_SIZE', '100')),
+            'max_attempts': int(os.getenv('ALERT_MAX_ATTEMPTS', '5')),
+            'backoff': float(os.getenv('ALERT_RETRY_BACKOFF_SECONDS', '1')),
+            'backoff_max': float(os.getenv('ALERT_RETRY_BACKOFF_MAX_SECONDS', '60')),
+        }
+        dispatcher = AlertDispatcher()
+        if self.api_gateway_url:
+            # Once the trigger may have arrived, never risk a second
+            # failover deployment by retrying it
+            dispatcher.add_trigger(DispatchLane(
+                'api_gateway', self._failover, retryable=failed_before_sending, **options))
+        if self.slack_webhook:
+            dispatcher.add_notification(DispatchLane('slack', self._post_slack, **options))
+        if self.teams_webhook:
+            dispatcher.add_notification(DispatchLane('teams', self._post_teams, **options))
+        return dispatcher
+
+    def trigger_deployment(self) -> bool:
         """Trigger deployment via external API"""
+        try:
+            return self._post_deployment_trigger()
+        except Exception as e:
+            logger.exception("Exception occurred while triggering deployment")
+            return False
+
+    def _failover(self, alerts: List[Dict]) -> bool:
+        """Trigger the failover deployment, or delegate it to the replica owning the decision"""
+        if self.delegate_failover and not self.failover_owner():
+            logger.info("Not the failover owner, delegating the deployment trigger")
+            self.delegate_failover(alerts)
+            return True
+        if not self._post_deployment_trigger():
+            # The gateway answered, so the trigger may have started a
+            # deployment anyway: fail the delivery without a retry
+            raise requests.exceptions.HTTPError("Deployment trigger was answered with an error")
+        return True
+
+    def trigger_failover(self, alerts: List[Dict]):
+        """Trigger the failover deployment on behalf of alerts raised elsewhere"""
+        if not self.api_gateway_url:
+            return
+        if self.dispatcher and self.dispatcher.trigger_lane:
+            self.dispatcher.trigger_lane.submit(alerts)
+            return
+        with alert_dispatch_duration.labels('api_gateway').time():
+            self.trigger_deployment()
+
+    def _post_deployment_trigger(self) -> bool:
         logger.info("Triggering deployment...")
-        headers = {
-            "Content-Type": "application/json"
-        }
         data = {
             "parameters": {
                 "deploy_standby_only": "false",
@@ -60,155 +141,146 @@ class AlertManager:
             }
         }
 
-        try:
-            response = requests.post(self.api_gateway_url, headers=headers, json=data, timeout=10)
-            if response.status_code == 200:
-                logger.info("Triggered deployment successfully")
-            else:
-                logger.error(f"Deployment trigger failed: {response.status_code} {response.text}")
-        except Exception as e:
-            logger.exception("Exception occurred while triggering deployment")
+        response = self.transport.post('api_gateway', self.api_gateway_url, json=data, timeout=10)
+        if response.status_code == 200:
+            logger.info("Triggered deployment successfully")
+            return True
+        logger.error(f"Deployment trigger failed: {response.status_code} {response.text}")
+        return False
 
-    def _update_last_alert_time(self, metric_name: str):
-        """Update the last alert time for a specific metric"""
-        self.last_alert_times[metric_name] = datetime.now()
+    def evaluate_prediction(self,
+                            predictions: dict,
+                            target: Optional[str] = None) -> List[Dict]:
+        """
+        Check predictions against the alert rules without sending anything.
+        Cooldowns are tracked per target when one is given.
+        Returns list of alerts that were generated
+        """
+        return self.rules.evaluate([target or ''], forecast_array([predictions]))
 
     def check_prediction(self, predictions: dict) -> List[Dict]:
         """
-        Check predictions against thresholds and generate alerts if needed
+        Check predictions against the alert rules and generate alerts if needed
         Returns list of alerts that were generated
         """
-        alerts = []
-        current_time = datetime.now()
-
-        memory_predictions = predictions['mem_usage']
-        cpu_predictions = predictions['cpu_usage']
-
-        mem_exceeds = [
-            val for val in memory_predictions if val > self.memory_threshold]
-        cpu_exceeds = [
-            val for val in cpu_predictions if val > self.cpu_threshold]
-
-        # Check memory usage with cooldown
-        if mem_exceeds and not self._is_cooldown_active('memory'):
-            alert = {
-                'metric': "Memory Usage",
-                'prediction': max(memory_predictions),
-                'threshold': self.memory_threshold,
-                "unit": "Percentage (%)",
-                'timestamp': current_time.isoformat()
-            }
-            alerts.append(alert)
-            self._update_last_alert_time('memory')
-            logger.info("Memory alert triggered - cooldown timer reset")
-        elif mem_exceeds and self._is_cooldown_active('memory'):
-            # Calculate remaining cooldown time
-            time_since_last = datetime.now() - self.last_alert_times['memory']
-            remaining_seconds = self.alert_cooldown - time_since_last.total_seconds()
-            logger.info(f"Memory threshold exceeded but alert suppressed due to cooldown. "
-                        f"Remaining cooldown: {remaining_seconds:.0f} seconds")
-
-        # Check CPU usage with cooldown
-        if cpu_exceeds and not self._is_cooldown_active('cpu'):
-            alert = {
-                'metric': "CPU Usage",
-                'prediction': max(cpu_predictions),
-                'threshold': self.cpu_threshold,
-                "unit": "Percentage (%)",
-                'timestamp': current_time.isoformat()
-            }
-            alerts.append(alert)
-            self._update_last_alert_time('cpu')
-            logger.info("CPU alert triggered - cooldown timer reset")
-        elif cpu_exceeds and self._is_cooldown_active('cpu'):
-            # Calculate remaining cooldown time
-            time_since_last = datetime.now() - self.last_alert_times['cpu']
-            remaining_seconds = self.alert_cooldown - time_since_last.total_seconds()
-            logger.info(f"CPU threshold exceeded but alert suppressed due to cooldown. "
-                        f"Remaining cooldown: {remaining_seconds:.0f} seconds")
-
-        if alerts:
-            logger.warning(f"Sending alerts: {alerts}")
-            self._send_alert(alerts)
-            if self.api_gateway_url:
-                self.trigger_deployment()
+        alerts = self.evaluate_prediction(predictions)
+        self._dispatch(alerts)
+        return alerts
 
+    def check_predictions(self, predictions_by_target: Dict[str, dict]) -> List[Dict]:
+        """
+        Check the predictions of many targets and send one combined alert
+        (and at most one deployment trigger) for the whole batch
+        """
+        return self.check_forecasts(
+            list(predictions_by_target), forecast_array(list(predictions_by_target.values())))
+
+    def check_forecasts(self, targets: List[str], forecasts: np.ndarray) -> List[Dict]:
+        """
+        Like check_predictions, for a [targets, horizon, metrics] forecast
+        array (metrics ordered cpu_usage, mem_usage) as returned by the
+        batch endpoint or the embedded model
+        """
+        alerts = self.rules.evaluate(targets, forecasts)
+        self._dispatch(alerts)
         return alerts
 
-    def _send_alert(self, alerts: List[Dict]) -> bool:
-        """Send combined alert to configured notification channels"""
-        success = False
+    def _dispatch(self, alerts: List[Dict]):
+        """Trigger the failover deployment and send alerts"""
+        if not alerts:
+            return
+        if self.dispatcher:
+            self.dispatcher.submit(alerts)
+            logger.warning(f"Queued {len(alerts)} alerts for dispatch")
+            return
+
+        logger.warning(f"Sending alerts: {alerts}")
+        if self.api_gateway_url:
+            with alert_dispatch_duration.labels('api_gateway').time():
+                try:
+                    self._failover(alerts)
+                except Exception:
+                    logger.exception("Exception occurred while triggering deployment")
+        self._send_alert(alerts)
+
+    def close(self, timeout: float = 10):
+        """Deliver queued alerts and stop the dispatch workers"""
+        if self.dispatcher:
+            self.dispatcher.stop(timeout)
 
+    @staticmethod
+    def _format_message(alerts: List[Dict]) -> str:
         header = "🚨 *Resource Usage Alert(s)*\n"
         body = ""
 
         for alert in alerts:
+            target = f" ({alert['target']})" if alert.get('target') else ""
             body += (
-                f"\n*{alert['metric']}*:\n"
+                f"\n*{alert['metric']}*{target}:\n"
                 f"• Prediction: {alert['prediction']:.2f}{alert['unit']}\n"
                 f"• Threshold: {alert['threshold']}{alert['unit']}\n"
                 f"• Time: {alert['timestamp']}\n"
             )
 
-        message = header + body.strip()
+        return header + body.strip()
+
+    def _post_slack(self, alerts: List[Dict]) -> bool:
+        response = self.transport.post(
+            'slack',
+            self.slack_webhook,
+            json={'text': self._format_message(alerts)},
+            timeout=5
+        )
+        if response.status_code == 200:
+            logger.info("Alert sent to Slack successfully")
+            return True
+        logger.error(f"Failed to send Slack alert: {response.status_code}")
+        return False
+
+    def _post_teams(self, alerts: List[Dict]) -> bool:
+        teams_message = {
+            '@type': 'MessageCard',
+            '@context': 'http://schema.org/extensions',
+            'summary': 'Resource Usage Alert',
+            'themeColor': 'FF0000',
+            'title': 'Resource Usage Alert',
+            'text': self._format_message(alerts)
+        }
+
+        response = self.transport.post(
+            'teams',
+            self.teams_webhook,
+            json=teams_message,
+            timeout=5
+        )
+        if response.status_code == 200:
+            logger.info("Alert sent to Teams successfully")
+            return True
+        logger.error(f"Failed to send Teams alert: {response.status_code}")
+        return False
+
+    def _send_alert(self, alerts: List[Dict]) -> bool:
+        """Send combined alert to configured notification channels"""
+        success = False
 
         # Try Slack
         if self.slack_webhook:
             try:
-                response = requests.post(
-                    self.slack_webhook,
-                    json={'text': message},
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    logger.info("Alert sent to Slack successfully")
-                    success = True
-                else:
-                    logger.error(f"Failed to send Slack alert: {response.status_code}")
+                with alert_dispatch_duration.labels('slack').time():
+                    success = self._post_slack(alerts) or success
             except Exception as e:
                 logger.error(f"Error sending Slack alert: {e}")
 
         # Try Microsoft Teams
         if self.teams_webhook:
             try:
-                teams_message = {
-                    '@type': 'MessageCard',
-                    '@context': 'http://schema.org/extensions',
-                    'summary': 'Resource Usage Alert',
-                    'themeColor': 'FF0000',
-                    'title': 'Resource Usage Alert',
-                    'text': message
-                }
-
-                response = requests.post(
-                    self.teams_webhook,
-                    json=teams_message,
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    logger.info("Alert sent to Teams successfully")
-                    success = True
-                else:
-                    logger.error(f"Failed to send Teams alert: {response.status_code}")
+                with alert_dispatch_duration.labels('teams').time():
+                    success = self._post_teams(alerts) or success
             except Exception as e:
                 logger.error(f"Error sending Teams alert: {e}")
 
         return success
 
     def get_cooldown_status(self) -> Dict[str, Dict]:
-        """Get current cooldown status for all metrics - useful for debugging"""
-        status = {}
-        current_time = datetime.now()
-
-        for metric, last_alert_time in self.last_alert_times.items():
-            time_since_last = current_time - last_alert_time
-            remaining_seconds = max(
-                0, self.alert_cooldown - time_since_last.total_seconds())
-
-            status[metric] = {
-                'last_alert_time': last_alert_time.isoformat(),
-                'time_since_last_alert_seconds': time_since_last.total_seconds(),
-                'cooldown_active': remaining_seconds > 0,
-                'remaining_cooldown_seconds': remaining_seconds}
-
-        return status
+        """Get current cooldown status for all rules and targets - useful for debugging"""
+        return self.rules.cooldown_status()
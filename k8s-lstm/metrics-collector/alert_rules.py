@@ -0,0 +1,305 @@
+import json
+import logging
+import time
+from itertools import chain
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Forecast series, in the order of the metrics axis of a forecast array
+FORECAST_METRICS = ('cpu_usage', 'mem_usage')
+
+RULE_TYPES = ('threshold', 'rate')
+OPERATORS = ('>', '<')
+
+
+class AlertRule:
+    """
+    One declarative alert rule, evaluated over the forecast of every
+    target at once:
+
+      type        threshold: the forecast value itself is compared;
+                  rate: its change from one step to the next
+      metric      forecast series (cpu_usage or mem_usage)
+      operator    '>' (default) or '<'
+      threshold   value (or change per step) to compare against
+      for_steps   fire when the condition holds on at least this many
+                  steps (default 1) ...
+      within_steps  ... of the next within_steps (default: whole horizon)
+      cooldown_seconds  minimum time between alerts per (rule, target)
+      overrides   per-target {threshold, for_steps}
+      label, unit   shown in notifications
+    """
+
+    def __init__(self,
+                 name: str,
+                 metric: str,
+                 threshold: float,
+                 type: str = 'threshold',
+                 operator: str = '>',
+                 for_steps: int = 1,
+                 within_steps: Optional[int] = None,
+                 cooldown_seconds: Optional[float] = None,
+                 overrides: Optional[Dict[str, Dict]] = None,
+                 label: Optional[str] = None,
+                 unit: str = ''):
+        if metric not in FORECAST_METRICS:
+            raise ValueError(f"Rule {name}: metric must be one of {FORECAST_METRICS}, got {metric}")
+        if type not in RULE_TYPES:
+            raise ValueError(f"Rule {name}: type must be one of {RULE_TYPES}, got {type}")
+        if operator not in OPERATORS:
+            raise ValueError(f"Rule {name}: operator must be one of {OPERATORS}, got {operator}")
+        if for_steps < 1 or (within_steps is not None and within_steps < for_steps):
+            raise ValueError(f"Rule {name}: need 1 <= for_steps <= within_steps")
+
+        self.name = name
+        self.metric = metric
+        self.metric_index = FORECAST_METRICS.index(metric)
+        self.threshold = float(threshold)
+        self.type = type
+        self.operator = operator
+        self.for_steps = int(for_steps)
+        self.within_steps = within_steps
+        self.cooldown_seconds = cooldown_seconds
+        self.overrides = overrides or {}
+        for target, override in self.overrides.items():
+            unknown = set(override) - {'threshold', 'for_steps'}
+            if unknown:
+                raise ValueError(f"Rule {name}: unsupported overrides for {target}: {unknown}")
+        self.label = label or name
+        self.unit = unit
+
+    def _per_target(self, field: str, index: Dict[str, int], size: int):
+        """Scalar field value, or a [targets] array when targets override it"""
+        default = getattr(self, field)
+        overridden = [(index[target], override[field])
+                      for target, override in self.overrides.items()
+                      if field in override and target in index]
+        if not overridden:
+            return default
+        values = np.full(size, default, dtype=np.float64)
+        positions, overrides = zip(*overridden)
+        values[list(positions)] = overrides
+        return values
+
+    def _series(self, series: np.ndarray, columns=slice(None)) -> np.ndarray:
+        """The [horizon, targets] values this rule compares"""
+        series = series[self.metric_index, :self.within_steps][:, columns]
+        if self.type == 'rate':
+            series = series[1:] - series[:-1]
+        return series
+
+    def evaluate(self, series: np.ndarray, index: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluate the rule on a [metrics, horizon, targets] forecast.
+        Returns the positions of the targets it fires for and their
+        thresholds.
+        """
+        series = self._series(series)
+        threshold = self._per_target('threshold', index, series.shape[1])
+        if self.operator == '>':
+            hits = series > threshold
+        else:
+            hits = series < threshold
+
+        # Horizon-major, so the count sums whole rows of targets
+        counts = np.add.reduce(hits, axis=0, dtype=np.int32)
+        fired = np.flatnonzero(counts >= self._per_target('for_steps', index, series.shape[1]))
+        if isinstance(threshold, np.ndarray):
+            return fired, threshold[fired]
+        return fired, np.full(len(fired), threshold)
+
+    def extremes(self, series: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Peak (or trough, for '<') of the compared values of the given targets"""
+        # nan marks padding of ragged forecasts and never compares true
+        rows = self._series(series, positions)
+        return np.nanmax(rows, axis=0) if self.operator == '>' else np.nanmin(rows, axis=0)
+
+
+class RuleEngine:
+    """
+    Evaluates a set of AlertRules over a [targets, horizon, metrics]
+    forecast array, one vectorized pass per rule, and applies cooldowns
+    per (rule, target). Cooldown state is one array per rule over every
+    target seen so far, so only the alerts that are actually sent are
+    handled in Python.
+    """
+
+    def __init__(self, rules: List[AlertRule], default_cooldown: float = 300.0):
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Alert rule names must be unique: {names}")
+        self.rules = rules
+        self.default_cooldown = default_cooldown
+
+        # Every target seen so far -> its slot in the cooldown arrays
+        self._slots: Dict[str, int] = {}
+        self._slot_targets: List[str] = []
+        # Rule name -> wall time of the last alert per slot (nan: never)
+        self._last_fired: Dict[str, np.ndarray] = {rule.name: np.empty(0) for rule in rules}
+
+        # Targets of the previous evaluation; usually the same every cycle
+        self._targets: Sequence[str] = ()
+        self._index: Dict[str, int] = {}
+        self._positions = np.empty(0, dtype=np.intp)
+
+    def _register(self, targets: Sequence[str]):
+        """Give new targets a slot in the cooldown arrays"""
+        for target in targets:
+            if target not in self._slots:
+                self._slots[target] = len(self._slot_targets)
+                self._slot_targets.append(target)
+        capacity = len(self._slot_targets)
+        for name, last in self._last_fired.items():
+            if len(last) < capacity:
+                grown = np.full(max(capacity, 2 * len(last)), np.nan)
+                grown[:len(last)] = last
+                self._last_fired[name] = grown
+
+    def _resolve(self, targets: Sequence[str]):
+        """Map targets to their positions in the call and slots in the cooldown arrays"""
+        if targets == self._targets:
+            return
+        self._register(targets)
+        self._targets = list(targets)
+        self._index = {target: i for i, target in enumerate(targets)}
+        self._positions = np.fromiter((self._slots[target] for target in targets),
+                                      dtype=np.intp, count=len(targets))
+
+    def export_cooldowns(self, targets: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        """Last alert times of the given targets per rule, e.g. to hand them to another replica"""
+        slots = [(target, self._slots[target]) for target in targets if target in self._slots]
+        state = {}
+        for name, last_fired in self._last_fired.items():
+            fired = {target: float(last_fired[slot]) for target, slot in slots
+                     if not np.isnan(last_fired[slot])}
+            if fired:
+                state[name] = fired
+        return state
+
+    def import_cooldowns(self, state: Dict[str, Dict[str, float]]):
+        """Adopt last alert times exported by export_cooldowns; unknown rules are ignored"""
+        for name, fired in state.items():
+            if name not in self._last_fired:
+                continue
+            self._register(list(fired))
+            last_fired = self._last_fired[name]
+            for target, last in fired.items():
+                last_fired[self._slots[target]] = last
+
+    def cooldown(self, rule: AlertRule) -> float:
+        return self.default_cooldown if rule.cooldown_seconds is None else rule.cooldown_seconds
+
+    def evaluate(self, targets: Sequence[str], forecast: np.ndarray) -> List[Dict]:
+        """
+        Alerts for a [targets, horizon, metrics] forecast (metrics ordered
+        as FORECAST_METRICS). targets may contain '' for a cluster-wide
+        forecast, which is reported without a target.
+        """
+        # One transposing copy to [metrics, horizon, targets]: every rule
+        # then compares and counts along contiguous rows of all targets
+        forecast = np.asarray(forecast)
+        if forecast.dtype.kind != 'f':
+            forecast = forecast.astype(np.float64)
+        series = np.ascontiguousarray(forecast.transpose(2, 1, 0))
+        self._resolve(targets)
+
+        now = time.time()
+        timestamp = None
+        alerts = []
+        for rule in self.rules:
+            fired, thresholds = rule.evaluate(series, self._index)
+            if not fired.size:
+                continue
+
+            last_fired = self._last_fired[rule.name]
+            slots = self._positions[fired]
+            # nan (never fired) compares false, so it is never cooling down
+            send = ~(now - last_fired[slots] < self.cooldown(rule))
+            last_fired[slots[send]] = now
+            suppressed = len(fired) - np.count_nonzero(send)
+            if suppressed:
+                logger.info(f"{rule.name}: {suppressed} alerts suppressed by cooldown")
+
+            fired, thresholds = fired[send], thresholds[send]
+            if not fired.size:
+                continue
+
+            timestamp = timestamp or datetime.fromtimestamp(now).isoformat()
+            values = rule.extremes(series, fired)
+            for position, value, threshold in zip(fired.tolist(), values.tolist(), thresholds.tolist()):
+                target = targets[position]
+                alert = {
+                    'rule': rule.name,
+                    'metric': rule.label,
+                    'prediction': value,
+                    'threshold': threshold,
+                    'unit': rule.unit,
+                    'timestamp': timestamp
+                }
+                if target:
+                    alert['target'] = target
+                alerts.append(alert)
+        return alerts
+
+    def cooldown_status(self) -> Dict[str, Dict]:
+        """Cooldown state per rule and target, keyed as 'target/rule'"""
+        now = time.time()
+        status = {}
+        for rule in self.rules:
+            last_fired = self._last_fired[rule.name]
+            slots = np.flatnonzero(~np.isnan(last_fired))
+            for slot, last in zip(slots.tolist(), last_fired[slots].tolist()):
+                target = self._slot_targets[slot]
+                since = now - last
+                remaining = max(0.0, self.cooldown(rule) - since)
+                status[f"{target}/{rule.name}" if target else rule.name] = {
+                    'last_alert_time': datetime.fromtimestamp(last).isoformat(),
+                    'time_since_last_alert_seconds': since,
+                    'cooldown_active': remaining > 0,
+                    'remaining_cooldown_seconds': remaining}
+        return status
+
+
+def forecast_array(predictions: Sequence[Dict]) -> np.ndarray:
+    """
+    [targets, horizon, metrics] array from per-target prediction dicts
+    ({'cpu_usage': [...], 'mem_usage': [...]}); series of unequal length
+    are padded with nan
+    """
+    series = [[prediction[metric] for metric in FORECAST_METRICS] for prediction in predictions]
+    lengths = {len(values) for row in series for values in row}
+    if len(lengths) == 1:
+        horizon = lengths.pop()
+        return np.stack([
+            np.fromiter(chain.from_iterable(row[m] for row in series), dtype=np.float64,
+                        count=len(series) * horizon).reshape(len(series), horizon)
+            for m in range(len(FORECAST_METRICS))], axis=2)
+    horizon = max(lengths, default=0)
+    forecast = np.full((len(series), horizon, len(FORECAST_METRICS)), np.nan)
+    for i, row in enumerate(series):
+        for m, values in enumerate(row):
+            forecast[i, :len(values), m] = values
+    return forecast
+
+
+def default_rules(cpu_threshold: float, memory_threshold: float) -> List[AlertRule]:
+    """The original two alerts: any step of the horizon above the threshold"""
+    return [
+        AlertRule('memory', 'mem_usage', memory_threshold,
+                  label='Memory Usage', unit='Percentage (%)'),
+        AlertRule('cpu', 'cpu_usage', cpu_threshold,
+                  label='CPU Usage', unit='Percentage (%)'),
+    ]
+
+
+def load_rules(source: str) -> List[AlertRule]:
+    """Rules from a JSON list of rule objects, given inline or as a file path"""
+    source = source.strip()
+    if not source.startswith('['):
+        with open(source) as f:
+            source = f.read()
+    return [AlertRule(**rule) for rule in json.loads(source)]
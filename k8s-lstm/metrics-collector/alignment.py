@@ -0,0 +1,97 @@
+from itertools import chain
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# (timestamps, values) pair for one aggregated metric, sorted by timestamp
+Series = Tuple[np.ndarray, np.ndarray]
+
+EMPTY_SERIES: Series = (np.empty(0), np.empty(0))
+
+
+def _parse_series_individually(results: List[Dict]) -> np.ndarray:
+    """Slow path: parse series one by one, skipping any that are malformed"""
+    arrays = []
+    for result in results:
+        try:
+            arrays.append(np.asarray(result.get('values') or [], dtype=np.float64).reshape(-1, 2))
+        except (ValueError, TypeError):
+            continue
+    return np.concatenate(arrays) if arrays else np.empty((0, 2))
+
+
+def aggregate_series(results: List[Dict], aggregation: str = 'mean') -> Series:
+    """
+    Reduce every series of a range query result (one per container/node)
+    to a single series with one value per step.
+    Returns sorted unique timestamps and the aggregated value at each.
+    """
+    # Prometheus sends [timestamp, "value"] pairs; parse every sample of
+    # every series in a single NumPy call
+    flat = list(chain.from_iterable(chain.from_iterable(
+        result['values'] for result in results if result.get('values'))))
+    if not flat:
+        return EMPTY_SERIES
+
+    try:
+        samples = np.array(flat, dtype=np.float64).reshape(-1, 2)
+    except (ValueError, TypeError):
+        samples = _parse_series_individually(results)
+
+    samples = samples[np.isfinite(samples[:, 1])]
+    if samples.size == 0:
+        return EMPTY_SERIES
+
+    timestamps, inverse = np.unique(samples[:, 0], return_inverse=True)
+    values = samples[:, 1]
+
+    if aggregation in ('mean', 'sum'):
+        sums = np.bincount(inverse, weights=values, minlength=timestamps.size)
+        if aggregation == 'sum':
+            return timestamps, sums
+        counts = np.bincount(inverse, minlength=timestamps.size)
+        return timestamps, sums / counts
+
+    if aggregation in ('max', 'min'):
+        order = np.argsort(inverse, kind='stable')
+        starts = np.flatnonzero(np.r_[True, np.diff(inverse[order]) != 0])
+        reducer = np.maximum if aggregation == 'max' else np.minimum
+        return timestamps, reducer.reduceat(values[order], starts)
+
+    raise ValueError(f"Unsupported aggregation: {aggregation}")
+
+
+def nearest_indices(timestamps: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """Index of the closest sample in sorted timestamps for every grid point (ties go to the earlier sample)"""
+    if timestamps.size == 1:
+        return np.zeros(grid.size, dtype=np.intp)
+
+    right = np.clip(np.searchsorted(timestamps, grid), 1, timestamps.size - 1)
+    left = right - 1
+    use_left = (grid - timestamps[left]) <= (timestamps[right] - grid)
+    return np.where(use_left, left, right)
+
+
+def align_to_grid(series: Dict[str, Series],
+                  metric_names: List[str],
+                  sequence_length: int,
+                  fill_value: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Align aggregated series onto a common step grid made of the most recent
+    sequence_length timestamps seen across all metrics.
+    Returns the grid and a [sequence_length, features] matrix whose columns
+    follow metric_names; metrics without data are filled with fill_value.
+    """
+    non_empty = [ts for ts, _ in series.values() if ts.size]
+    if not non_empty:
+        return np.empty(0), np.empty((0, len(metric_names)))
+
+    grid = np.unique(np.concatenate(non_empty))[-sequence_length:]
+    matrix = np.full((grid.size, len(metric_names)), fill_value, dtype=np.float64)
+
+    for column, metric_name in enumerate(metric_names):
+        timestamps, values = series.get(metric_name, EMPTY_SERIES)
+        if timestamps.size:
+            matrix[:, column] = values[nearest_indices(timestamps, grid)]
+
+    return grid, matrix
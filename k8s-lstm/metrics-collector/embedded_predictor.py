@@ -0,0 +1,27 @@
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from numpy_lstm import NumpyLSTM
+from preprocessing import PreprocessingSpec
+
+
+class EmbeddedPredictor:
+    """
+    In-process replacement for the model service: same scaling, forward
+    pass and inverse scaling as the service's run_inference, so a batch
+    of raw sequences gives the same [batch, horizon, targets] forecast.
+    """
+
+    def __init__(self,
+                 model_path: str,
+                 scalers_path: str,
+                 architecture_path: Optional[str] = None):
+        self.model = NumpyLSTM.from_h5(model_path, architecture_path)
+        self.preprocessing = PreprocessingSpec.load(scalers_path)
+        logger.info(f"Embedded model loaded from {model_path} (scalers: {scalers_path})")
+
+    def predict(self, sequences: np.ndarray) -> np.ndarray:
+        scaled = self.preprocessing.transform_features(sequences)
+        return self.preprocessing.inverse_targets(self.model.predict(scaled))
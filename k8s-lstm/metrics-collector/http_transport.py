@@ -0,0 +1,304 @@
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from loguru import logger
+from prometheus_client import Counter, Gauge
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Connection reuse counters: requests - opened connections = reused sockets
+http_requests_total = Counter(
+    "http_transport_requests_total",
+    "HTTP requests sent through the shared transport",
+    ["upstream"]
+)
+http_connections_opened = Counter(
+    "http_transport_connections_opened_total",
+    "New TCP/TLS connections opened by the shared transport",
+    ["host"]
+)
+http_connections_reused = Counter(
+    "http_transport_connections_reused_total",
+    "Requests served over an already open keep-alive connection",
+    ["host"]
+)
+http_retries_total = Counter(
+    "http_transport_retries_total",
+    "Retried HTTP requests",
+    ["upstream"]
+)
+circuit_state = Gauge(
+    "http_transport_circuit_open",
+    "1 if the circuit breaker for an upstream is open",
+    ["upstream"]
+)
+
+# Statuses worth retrying on idempotent requests
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request to an upstream whose circuit is open"""
+
+
+class _CountingConnectionMixin:
+    def connect(self):
+        http_connections_opened.labels(host=self.host).inc()
+        return super().connect()
+
+
+class _CountingHTTPConnection(_CountingConnectionMixin, HTTPConnection):
+    pass
+
+
+class _CountingHTTPSConnection(_CountingConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _CountingPoolMixin:
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        # A pooled connection with a live socket skips the handshake
+        if getattr(conn, 'sock', None) is not None:
+            http_connections_reused.labels(host=self.host).inc()
+        return conn
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose per-host pools count opened and reused connections"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for a single upstream.
+    Opens after failure_threshold failures, then lets one trial request
+    through (half-open) once reset_timeout seconds have passed.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._half_open_trial = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Check whether a request may be sent to the upstream"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            if self._half_open_trial:
+                return False
+            # Half-open: let a single trial request through
+            self._half_open_trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit for {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self._half_open_trial = False
+        circuit_state.labels(upstream=self.name).set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._half_open_trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._half_open_trial:
+                    logger.warning(
+                        f"Circuit for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self._half_open_trial = False
+                circuit_state.labels(upstream=self.name).set(1)
+
+
+class HTTPTransport:
+    """
+    Keep-alive HTTP transport shared by the collector, the model client and
+    the alert manager. One requests.Session holds a connection pool per
+    host; every upstream gets its own default headers/auth (built once),
+    retry policy with jittered exponential backoff and circuit breaker.
+    """
+
+    def __init__(self):
+        self.pool_maxsize = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+        self.max_retries = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+        self.backoff_factor = float(
+            os.getenv('HTTP_BACKOFF_FACTOR', '0.2'))  # seconds
+        self.backoff_max = float(os.getenv('HTTP_BACKOFF_MAX', '5'))
+        self.failure_threshold = int(
+            os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+        self.reset_timeout = float(
+            os.getenv('CIRCUIT_RESET_SECONDS', '30'))
+
+        self.session = requests.Session()
+        adapter = _CountingHTTPAdapter(
+            pool_connections=int(os.getenv('HTTP_POOL_CONNECTIONS', '10')),
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0)  # retries are handled here, with jitter
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # urllib3 transparently decodes gzip/deflate bodies
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+        self.upstream_headers: Dict[str, Dict[str, str]] = {}
+        self.upstream_auth: Dict[str, Optional[tuple]] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def register_upstream(self,
+                          name: str,
+                          headers: Optional[Dict[str, str]] = None,
+                          auth: Optional[tuple] = None):
+        """Register default headers and auth sent with every request to an upstream"""
+        self.upstream_headers[name] = dict(headers or {})
+        self.upstream_auth[name] = auth
+        self._get_breaker(name)
+
+    def _get_breaker(self, name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(
+                    name,
+                    CircuitBreaker(name, self.failure_threshold, self.reset_timeout))
+        return breaker
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    @staticmethod
+    def _cut_timeout(timeout, left: float):
+        """A requests timeout (seconds or a (connect, read) tuple) cut to left seconds"""
+        left = max(0.01, left)
+        if timeout is None:
+            return left
+        if isinstance(timeout, tuple):
+            return tuple(left if t is None else min(t, left) for t in timeout)
+        return min(timeout, left)
+
+    def request(self,
+                upstream: str,
+                method: str,
+                url: str,
+                retries: Optional[int] = None,
+                deadline: Optional[float] = None,
+                **kwargs) -> requests.Response:
+        """
+        Send a request to an upstream. Idempotent requests (GET) are retried on
+        connection errors, timeouts and 429/502/503/504; others only on connect
+        timeouts, so a webhook or deployment trigger is never sent twice.
+        Raises CircuitOpenError while the upstream's circuit is open.
+
+        deadline (a time.monotonic() value) bounds the whole request: every
+        attempt's timeout is cut to the time left, no retry starts that could
+        not begin before it, and once it has passed nothing is sent and
+        requests.exceptions.Timeout is raised.
+        """
+        if deadline is not None and deadline <= time.monotonic():
+            raise requests.exceptions.Timeout(f"Deadline for {upstream} request has passed")
+        breaker = self._get_breaker(upstream)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit for {upstream} is open")
+
+        default_headers = self.upstream_headers.get(upstream)
+        if default_headers:
+            kwargs['headers'] = {**default_headers, **(kwargs.get('headers') or {})}
+        if 'auth' not in kwargs and self.upstream_auth.get(upstream):
+            kwargs['auth'] = self.upstream_auth[upstream]
+
+        idempotent = method.upper() in ('GET', 'HEAD', 'OPTIONS')
+        retries = self.max_retries if retries is None else retries
+        timeout = kwargs.pop('timeout', None)
+
+        attempt = 0
+        while True:
+            if deadline is not None:
+                kwargs['timeout'] = self._cut_timeout(timeout, deadline - time.monotonic())
+            elif timeout is not None:
+                kwargs['timeout'] = timeout
+            http_requests_total.labels(upstream=upstream).inc()
+            delay = self._backoff(attempt + 1)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                # A connect timeout never reached the upstream, so it is safe
+                # to retry for any method
+                retryable = idempotent or isinstance(
+                    e, requests.exceptions.ConnectTimeout)
+                # No retry that could only start at or past the deadline
+                out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+                if not retryable or attempt >= retries or out_of_time:
+                    breaker.record_failure()
+                    raise
+            except BaseException:
+                # Any other error (a broken chunked or compressed body, an
+                # invalid URL, an interrupt) also ends the request: record
+                # it, so a half-open trial never stays outstanding
+                breaker.record_failure()
+                raise
+            else:
+                out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+                if idempotent and response.status_code in RETRY_STATUSES \
+                        and attempt < retries and not out_of_time:
+                    response.close()
+                elif response.status_code >= 500:
+                    breaker.record_failure()
+                    return response
+                else:
+                    breaker.record_success()
+                    return response
+
+            attempt += 1
+            http_retries_total.labels(upstream=upstream).inc()
+            logger.debug(f"Retrying {upstream} request in {delay:.2f}s (attempt {attempt})")
+            time.sleep(delay)
+
+    def get(self, upstream: str, url: str, **kwargs) -> requests.Response:
+        return self.request(upstream, 'GET', url, **kwargs)
+
+    def post(self, upstream: str, url: str, **kwargs) -> requests.Response:
+        return self.request(upstream, 'POST', url, **kwargs)
+
+
+_transport: Optional[HTTPTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> HTTPTransport:
+    """Return the process-wide shared transport"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = HTTPTransport()
+    return _transport
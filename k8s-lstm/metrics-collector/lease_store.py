@@ -0,0 +1,311 @@
+import base64
+import fcntl
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple, Optional
+
+from http_transport import HTTPTransport, get_transport
+
+
+class Lease(NamedTuple):
+    holder: str  # identity of the holder, '' once released
+    expires: float  # wall time the lease lapses unless renewed
+    version: Optional[str] = None  # store revision, for compare-and-swap updates
+    transitions: int = 0  # times the lease changed holders, where the store counts them
+
+    def held_by_other(self, identity: str, now: float) -> bool:
+        return bool(self.holder) and self.holder != identity and self.expires > now
+
+
+class LeaseStore(ABC):
+    """
+    Named, expiring leases plus small state blobs, shared by the collector
+    replicas. A lease is held by at most one identity at a time: it can be
+    taken when it does not exist, was released, or has expired. State blobs
+    carry shard checkpoints from one owner to the next.
+    """
+
+    @abstractmethod
+    def try_acquire(self,
+                    name: str,
+                    identity: str,
+                    ttl: float,
+                    known: Optional[Lease] = None) -> bool:
+        """
+        Acquire or renew a lease for ttl seconds. known is the lease as last
+        listed; stores with optimistic concurrency use it to skip a read.
+        """
+
+    @abstractmethod
+    def release(self, name: str, identity: str):
+        """Give a lease up early, if identity holds it"""
+
+    @abstractmethod
+    def list_leases(self) -> Dict[str, Lease]:
+        """Every lease by name, including released and expired ones"""
+
+    @abstractmethod
+    def save_state(self, name: str, data: bytes):
+        """Store a state blob under name, replacing any earlier one"""
+
+    @abstractmethod
+    def load_state(self, name: str) -> Optional[bytes]:
+        """The state blob saved under name, None if there is none"""
+
+
+class MemoryLeaseStore(LeaseStore):
+    """In-process store, for tests and for several collectors in one process"""
+
+    def __init__(self):
+        self._leases: Dict[str, Lease] = {}
+        self._state: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, name, identity, ttl, known=None):
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease and lease.held_by_other(identity, now):
+                return False
+            self._leases[name] = Lease(identity, now + ttl)
+            return True
+
+    def release(self, name, identity):
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease and lease.holder == identity:
+                self._leases[name] = Lease('', 0.0)
+
+    def list_leases(self):
+        with self._lock:
+            return dict(self._leases)
+
+    def save_state(self, name, data):
+        with self._lock:
+            self._state[name] = data
+
+    def load_state(self, name):
+        with self._lock:
+            return self._state.get(name)
+
+
+class FileLeaseStore(LeaseStore):
+    """
+    Leases and state as files in a shared directory (one host, or a shared
+    volume), for running several replicas locally. Lease updates are
+    serialized with an flock on the directory's lock file.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'state'), exist_ok=True)
+        self._lock_path = os.path.join(directory, '.lock')
+        self._leases_path = os.path.join(directory, 'leases.json')
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Lease]:
+        try:
+            with open(self._leases_path) as f:
+                return {name: Lease(*lease) for name, lease in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, leases: Dict[str, Lease]):
+        self._replace(self._leases_path, json.dumps(leases).encode())
+
+    @staticmethod
+    def _replace(path: str, data: bytes):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def try_acquire(self, name, identity, ttl, known=None):
+        now = time.time()
+        with self._locked():
+            leases = self._read()
+            lease = leases.get(name)
+            if lease and lease.held_by_other(identity, now):
+                return False
+            leases[name] = Lease(identity, now + ttl)
+            self._write(leases)
+            return True
+
+    def release(self, name, identity):
+        with self._locked():
+            leases = self._read()
+            lease = leases.get(name)
+            if lease and lease.holder == identity:
+                leases[name] = Lease('', 0.0)
+                self._write(leases)
+
+    def list_leases(self):
+        with self._locked():
+            return self._read()
+
+    def save_state(self, name, data):
+        self._replace(os.path.join(self.directory, 'state', name), data)
+
+    def load_state(self, name):
+        try:
+            with open(os.path.join(self.directory, 'state', name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class KubernetesLeaseStore(LeaseStore):
+    """
+    coordination.k8s.io/v1 Lease objects in the collector's namespace,
+    updated with resourceVersion compare-and-swap, and state blobs in
+    ConfigMaps. Uses the pod's service account, which needs get, list,
+    create and update on leases and configmaps.
+    """
+
+    SERVICE_ACCOUNT = '/var/run/secrets/kubernetes.io/serviceaccount'
+    TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+    def __init__(self,
+                 namespace: str,
+                 group: str = 'metrics-collector',
+                 transport: HTTPTransport = None):
+        host = os.environ['KUBERNETES_SERVICE_HOST']
+        port = os.getenv('KUBERNETES_SERVICE_PORT', '443')
+        self.namespace = namespace
+        self.group = group
+        self.leases_url = (f"https://{host}:{port}/apis/coordination.k8s.io/v1"
+                           f"/namespaces/{namespace}/leases")
+        self.configmaps_url = f"https://{host}:{port}/api/v1/namespaces/{namespace}/configmaps"
+        ca_path = os.path.join(self.SERVICE_ACCOUNT, 'ca.crt')
+        self.verify = ca_path if os.path.exists(ca_path) else True
+        self.transport = transport or get_transport()
+        self.transport.register_upstream(
+            'kubernetes', headers={"Content-Type": "application/json"})
+
+    def _request(self, method: str, url: str, **kwargs):
+        # Projected service account tokens are rotated on disk; read per call
+        with open(os.path.join(self.SERVICE_ACCOUNT, 'token')) as f:
+            token = f.read().strip()
+        return self.transport.request(
+            'kubernetes', method, url,
+            headers={"Authorization": f"Bearer {token}"},
+            verify=self.verify, timeout=5, **kwargs)
+
+    def _object_name(self, name: str) -> str:
+        return f"{self.group}-{name}"
+
+    def _lease(self, body: Dict) -> Lease:
+        spec = body.get('spec') or {}
+        expires = 0.0
+        if spec.get('renewTime'):
+            renewed = datetime.strptime(spec['renewTime'], self.TIME_FORMAT)
+            expires = renewed.replace(tzinfo=timezone.utc).timestamp() + \
+                spec.get('leaseDurationSeconds', 0)
+        return Lease(spec.get('holderIdentity') or '', expires,
+                     body['metadata']['resourceVersion'], spec.get('leaseTransitions') or 0)
+
+    def _get(self, name: str) -> Optional[Dict]:
+        response = self._request('GET', f"{self.leases_url}/{self._object_name(name)}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def try_acquire(self, name, identity, ttl, known=None):
+        now = datetime.now(timezone.utc)
+        spec = {
+            'holderIdentity': identity,
+            'leaseDurationSeconds': int(ttl),
+            'renewTime': now.strftime(self.TIME_FORMAT),
+        }
+        body = None
+        if known is None or known.version is None:
+            body = self._get(name)
+            if body is None:
+                spec['acquireTime'] = spec['renewTime']
+                response = self._request('POST', self.leases_url, json={
+                    'apiVersion': 'coordination.k8s.io/v1',
+                    'kind': 'Lease',
+                    'metadata': {'name': self._object_name(name),
+                                 'labels': {'app': self.group}},
+                    'spec': spec})
+                return response.status_code == 201
+            known = self._lease(body)
+
+        if known.held_by_other(identity, now.timestamp()):
+            return False
+        if known.holder != identity:
+            spec['acquireTime'] = spec['renewTime']
+        # Counted from the lease as read, listed or fetched, so a takeover
+        # of a known lease carries the count on
+        spec['leaseTransitions'] = known.transitions + (known.holder != identity)
+        response = self._request('PUT', f"{self.leases_url}/{self._object_name(name)}", json={
+            'apiVersion': 'coordination.k8s.io/v1',
+            'kind': 'Lease',
+            'metadata': {'name': self._object_name(name),
+                         'labels': {'app': self.group},
+                         'resourceVersion': known.version},
+            'spec': spec})
+        # 409: someone else updated the lease since it was read
+        return response.status_code == 200
+
+    def release(self, name, identity):
+        body = self._get(name)
+        if body is None or self._lease(body).holder != identity:
+            return
+        body['spec']['holderIdentity'] = None
+        body['spec']['renewTime'] = None
+        self._request('PUT', f"{self.leases_url}/{self._object_name(name)}", json=body)
+
+    def list_leases(self):
+        response = self._request('GET', self.leases_url, params={'labelSelector': f"app={self.group}"})
+        response.raise_for_status()
+        prefix = f"{self.group}-"
+        return {item['metadata']['name'][len(prefix):]: self._lease(item)
+                for item in response.json().get('items', [])
+                if item['metadata']['name'].startswith(prefix)}
+
+    def save_state(self, name, data):
+        configmap = {
+            'apiVersion': 'v1',
+            'kind': 'ConfigMap',
+            'metadata': {'name': self._object_name(f"state-{name}"),
+                         'labels': {'app': self.group}},
+            'binaryData': {'state': base64.b64encode(data).decode()}}
+        response = self._request(
+            'PUT', f"{self.configmaps_url}/{self._object_name(f'state-{name}')}", json=configmap)
+        if response.status_code == 404:
+            response = self._request('POST', self.configmaps_url, json=configmap)
+        response.raise_for_status()
+
+    def load_state(self, name):
+        response = self._request(
+            'GET', f"{self.configmaps_url}/{self._object_name(f'state-{name}')}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        data = (response.json().get('binaryData') or {}).get('state')
+        return base64.b64decode(data) if data else None
+
+
+def create_lease_store(kind: str, namespace: str, directory: str) -> LeaseStore:
+    if kind == 'kubernetes':
+        return KubernetesLeaseStore(namespace)
+    if kind == 'file':
+        return FileLeaseStore(directory)
+    if kind == 'memory':
+        return MemoryLeaseStore()
+    raise ValueError(f"LEASE_STORE must be 'kubernetes', 'file' or 'memory', got {kind}")
@@ -0,0 +1,168 @@
+import json
+import re
+from typing import Callable, Dict, List, Optional
+
+import h5py
+import numpy as np
+
+# The model service has an identical copy of this module
+
+ACTIVATIONS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+}
+
+# Lambda layers hold pickled Python bytecode that cannot be run safely (or
+# portably across Python versions), so the known ones are mapped by name
+LAMBDAS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'last_timestep': lambda x: x[:, -1, :],
+}
+
+
+def _activation(name: str) -> Callable[[np.ndarray], np.ndarray]:
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation: {name}")
+    return ACTIVATIONS[name]
+
+
+class NumpyLSTM:
+    """
+    Pure NumPy forward pass of the Keras model trained in the notebook
+    (stacked LSTM -> multi-head self-attention -> last timestep -> dense),
+    built from the HDF5 weights and the model config, without TensorFlow.
+
+    The layer graph is linear, so layers are run in order. Dropout is a
+    no-op at inference time.
+    """
+
+    def __init__(self, layers: List[Dict], weights: Dict[str, Dict[str, np.ndarray]]):
+        # (class_name, config, params, step) per layer; step is None for
+        # layers that are a no-op at inference time
+        self.layers = []
+        for layer in layers:
+            class_name, config = layer['class_name'], layer['config']
+            params = weights.get(config['name'], {})
+            build = getattr(self, f"_build_{class_name.lower()}", None)
+            if build is None:
+                raise ValueError(f"Unsupported layer {config['name']} ({class_name})")
+            self.layers.append((class_name, config, params, build(config, params)))
+        self._steps = [step for _, _, _, step in self.layers if step is not None]
+
+    @classmethod
+    def from_h5(cls, model_path: str, architecture_path: Optional[str] = None) -> 'NumpyLSTM':
+        """
+        Load a model saved with save_format='h5'. The architecture is read
+        from the file itself unless a model.to_json() file is given.
+        """
+        with h5py.File(model_path, 'r') as f:
+            if architecture_path:
+                with open(architecture_path) as arch:
+                    model_config = json.load(arch)
+            else:
+                model_config = json.loads(f.attrs['model_config'])
+
+            group = f['model_weights'] if 'model_weights' in f else f
+            weights = {}
+            for layer_name in group.attrs['layer_names']:
+                layer_name = layer_name.decode() if isinstance(layer_name, bytes) else layer_name
+                layer_group = group[layer_name]
+                params = {}
+                for weight_name in layer_group.attrs['weight_names']:
+                    weight_name = weight_name.decode() if isinstance(weight_name, bytes) else weight_name
+                    # "multi_head_attention/query/kernel:0" -> "query/kernel"
+                    key = weight_name.split(':')[0].split('/', 1)[-1]
+                    key = re.sub(r'^lstm_cell[^/]*/', '', key)
+                    params[key] = np.asarray(layer_group[weight_name], dtype=np.float32)
+                weights[layer_name] = params
+
+        return cls(model_config['config']['layers'], weights)
+
+    # Layer builders: each returns a function of the previous activations
+
+    def _build_inputlayer(self, config, params):
+        return None
+
+    def _build_dropout(self, config, params):
+        return None
+
+    def _build_lambda(self, config, params):
+        if config['name'] not in LAMBDAS:
+            raise ValueError(f"Unsupported Lambda layer: {config['name']}")
+        return LAMBDAS[config['name']]
+
+    def _build_reshape(self, config, params):
+        target_shape = tuple(config['target_shape'])
+        return lambda x: x.reshape((x.shape[0],) + target_shape)
+
+    def _build_dense(self, config, params):
+        kernel, bias = params['kernel'], params.get('bias')
+        activation = _activation(config.get('activation', 'linear'))
+
+        def dense(x):
+            y = x @ kernel
+            if bias is not None:
+                y = y + bias
+            return activation(y)
+        return dense
+
+    def _build_lstm(self, config, params):
+        kernel, recurrent, bias = params['kernel'], params['recurrent_kernel'], params.get('bias')
+        units = config['units']
+        activation = _activation(config.get('activation', 'tanh'))
+        recurrent_activation = _activation(config.get('recurrent_activation', 'sigmoid'))
+        return_sequences = config.get('return_sequences', False)
+
+        def lstm(x):
+            batch, steps, _ = x.shape
+            # Input projection for every timestep at once; gates are i, f, c, o
+            projected = x @ kernel
+            if bias is not None:
+                projected = projected + bias
+            h = np.zeros((batch, units), dtype=np.float32)
+            c = np.zeros((batch, units), dtype=np.float32)
+            outputs = np.empty((batch, steps, units), dtype=np.float32) if return_sequences else None
+            for t in range(steps):
+                z = projected[:, t] + h @ recurrent
+                i = recurrent_activation(z[:, :units])
+                f = recurrent_activation(z[:, units:2 * units])
+                c = f * c + i * activation(z[:, 2 * units:3 * units])
+                h = recurrent_activation(z[:, 3 * units:]) * activation(c)
+                if return_sequences:
+                    outputs[:, t] = h
+            return outputs if return_sequences else h
+        return lstm
+
+    def _build_multiheadattention(self, config, params):
+        if config.get('attention_axes') not in (None, [1]):
+            raise ValueError(f"Unsupported attention_axes: {config['attention_axes']}")
+        scale = float(config['key_dim']) ** -0.5
+
+        def project(x, name):
+            y = np.einsum('btd,dnh->btnh', x, params[f'{name}/kernel'])
+            if f'{name}/bias' in params:
+                y = y + params[f'{name}/bias']
+            return y
+
+        def attention(x):
+            # Self-attention: query, key and value are the same sequence
+            query = project(x, 'query') * scale
+            key = project(x, 'key')
+            value = project(x, 'value')
+            scores = np.einsum('bsnh,btnh->bnts', key, query)
+            scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+            scores /= scores.sum(axis=-1, keepdims=True)
+            context = np.einsum('bnts,bsnh->btnh', scores, value)
+            output = np.einsum('btnh,nhd->btd', context, params['attention_output/kernel'])
+            if 'attention_output/bias' in params:
+                output = output + params['attention_output/bias']
+            return output
+        return attention
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Run the model on a [batch, sequence_length, features] array"""
+        x = np.asarray(x, dtype=np.float32)
+        for step in self._steps:
+            x = step(x)
+        return x
@@ -0,0 +1,124 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+# Model inputs and outputs, in column order
+FEATURE_NAMES = ('disk_io', 'node_temperature', 'pod_lifetime_seconds')
+TARGET_NAMES = ('node_cpu_usage', 'node_memory_usage')
+
+SPEC_FILE = 'preprocessing.json'
+
+
+class _ScalerState:
+    """Attribute bag standing in for a pickled scikit-learn scaler"""
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class _ScalerUnpickler(pickle.Unpickler):
+    """Unpickle the fitted scalers without importing scikit-learn"""
+
+    def find_class(self, module, name):
+        if module.startswith('sklearn.'):
+            return _ScalerState
+        return super().find_class(module, name)
+
+
+def _affine(scaler, inverse: bool):
+    """
+    (scale, offset) such that x * scale + offset equals scaler.transform(x),
+    or scaler.inverse_transform(x) when inverse, for a fitted StandardScaler
+    or MinMaxScaler
+    """
+    if hasattr(scaler, 'data_min_'):
+        # MinMaxScaler: x * scale_ + min_
+        scale, offset = scaler.scale_, scaler.min_
+    else:
+        # StandardScaler: (x - mean_) / scale_
+        mean = scaler.mean_ if scaler.mean_ is not None else 0.0
+        std = scaler.scale_ if scaler.scale_ is not None else 1.0
+        scale = 1.0 / np.asarray(std, dtype=np.float64)
+        offset = -np.asarray(mean, dtype=np.float64) * scale
+
+    scale = np.asarray(scale, dtype=np.float64)
+    offset = np.broadcast_to(np.asarray(offset, dtype=np.float64), scale.shape)
+    if inverse:
+        return 1.0 / scale, -offset / scale
+    return scale, offset
+
+
+class PreprocessingSpec:
+    """
+    Input and output scaling of the model as precomputed affine maps: raw
+    features are scaled with x * feature_scale + feature_offset and model
+    outputs are mapped back with y * target_scale + target_offset.
+
+    Derived once from the fitted scalers (or loaded from preprocessing.json)
+    so the hot path needs neither scikit-learn nor reshaped copies. Callers
+    send raw metric values; this is the only normalization applied.
+    The model service has an identical copy of this module.
+    """
+
+    def __init__(self, feature_scale, feature_offset, target_scale, target_offset):
+        self.feature_scale = np.asarray(feature_scale, dtype=np.float32)
+        self.feature_offset = np.asarray(feature_offset, dtype=np.float32)
+        self.target_scale = np.asarray(target_scale, dtype=np.float32)
+        self.target_offset = np.asarray(target_offset, dtype=np.float32)
+
+    @classmethod
+    def from_scalers(cls, scaler_features, scaler_targets) -> 'PreprocessingSpec':
+        feature_scale, feature_offset = _affine(scaler_features, inverse=False)
+        target_scale, target_offset = _affine(scaler_targets, inverse=True)
+        return cls(feature_scale, feature_offset, target_scale, target_offset)
+
+    @classmethod
+    def load(cls, path: str) -> 'PreprocessingSpec':
+        """
+        Load preprocessing.json from a scalers directory, or derive the spec
+        from feature_scaler.pkl / target_scaler.pkl when it is missing
+        """
+        spec_path = os.path.join(path, SPEC_FILE)
+        if os.path.exists(spec_path):
+            with open(spec_path) as f:
+                spec = json.load(f)
+            return cls(spec['feature_scale'], spec['feature_offset'],
+                       spec['target_scale'], spec['target_offset'])
+
+        scalers = []
+        for name in ('feature_scaler.pkl', 'target_scaler.pkl'):
+            with open(os.path.join(path, name), 'rb') as f:
+                scalers.append(_ScalerUnpickler(f).load())
+        return cls.from_scalers(*scalers)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, SPEC_FILE), 'w') as f:
+            json.dump({
+                'features': list(FEATURE_NAMES),
+                'targets': list(TARGET_NAMES),
+                'feature_scale': self.feature_scale.tolist(),
+                'feature_offset': self.feature_offset.tolist(),
+                'target_scale': self.target_scale.tolist(),
+                'target_offset': self.target_offset.tolist(),
+            }, f, indent=2)
+
+    def transform_features(self, x: np.ndarray) -> np.ndarray:
+        """
+        Scale a [..., features] array of raw values. Writes into a single new
+        float32 buffer, leaving x (which may be a read-only request view)
+        untouched.
+        """
+        out = np.multiply(x, self.feature_scale, dtype=np.float32)
+        out += self.feature_offset
+        return out
+
+    def inverse_targets(self, y: np.ndarray) -> np.ndarray:
+        """Map a [..., targets] model output back to target units, in place when writable"""
+        if not y.flags.writeable or y.dtype != np.float32:
+            y = np.array(y, dtype=np.float32)
+        y *= self.target_scale
+        y += self.target_offset
+        return y
@@ -3,26 +3,75 @@ import requests
 from loguru import logger
 import os
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import signal
+import socket
 import sys
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import statistics
+import numpy as np
 from alert_manager import AlertManager
+from alert_rules import forecast_array
+from alignment import aggregate_series, align_to_grid
+from query_planner import QueryPlanner
+from range_cache import RollingSeriesStore
+from scheduler import FixedRateScheduler
+from sharding import ShardCoordinator
+from lease_store import create_lease_store
+from http_transport import get_transport
+from embedded_predictor import EmbeddedPredictor
+from preprocessing import FEATURE_NAMES
+from telemetry import (cycle_duration, cycle_lag, cycle_overruns, last_success,
+                       prediction_duration, query_duration, query_response_bytes, query_series,
+                       shard_handoffs, shards_owned, stage_duration, ticks_missed)
+from wire_format import TENSOR_CONTENT_TYPE, decode_tensor, encode_tensor
 from prometheus_client import Gauge, start_http_server
 
-# Define gauges with units in names
+# Define gauges with units in names. The node label stays empty (and is
+# therefore dropped by Prometheus) unless targets are grouped by node
 cpu_prediction = Gauge(
     "pod_cpu_usage_prediction_cores",
     "Predicted CPU usage (cores) for a pod",
-    ["namespace"]
+    ["namespace", "node"]
 )
 mem_prediction = Gauge(
     "pod_mem_usage_prediction_bytes",
     "Predicted memory usage (bytes) for a pod",
-    ["namespace"]
+    ["namespace", "node"]
 )
 
+# Labels multi-target mode can group targets by
+TARGET_LABELS = ('namespace', 'node')
+
+# Prometheus queries (raw per-container/per-node vectors)
+METRICS_QUERIES = {
+    # Disk I/O (read + write bytes per second)
+    'disk_io': '''
+    rate(container_fs_reads_bytes_total[5m]) + rate(container_fs_writes_bytes_total[5m])
+    ''',
+
+    # Node temperature (if available via node exporter)
+    'node_temperature': '''
+    node_hwmon_temp_celsius
+    ''',
+
+    # Node CPU usage percentage
+    'node_cpu_usage': '''
+    100 - (avg by (instance) (irate(node_cpu_seconds_total{mode="idle"}[5m])) * 100)
+    ''',
+
+    # Node memory usage percentage
+    'node_memory_usage': '''
+    (1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)) * 100
+    ''',
+
+    # Pod lifetime in seconds
+    'pod_lifetime_seconds': '''
+    time() - kube_pod_created
+    '''
+}
+
 class PrometheusMetricsCollector:
     def __init__(self):
         self.prometheus_url = os.getenv(
@@ -39,14 +88,60 @@ class PrometheusMetricsCollector:
             os.getenv(
                 'SEQUENCE_LENGTH',
                 '1'))  # number of data points for LSTM
-        self.alert_manager = AlertManager()  # Initialize the alert manager
+        # Pooled keep-alive transport shared with the alert manager
+        self.transport = get_transport()
+        self.alert_manager = AlertManager(self.transport)  # Initialize the alert manager
         self.auth_token = os.getenv(
             'PROMETHEUS_AUTH_TOKEN')  # Optional Bearer token
         # Optional basic auth user
         self.auth_user = os.getenv('PROMETHEUS_AUTH_USER')
         # Optional basic auth password
         self.auth_pass = os.getenv('PROMETHEUS_AUTH_PASS')
-        
+        # Auth headers are built once, not on every query
+        self.transport.register_upstream(
+            'prometheus',
+            headers=self._get_auth_headers(),
+            auth=self._get_auth_config())
+        self.transport.register_upstream(
+            'model', headers={"Content-Type": "application/json"})
+
+        # Concurrent query fan-out: every query of a cycle runs in parallel
+        # under one overall deadline instead of one 30s timeout per query
+        self.concurrent_queries = os.getenv(
+            'CONCURRENT_QUERIES', 'true').lower() == 'true'
+        self.cycle_deadline = float(
+            os.getenv(
+                'CYCLE_DEADLINE_SECONDS',
+                str(self.collection_interval)))  # seconds
+        # Monotonic time the running cycle should be done by; queries and
+        # model requests are cut to what is left of it
+        self.cycle_deadline_at: Optional[float] = None
+
+        # Fixed-rate schedule: cycles start every collection_interval on the
+        # monotonic clock, so samples reach the sequence buffers on the
+        # evenly spaced cadence the model was trained on
+        self.scheduler = FixedRateScheduler(
+            self.collection_interval,
+            jitter=float(os.getenv('COLLECTION_JITTER_SECONDS', '0')),
+            overrun=os.getenv('OVERRUN_POLICY', 'coalesce').lower(),
+            deadline=self.cycle_deadline)
+        self.query_executor = None
+        if self.concurrent_queries:
+            self.query_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('QUERY_WORKERS', '5')),
+                thread_name_prefix='prom-query')
+        # Metrics that missed the deadline in the most recent cycle
+        self.stale_metrics: List[str] = []
+
+        # Incremental range-query cache for time-series mode: after a full
+        # window is seeded, each cycle only fetches [last_seen_ts, now]
+        self.use_range_cache = os.getenv(
+            'RANGE_QUERY_CACHE', 'true').lower() == 'true'
+        self.range_step = os.getenv('RANGE_QUERY_STEP', '30s')
+        self.range_cache_reseed_every = int(
+            os.getenv('RANGE_CACHE_RESEED_CYCLES', '20'))
+        self.range_cache: Optional[RollingSeriesStore] = None
+
         # Start Prometheus HTTP server
         metrics_port = int(os.getenv('METRICS_PORT', '8000'))
         start_http_server(metrics_port)
@@ -55,40 +150,98 @@ class PrometheusMetricsCollector:
         # Buffer to store time series data
         self.metrics_buffer = deque(maxlen=self.sequence_length)
         self.running = True
-
-        # Prometheus queries
-        self.metrics_queries = {
-            # Disk I/O (read + write bytes per second)
-            'disk_io': '''
-            rate(container_fs_reads_bytes_total[5m]) + rate(container_fs_writes_bytes_total[5m])
-            ''',
-
-            # Node temperature (if available via node exporter)
-            'node_temperature': '''
-            node_hwmon_temp_celsius
-            ''',
-
-            # Node CPU usage percentage
-            'node_cpu_usage': '''
-            100 - (avg by (instance) (irate(node_cpu_seconds_total{mode="idle"}[5m])) * 100)
-            ''',
-
-            # Node memory usage percentage
-            'node_memory_usage': '''
-            (1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes)) * 100
-            ''',
-
-            # Pod lifetime in seconds
-            'pod_lifetime_seconds': '''
-            time() - kube_pod_created
-            '''
-        }
+        self.namespace = os.getenv('POD_NAMESPACE', 'monitoring')
+
+        # Multi-target mode: one sequence buffer per namespace/node, all
+        # ready sequences predicted in one batched model request
+        self.target_label = os.getenv('TARGET_LABEL') or None
+        if self.target_label and self.target_label not in TARGET_LABELS:
+            raise ValueError(
+                f"TARGET_LABEL must be one of {TARGET_LABELS}, got {self.target_label}")
+        self.model_batch_endpoint = os.getenv(
+            'MODEL_BATCH_ENDPOINT', self.model_endpoint.rstrip('/') + '/batch')
+        self.model_max_batch = int(os.getenv('MODEL_MAX_BATCH', '256'))
+        # Encoding of model requests: binary float32 tensors or JSON. Falls
+        # back to JSON if the model service does not accept tensors
+        self.model_wire_format = os.getenv('MODEL_WIRE_FORMAT', 'binary').lower()
+        if self.model_wire_format not in ('binary', 'json'):
+            raise ValueError(
+                f"MODEL_WIRE_FORMAT must be 'binary' or 'json', got {self.model_wire_format}")
+        self.target_idle_cycles = int(os.getenv('TARGET_IDLE_CYCLES', '10'))
+        # Streaming: the model service keeps per-target state, so after a
+        # stream is primed with a full window only the newest step is sent
+        self.model_streaming = os.getenv('MODEL_STREAMING', 'false').lower() == 'true'
+        self.model_stream_endpoint = os.getenv(
+            'MODEL_STREAM_ENDPOINT', self.model_endpoint.rstrip('/') + '/stream')
+        self.open_streams = set()
+        self.target_buffers: Dict[str, deque] = {}
+        self.target_last_seen: Dict[str, int] = {}
+        self.cycle = 0
+
+        # Sharding: several replicas split the targets, coordinated through
+        # leases. A shard's sequence buffers and alert cooldowns move with it,
+        # and only the owner of shard 0 calls the deployment trigger
+        self.shards: Optional[ShardCoordinator] = None
+        if os.getenv('SHARDING', 'false').lower() == 'true':
+            if not self.target_label:
+                raise ValueError("SHARDING requires TARGET_LABEL (multi-target mode)")
+            self.shards = ShardCoordinator(
+                create_lease_store(
+                    os.getenv('LEASE_STORE', 'kubernetes').lower(),
+                    self.namespace,
+                    os.getenv('LEASE_DIR', '/tmp/collector-leases')),
+                identity=os.getenv('REPLICA_ID') or socket.gethostname(),
+                shards=int(os.getenv('SHARD_COUNT', '32')),
+                lease_seconds=float(
+                    os.getenv('LEASE_SECONDS', str(3 * self.collection_interval))))
+            self.shard_checkpoint_cycles = int(os.getenv('SHARD_CHECKPOINT_CYCLES', '6'))
+            self.alert_manager.failover_owner = lambda: self.shards.failover_owner
+            self.alert_manager.delegate_failover = self.shards.request_failover
+
+        # Embedded inference: run the model in-process with NumPy instead of
+        # calling the model service (no network hop, no TensorFlow)
+        self.inference_mode = os.getenv('INFERENCE_MODE', 'remote').lower()
+        self.embedded_model: Optional[EmbeddedPredictor] = None
+        if self.inference_mode == 'embedded':
+            self.embedded_model = EmbeddedPredictor(
+                model_path=os.getenv('EMBEDDED_MODEL_PATH', './models/lstm_model.h5'),
+                scalers_path=os.getenv('EMBEDDED_SCALERS_PATH', './scalers'),
+                architecture_path=os.getenv('EMBEDDED_ARCHITECTURE_PATH') or None)
+        elif self.inference_mode != 'remote':
+            raise ValueError(
+                f"INFERENCE_MODE must be 'remote' or 'embedded', got {self.inference_mode}")
+
+        # Prometheus queries, with aggregation pushed down into PromQL so
+        # Prometheus returns one sample per group instead of every series
+        self.query_planner = QueryPlanner(
+            aggregation=os.getenv('QUERY_AGGREGATION', 'avg'),
+            group_by=self.target_label or os.getenv('QUERY_GROUP_BY') or None,
+            use_recording_rules=os.getenv(
+                'USE_RECORDING_RULES', 'false').lower() == 'true')
+        if os.getenv('QUERY_PUSHDOWN', 'true').lower() == 'true':
+            self.metrics_queries = self.query_planner.plan_all(METRICS_QUERIES)
+        else:
+            self.metrics_queries = dict(METRICS_QUERIES)
 
         logger.info("Initialized PrometheusMetricsCollector:")
         logger.info(f"  Prometheus URL: {self.prometheus_url}")
-        logger.info(f"  Model endpoint: {self.model_endpoint}")
+        if self.embedded_model:
+            logger.info("  Model: embedded (in-process NumPy inference)")
+        else:
+            logger.info(f"  Model endpoint: {self.model_endpoint}")
         logger.info(f"  Collection interval: {self.collection_interval}s")
         logger.info(f"  Sequence length: {self.sequence_length}")
+        logger.info(f"  Concurrent queries: {self.concurrent_queries}")
+        logger.info(f"  Queries: {self.metrics_queries}")
+        if self.target_label:
+            logger.info(f"  Multi-target mode, grouped by: {self.target_label}")
+            if self.streaming:
+                logger.info(f"  Streaming predictions: {self.model_stream_endpoint}")
+        if self.shards:
+            logger.info(f"  Sharding: replica {self.shards.identity}, "
+                        f"{self.shards.shards} shards, {self.shards.lease_seconds:.0f}s leases")
+        logger.info(f"  Cycle deadline: {self.cycle_deadline}s, "
+                    f"overrun policy: {self.scheduler.overrun}")
 
     def _get_auth_headers(self) -> Dict[str, str]:
         """Get authentication headers for Prometheus requests"""
@@ -107,20 +260,27 @@ class PrometheusMetricsCollector:
             return (self.auth_user, self.auth_pass)
         return None
 
-    def query_prometheus_single(self, query: str) -> Optional[List[Dict]]:
-        """Query Prometheus for current values (instant query)"""
+    def query_prometheus_single(
+            self,
+            query: str,
+            timeout: float = 30,
+            metric_name: str = 'unnamed',
+            deadline: Optional[float] = None) -> Optional[List[Dict]]:
+        """
+        Query Prometheus for current values (instant query). deadline (a
+        time.monotonic() value) bounds the query with its retries.
+        """
         try:
             url = f"{self.prometheus_url}/api/v1/query"
             params = {'query': query.strip()}
-            headers = self._get_auth_headers()
-            auth = self._get_auth_config()
 
-            response = requests.get(
-                url,
-                params=params,
-                headers=headers,
-                auth=auth,
-                timeout=30)
+            with query_duration.labels(metric_name, 'instant').time():
+                response = self.transport.get(
+                    'prometheus',
+                    url,
+                    params=params,
+                    timeout=timeout,
+                    deadline=deadline)
             response.raise_for_status()
 
             data = response.json()
@@ -128,7 +288,7 @@ class PrometheusMetricsCollector:
                 logger.error(f"Prometheus query failed: {data}")
                 return None
 
-            return data['data']['result']
+            return self._observe_query_result(metric_name, 'instant', response, data)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Error querying Prometheus: {e}")
@@ -140,29 +300,38 @@ class PrometheusMetricsCollector:
     def query_prometheus_range(self,
                                query: str,
                                duration: str = '5m',
-                               step: str = '30s') -> Optional[List[Dict]]:
-        """Query Prometheus for time series data (range query)"""
+                               step: str = '30s',
+                               timeout: float = 30,
+                               start: Optional[float] = None,
+                               end: Optional[float] = None,
+                               metric_name: str = 'unnamed',
+                               deadline: Optional[float] = None) -> Optional[List[Dict]]:
+        """
+        Query Prometheus for time series data (range query).
+        Covers the last duration unless explicit start/end timestamps are given.
+        deadline (a time.monotonic() value) bounds the query with its retries.
+        """
         try:
             url = f"{self.prometheus_url}/api/v1/query_range"
-            end_time = datetime.now(timezone.utc)
-            start_time = end_time.timestamp() - self._parse_duration(duration)
+            if end is None:
+                end = datetime.now(timezone.utc).timestamp()
+            if start is None:
+                start = end - self._parse_duration(duration)
 
             params = {
                 'query': query.strip(),
-                'start': start_time,
-                'end': end_time.timestamp(),
+                'start': start,
+                'end': end,
                 'step': step
             }
 
-            headers = self._get_auth_headers()
-            auth = self._get_auth_config()
-
-            response = requests.get(
-                url,
-                params=params,
-                headers=headers,
-                auth=auth,
-                timeout=30)
+            with query_duration.labels(metric_name, 'range').time():
+                response = self.transport.get(
+                    'prometheus',
+                    url,
+                    params=params,
+                    timeout=timeout,
+                    deadline=deadline)
             response.raise_for_status()
 
             data = response.json()
@@ -170,12 +339,85 @@ class PrometheusMetricsCollector:
                 logger.error(f"Prometheus range query failed: {data}")
                 return None
 
-            return data['data']['result']
+            return self._observe_query_result(metric_name, 'range', response, data)
 
         except Exception as e:
             logger.error(f"Error in Prometheus range query: {e}")
             return None
 
+    @staticmethod
+    def _observe_query_result(metric_name: str,
+                              query_type: str,
+                              response: requests.Response,
+                              data: Dict) -> List[Dict]:
+        """Record the payload size and series count of a successful query"""
+        result = data['data']['result']
+        query_response_bytes.labels(metric_name, query_type).observe(len(response.content))
+        query_series.labels(metric_name, query_type).set(len(result))
+        return result
+
+    def _time_left(self, limit: float) -> float:
+        """Timeout for a call in the running cycle: limit, cut to the cycle deadline"""
+        if self.cycle_deadline_at is None:
+            return limit
+        return max(0.1, min(limit, self.cycle_deadline_at - time.monotonic()))
+
+    def fan_out_queries(self,
+                        query_fn,
+                        *args,
+                        metric_kwargs: Optional[Dict[str, Dict]] = None) -> tuple:
+        """
+        Run every metric query of a cycle in parallel under one deadline.
+        metric_kwargs optionally holds extra keyword arguments per metric.
+        Returns (results, stale) where results maps metric name to the query
+        result and stale lists the metrics that failed or missed the deadline.
+        """
+        metric_kwargs = metric_kwargs or {}
+        deadline = self._time_left(self.cycle_deadline)
+        # Retries and per-attempt timeouts of every query are cut to this
+        # instant, so no query outlives the cycle
+        deadline_at = time.monotonic() + deadline
+        futures = {
+            self.query_executor.submit(
+                query_fn,
+                query,
+                *args,
+                timeout=deadline,
+                deadline=deadline_at,
+                metric_name=metric_name,
+                **metric_kwargs.get(metric_name, {})): metric_name
+            for metric_name, query in self.metrics_queries.items()
+        }
+        done, not_done = wait(futures, timeout=deadline)
+
+        results = {}
+        stale = []
+        for future in done:
+            result = future.result()
+            if result is None:
+                # Query errored or hit its HTTP timeout: missing, not empty
+                stale.append(futures[future])
+            else:
+                results[futures[future]] = result
+
+        cancelled = 0
+        for future in not_done:
+            # Queries still queued are dropped; running ones end at the
+            # deadline at the latest and their results are discarded
+            cancelled += future.cancel()
+            stale.append(futures[future])
+
+        if stale:
+            logger.warning(
+                f"Stale metrics this cycle (failed or missed the "
+                f"{deadline:.1f}s deadline): {stale}")
+        if not_done:
+            logger.warning(
+                f"{len(not_done)} queries missed the deadline: {cancelled} cancelled "
+                f"before starting, {len(not_done) - cancelled} still ending")
+
+        return results, stale
+
     def _parse_duration(self, duration: str) -> int:
         """Parse duration string to seconds (e.g., '5m' -> 300)"""
         duration = duration.strip().lower()
@@ -226,13 +468,30 @@ class PrometheusMetricsCollector:
             return statistics.mean(values)
 
     def collect_current_metrics(self) -> Optional[Dict[str, float]]:
-        """Collect current metric values from Prometheus"""
+        """
+        Collect current metric values from Prometheus.
+        In concurrent mode, metrics whose query failed or missed the cycle
+        deadline are reported as None (stale) instead of 0.0.
+        """
         try:
             metrics = {}
 
+            if self.concurrent_queries:
+                all_results, self.stale_metrics = self.fan_out_queries(
+                    self.query_prometheus_single)
+            else:
+                all_results, self.stale_metrics = {}, []
+
             for metric_name, query in self.metrics_queries.items():
-                logger.info(f"Querying {metric_name}: {query}")
-                results = self.query_prometheus_single(query)
+                if metric_name in self.stale_metrics:
+                    metrics[metric_name] = None
+                    continue
+
+                if self.concurrent_queries:
+                    results = all_results.get(metric_name)
+                else:
+                    logger.info(f"Querying {metric_name}: {query}")
+                    results = self.query_prometheus_single(query, metric_name=metric_name)
 
                 if results:
                     # Aggregate values across all instances/nodes
@@ -251,145 +510,507 @@ class PrometheusMetricsCollector:
             logger.error(f"Error collecting metrics: {e}")
             return None
 
-    def collect_time_series_metrics(
-            self, duration: str = '10m') -> Optional[List[Dict[str, float]]]:
-        """Collect time series data for multiple timestamps"""
+    def collect_target_metrics(self) -> Optional[Dict[str, Dict[str, float]]]:
+        """
+        Collect current metric values per target (value of target_label).
+        Series without the target label (e.g. node metrics when grouping by
+        namespace) are cluster-wide and apply to every target.
+        """
+        try:
+            if self.concurrent_queries:
+                all_results, self.stale_metrics = self.fan_out_queries(
+                    self.query_prometheus_single)
+            else:
+                all_results, self.stale_metrics = {}, []
+
+            per_target: Dict[str, Dict[str, float]] = {}
+            cluster_wide: Dict[str, float] = {}
+            for metric_name, query in self.metrics_queries.items():
+                if metric_name in self.stale_metrics:
+                    continue
+
+                if self.concurrent_queries:
+                    results = all_results.get(metric_name)
+                else:
+                    results = self.query_prometheus_single(query, metric_name=metric_name)
+
+                if not results:
+                    logger.warning(f"No data returned for {metric_name}")
+                    cluster_wide[metric_name] = 0.0
+                    continue
+
+                grouped: Dict[str, List[Dict]] = {}
+                for result in results:
+                    target = result.get('metric', {}).get(self.target_label, '')
+                    grouped.setdefault(target, []).append(result)
+
+                for target, series in grouped.items():
+                    value = self.aggregate_metric_values(series, 'mean')
+                    if target:
+                        per_target.setdefault(target, {})[metric_name] = value
+                    else:
+                        cluster_wide[metric_name] = value
+
+            target_metrics = {}
+            for target, values in per_target.items():
+                metrics = {}
+                for metric_name in self.metrics_queries:
+                    if metric_name in self.stale_metrics:
+                        metrics[metric_name] = None
+                    else:
+                        metrics[metric_name] = values.get(
+                            metric_name, cluster_wide.get(metric_name, 0.0))
+                target_metrics[target] = metrics
+
+            logger.info(f"Collected metrics for {len(target_metrics)} targets")
+            return target_metrics
+
+        except Exception as e:
+            logger.error(f"Error collecting target metrics: {e}")
+            return None
+
+    def _get_range_cache(self, duration: str) -> RollingSeriesStore:
+        """Return the range cache, rebuilding it if the window changed"""
+        window = self._parse_duration(duration)
+        if self.range_cache is None or self.range_cache.window_seconds != window:
+            self.range_cache = RollingSeriesStore(
+                window,
+                self._parse_duration(self.range_step),
+                self.range_cache_reseed_every)
+        return self.range_cache
+
+    def collect_time_series_matrix(
+            self, duration: str = '10m') -> Optional[np.ndarray]:
+        """
+        Collect time series data as a [sequence_length, features] matrix.
+        Each metric is aggregated across its label sets per step, then all
+        metrics are aligned onto a common step grid. Columns follow
+        metrics_queries; metrics without data are 0.0 and stale metrics NaN.
+        With the range cache enabled only samples newer than the last seen
+        step are fetched and merged into the rolling per-metric store.
+        """
         try:
-            time_series_data = []
+            # Per-metric query windows: full window, or only the new delta
+            metric_kwargs = {}
+            if self.use_range_cache:
+                cache = self._get_range_cache(duration)
+                now = datetime.now(timezone.utc).timestamp()
+                # Trimmed every cycle, so metrics whose queries return
+                # nothing (or fail) age out of the cache too
+                cache.evict(now)
+                for metric_name in self.metrics_queries:
+                    start, end = cache.query_range(metric_name, now)
+                    metric_kwargs[metric_name] = {'start': start, 'end': end}
+
+            if self.concurrent_queries:
+                all_results, self.stale_metrics = self.fan_out_queries(
+                    self.query_prometheus_range, duration, self.range_step,
+                    metric_kwargs=metric_kwargs)
+            else:
+                all_results, self.stale_metrics = {}, []
 
-            # Get time series for each metric
+            # Aggregate each metric to one value per step
             all_series = {}
             for metric_name, query in self.metrics_queries.items():
-                logger.info(f"Querying time series for {metric_name}")
-                results = self.query_prometheus_range(query, duration)
+                if metric_name in self.stale_metrics:
+                    continue
+
+                if self.concurrent_queries:
+                    results = all_results.get(metric_name)
+                else:
+                    logger.info(f"Querying time series for {metric_name}")
+                    results = self.query_prometheus_range(
+                        query, duration, self.range_step,
+                        metric_name=metric_name,
+                        **metric_kwargs.get(metric_name, {}))
 
                 if results:
-                    # Extract time series values
-                    series_values = []
-                    for result in results:
-                        if 'values' in result:
-                            for timestamp, value in result['values']:
-                                try:
-                                    series_values.append(
-                                        (float(timestamp), float(value)))
-                                except ValueError:
-                                    continue
-
-                    if series_values:
-                        # Sort by timestamp and aggregate if multiple series
-                        series_values.sort(key=lambda x: x[0])
-                        all_series[metric_name] = series_values
+                    series = aggregate_series(results, 'mean')
+                    if self.use_range_cache:
+                        cache.merge(
+                            metric_name, series,
+                            metric_kwargs[metric_name]['start'], now)
+                        series = cache.series(metric_name)
+                    all_series[metric_name] = series
+                elif self.use_range_cache and cache.series(metric_name)[0].size:
+                    # Empty delta (gap): keep what is still in the window,
+                    # the next query starts from the last seen sample again
+                    all_series[metric_name] = cache.series(metric_name)
                 else:
                     logger.warning(f"No time series data for {metric_name}")
-                    all_series[metric_name] = []
-
-            # Align timestamps and create sequence
-            if all_series:
-                # Find common timestamps (simplified approach)
-                timestamps = set()
-                for series in all_series.values():
-                    if series:
-                        timestamps.update([ts for ts, _ in series])
-
-                # Sort timestamps and take recent ones
-                sorted_timestamps = sorted(timestamps)[-self.sequence_length:]
-
-                for ts in sorted_timestamps:
-                    metrics_point = {}
-                    for metric_name in self.metrics_queries.keys():
-                        # Find closest value for this timestamp
-                        series = all_series.get(metric_name, [])
-                        if series:
-                            closest_value = min(
-                                series, key=lambda x: abs(
-                                    x[0] - ts))[1]
-                            metrics_point[metric_name] = closest_value
-                        else:
-                            metrics_point[metric_name] = 0.0
-
-                    time_series_data.append(metrics_point)
-
-            logger.info(
-                f"Collected {len(time_series_data)} time series points")
-            return time_series_data
-    
+
+            # Align onto the common step grid
+            metric_names = list(self.metrics_queries.keys())
+            _, matrix = align_to_grid(
+                all_series, metric_names, self.sequence_length)
+            for metric_name in self.stale_metrics:
+                matrix[:, metric_names.index(metric_name)] = np.nan
+
+            logger.info(f"Collected {len(matrix)} time series points")
+            return matrix
+
         except Exception as e:
             logger.error(f"Error collecting time series metrics: {e}")
             return None
 
-    def normalize_metrics(self, metrics: Dict[str, float]) -> List[float]:
-        """Normalize metrics for model input"""
+    def collect_time_series_metrics(
+            self, duration: str = '10m') -> Optional[List[Dict[str, float]]]:
+        """Collect time series data for multiple timestamps"""
+        matrix = self.collect_time_series_matrix(duration)
+        if matrix is None:
+            return None
+
+        metric_names = list(self.metrics_queries.keys())
+        return [
+            {metric_name: (None if np.isnan(value) else float(value))
+             for metric_name, value in zip(metric_names, row)}
+            for row in matrix
+        ]
+
+    def feature_vector(self, metrics: Dict[str, float]) -> Optional[List[float]]:
+        """
+        Model features of one sample, as raw metric values in model input
+        order. Scaling happens once, in the model service (or the embedded
+        model), from the spec derived from the fitted scalers.
+        """
+        features = []
+        for metric_name in FEATURE_NAMES:
+            value = metrics.get(metric_name, 0.0)
+            if value is None:
+                # Never feed a stale metric to the model as 0.0
+                logger.warning(
+                    f"Skipping sample: {metric_name} is stale this cycle")
+                return None
+            features.append(value)
+        return features
+
+    def _post_to_model(self, url: str, data: np.ndarray) -> requests.Response:
+        """POST sequences to the model service in the negotiated wire format"""
+        if self.model_wire_format == 'binary':
+            response = self.transport.post(
+                'model',
+                url,
+                data=encode_tensor(data),
+                headers={"Content-Type": TENSOR_CONTENT_TYPE, "Accept": TENSOR_CONTENT_TYPE},
+                timeout=self._time_left(30)
+            )
+            # Older model services only parse JSON bodies
+            if not (response.status_code == 415 or
+                    (response.status_code == 422 and 'json_invalid' in response.text)):
+                return response
+            logger.warning("Model service does not accept binary tensors, falling back to JSON")
+            self.model_wire_format = 'json'
+
+        return self.transport.post(
+            'model',
+            url,
+            json={"data": data.tolist()},
+            timeout=self._time_left(30)
+        )
+
+    @staticmethod
+    def _is_tensor_response(response: requests.Response) -> bool:
+        return response.headers.get('Content-Type', '').startswith(TENSOR_CONTENT_TYPE)
+
+    def send_prediction_request(
+            self, sequence_data: Union[List[List[float]], np.ndarray]) -> Optional[Dict]:
+        """Send sequence data to LSTM model for prediction"""
         try:
-            # Define normalization ranges (adjust based on your model training)
-            normalization_ranges = {
-                'disk_io': {'min': 0, 'max': 1000000},  # 0-1MB/s
-                'node_temperature': {'min': 20, 'max': 80},  # 20-80°C
-                # 'node_cpu_usage': {'min': 0, 'max': 100},  # 0-100%
-                # 'node_memory_usage': {'min': 0, 'max': 100},  # 0-100%
-                'pod_lifetime_seconds': {'min': 0, 'max': 86400}  # 0-24 hours
-            }
+            if self.embedded_model:
+                # Same layout as the service's /predict response
+                with prediction_duration.labels('embedded').time():
+                    forecast = self.embedded_model.predict(np.array([sequence_data]))[0]
+                result = {"cpu_usage": forecast[0].tolist(), "mem_usage": forecast[1].tolist()}
+            else:
+                with prediction_duration.labels('single').time():
+                    response = self._post_to_model(
+                        self.model_endpoint, np.asarray(sequence_data, dtype=np.float32))
+
+                if response.status_code != 200:
+                    logger.error(f"Prediction failed: {response.status_code} - {response.text}")
+                    return None
+                if self._is_tensor_response(response):
+                    # [horizon, targets] forecast, mapped to the JSON layout
+                    forecast = decode_tensor(response.content)
+                    result = {"cpu_usage": forecast[0].tolist(), "mem_usage": forecast[1].tolist()}
+                else:
+                    result = response.json()
 
-            normalized = []
-            for metric_name in [
-                'disk_io',
-                'node_temperature',
-                    'pod_lifetime_seconds']:  # 'node_cpu_usage',  'node_memory_usage',
-                value = metrics.get(metric_name, 0.0)
-                min_val = normalization_ranges[metric_name]['min']
-                max_val = normalization_ranges[metric_name]['max']
+            logger.info(f"Prediction successful: {result}")
 
-                # Min-max normalization to [0, 1]
-                normalized_value = (value - min_val) / (max_val - min_val)
-                normalized_value = max(
-                    0, min(1, normalized_value))  # Clamp to [0, 1]
-                normalized.append(normalized_value)
+            # Check predictions against thresholds
+            if result: # and 'predictions' in result:
+                prediction = {"cpu_usage": result["cpu_usage"], "mem_usage": result["mem_usage"]}
+                alerts = self.alert_manager.check_prediction(prediction)
+                if alerts:
+                    logger.warning(f"Generated alerts: {alerts}")
 
-            return normalized
+                return prediction
 
         except Exception as e:
-            logger.error(f"Error normalizing metrics: {e}")
+            logger.error(f"Error sending prediction request: {e}")
             return None
 
-    def send_prediction_request(
-            self, sequence_data: List[List[float]]) -> Optional[Dict]:
-        """Send sequence data to LSTM model for prediction"""
+    def send_batch_prediction_request(
+            self, sequences: Dict[str, List[List[float]]]) -> Optional[Dict[str, Dict]]:
+        """
+        Send the sequences of many targets to the model's batch endpoint,
+        at most model_max_batch per request. Returns predictions per target.
+        """
+        targets = list(sequences)
+        predictions = {}
+        # [targets, horizon, metrics] forecasts per request, so alert rules
+        # run on the arrays rather than on the per-target lists
+        forecast_targets, forecast_arrays = [], []
+        if self.embedded_model:
+            try:
+                with prediction_duration.labels('embedded').time():
+                    forecasts = self.embedded_model.predict(
+                        np.array([sequences[target] for target in targets]))
+                for target, forecast in zip(targets, forecasts):
+                    predictions[target] = {
+                        "cpu_usage": forecast[:, 0].tolist(),
+                        "mem_usage": forecast[:, 1].tolist()
+                    }
+                forecast_targets.extend(targets)
+                forecast_arrays.append(forecasts)
+            except Exception as e:
+                logger.error(f"Error running embedded batch prediction: {e}")
+        else:
+            for start in range(0, len(targets), self.model_max_batch):
+                chunk = targets[start:start + self.model_max_batch]
+                try:
+                    with prediction_duration.labels('batch').time():
+                        response = self._post_to_model(
+                            self.model_batch_endpoint,
+                            np.array([sequences[target] for target in chunk], dtype=np.float32))
+                    if response.status_code != 200:
+                        logger.error(f"Batch prediction failed: {response.status_code} - {response.text}")
+                        continue
+
+                    if self._is_tensor_response(response):
+                        forecasts = decode_tensor(response.content)
+                        for target, forecast in zip(chunk, forecasts):
+                            predictions[target] = {
+                                "cpu_usage": forecast[:, 0].tolist(),
+                                "mem_usage": forecast[:, 1].tolist()
+                            }
+                        forecast_targets.extend(chunk)
+                        forecast_arrays.append(forecasts)
+                        continue
+
+                    results = response.json()["predictions"]
+                    for target, result in zip(chunk, results):
+                        predictions[target] = {
+                            "cpu_usage": result["cpu_usage"],
+                            "mem_usage": result["mem_usage"]
+                        }
+                    forecast_targets.extend(chunk[:len(results)])
+                    forecast_arrays.append(forecast_array(results))
+                except Exception as e:
+                    logger.error(f"Error sending batch prediction request: {e}")
+
+        if not predictions:
+            return None
+
+        logger.info(f"Batch prediction successful for {len(predictions)} targets")
+        alerts = self.alert_manager.check_forecasts(
+            forecast_targets, np.concatenate(forecast_arrays))
+        if alerts:
+            logger.warning(f"Generated alerts: {alerts}")
+        return predictions
+
+    @property
+    def streaming(self) -> bool:
+        return self.model_streaming and not self.embedded_model
+
+    def send_stream_request(
+            self, steps: Dict[str, List[List[float]]]) -> Optional[Dict[str, Dict]]:
+        """
+        Push new timesteps to the model's per-target streams, at most
+        model_max_batch targets per request. Returns predictions per target.
+        """
+        targets = list(steps)
+        predictions = {}
+        for start in range(0, len(targets), self.model_max_batch):
+            chunk = targets[start:start + self.model_max_batch]
+            try:
+                with prediction_duration.labels('stream').time():
+                    response = self.transport.post(
+                        'model',
+                        self.model_stream_endpoint,
+                        # The service rejects the push unless its STREAM_WINDOW
+                        # is the window the streams are primed with
+                        json={"steps": {target: steps[target] for target in chunk},
+                              "window": self.sequence_length},
+                        timeout=self._time_left(30)
+                    )
+                if response.status_code != 200:
+                    logger.error(f"Stream prediction failed: {response.status_code} - {response.text}")
+                    continue
+
+                for target, result in response.json()["predictions"].items():
+                    if result["steps"] < self.sequence_length:
+                        # The service lost the stream (restart or eviction) and
+                        # opened an unprimed one; re-prime it next cycle
+                        self.open_streams.discard(target)
+                        continue
+                    self.open_streams.add(target)
+                    predictions[target] = {
+                        "cpu_usage": result["cpu_usage"],
+                        "mem_usage": result["mem_usage"]
+                    }
+            except Exception as e:
+                logger.error(f"Error sending stream prediction request: {e}")
+
+        if not predictions:
+            return None
+
+        logger.info(f"Stream prediction successful for {len(predictions)} targets")
+        alerts = self.alert_manager.check_predictions(predictions)
+        if alerts:
+            logger.warning(f"Generated alerts: {alerts}")
+        return predictions
+
+    def _forget_target(self, target: str):
+        """Drop a target's buffer and published forecast"""
+        self.target_buffers.pop(target, None)
+        self.target_last_seen.pop(target, None)
+        # The model service evicts the idle stream on its own
+        self.open_streams.discard(target)
+        for gauge in (cpu_prediction, mem_prediction):
+            try:
+                gauge.remove(*self._target_labels(target).values())
+            except KeyError:
+                pass
+
+    def _shard_targets(self) -> Dict[int, List[str]]:
+        by_shard: Dict[int, List[str]] = {}
+        for target in self.target_buffers:
+            by_shard.setdefault(self.shards.shard_of(target), []).append(target)
+        return by_shard
+
+    def checkpoint_shards(self, shards: List[int]):
+        """Save the state of shards for whichever replica owns them next"""
+        by_shard = self._shard_targets()
+        for shard in shards:
+            targets = by_shard.get(shard, [])
+            self.shards.save_shard(shard, {
+                'saved': time.time(),
+                'buffers': {target: list(self.target_buffers[target]) for target in targets},
+                'idle': {target: self.cycle - self.target_last_seen[target] for target in targets},
+                'streams': [target for target in targets if target in self.open_streams],
+                'cooldowns': self.alert_manager.rules.export_cooldowns(targets),
+            })
+
+    def _restore_shard(self, state: Dict):
+        self.alert_manager.rules.import_cooldowns(state['cooldowns'])
+        if time.time() - state['saved'] > self.sequence_length * self.collection_interval:
+            # Older than a whole window: the buffers would only add a gap
+            return
+        for target, buffer in state['buffers'].items():
+            self.target_buffers[target] = deque(buffer, maxlen=self.sequence_length)
+            self.target_last_seen[target] = self.cycle - state['idle'].get(target, 0)
+        self.open_streams.update(state['streams'])
+
+    def sync_shards(self):
+        """Renew leases, hand shards off or take them over, and checkpoint periodically"""
         try:
-            payload = {"data": sequence_data}
+            changes = self.shards.heartbeat()
+        except Exception as e:
+            logger.error(f"Lease store unavailable: {e}")
+            changes = self.shards.expire()
+
+        if changes.released:
+            self.checkpoint_shards(changes.released)
+            self.shards.release(changes.released)
+        by_shard = self._shard_targets()
+        for shard in changes.released + changes.lost:
+            for target in by_shard.get(shard, []):
+                self._forget_target(target)
+        for shard in changes.acquired:
+            state = self.shards.load_shard(shard)
+            if state:
+                self._restore_shard(state)
+
+        # Periodic checkpoints are what a shard resumes from if this replica dies
+        if self.cycle % self.shard_checkpoint_cycles == 0:
+            self.checkpoint_shards(sorted(self.shards.owned))
+
+        request = self.shards.take_failover_request()
+        if request:
+            logger.warning(f"Failover requested by replica {request['replica']}")
+            self.alert_manager.trigger_failover([request])
+
+        shards_owned.set(len(self.shards.owned))
+        for direction, shards in changes._asdict().items():
+            if shards:
+                shard_handoffs.labels(direction).inc(len(shards))
+
+    def run_multi_target_collection(self) -> Optional[Dict[str, Dict]]:
+        """Run a collection cycle keeping one sequence buffer per target"""
+        if self.shards:
+            with stage_duration.labels('shards').time():
+                self.sync_shards()
+
+        with stage_duration.labels('collect').time():
+            target_metrics = self.collect_target_metrics()
+        if self.shards and target_metrics:
+            # Queries return every target (Prometheus cannot select by hash);
+            # everything after this only handles the shards this replica owns
+            target_metrics = {target: metrics for target, metrics in target_metrics.items()
+                              if self.shards.owns(target)}
+        if not target_metrics:
+            return None
 
-            response = requests.post(
-                self.model_endpoint,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=30
-            )
+        self.cycle += 1
+        ready = {}
+        with stage_duration.labels('normalize').time():
+            for target, metrics in target_metrics.items():
+                features = self.feature_vector(metrics)
+                if not features:
+                    continue
 
-            if response.status_code == 200:
-                result = response.json()
-                logger.info(f"Prediction successful: {result}")
+                buffer = self.target_buffers.get(target)
+                if buffer is None:
+                    buffer = self.target_buffers[target] = deque(maxlen=self.sequence_length)
+                buffer.append(features)
+                self.target_last_seen[target] = self.cycle
 
-                # Check predictions against thresholds
-                if result: # and 'predictions' in result:
-                    prediction = {"cpu_usage": result["cpu_usage"], "mem_usage": result["mem_usage"]}
-                    alerts = self.alert_manager.check_prediction(prediction)
-                    if alerts:
-                        logger.warning(f"Generated alerts: {alerts}")
+                if len(buffer) >= self.sequence_length:
+                    if self.streaming and target in self.open_streams:
+                        ready[target] = [features]
+                    else:
+                        ready[target] = list(buffer)
 
-                    return prediction
-            else:
-                logger.error(f"Prediction failed: {response.status_code} - {response.text}")
-                return None
+        # Forget targets that disappeared (deleted namespaces, removed nodes)
+        for target in [t for t, seen in self.target_last_seen.items()
+                       if self.cycle - seen > self.target_idle_cycles]:
+            self._forget_target(target)
 
-        except Exception as e:
-            logger.error(f"Error sending prediction request: {e}")
+        if not ready:
             return None
+        if self.streaming:
+            return self.send_stream_request(ready)
+        return self.send_batch_prediction_request(ready)
+
+    def _target_labels(self, target: Optional[str] = None) -> Dict[str, str]:
+        """Gauge labels for a target (or the whole cluster when None)"""
+        if target is None:
+            return {'namespace': self.namespace, 'node': ''}
+        if self.target_label == 'namespace':
+            return {'namespace': target, 'node': ''}
+        return {'namespace': self.namespace, 'node': target}
 
     def run_single_collection(self):
         """Run a single collection cycle with current metrics"""
-        metrics = self.collect_current_metrics()
+        with stage_duration.labels('collect').time():
+            metrics = self.collect_current_metrics()
         if metrics:
-            normalized = self.normalize_metrics(metrics)
-            if normalized:
-                self.metrics_buffer.append(normalized)
+            with stage_duration.labels('normalize').time():
+                features = self.feature_vector(metrics)
+            if features:
+                self.metrics_buffer.append(features)
 
                 if len(self.metrics_buffer) >= self.sequence_length:
                     # Send sequence to model
@@ -398,52 +1019,97 @@ class PrometheusMetricsCollector:
 
     def run_time_series_collection(self):
         """Run collection with time series data"""
-        time_series = self.collect_time_series_metrics()
-        if time_series and len(time_series) >= self.sequence_length:
-            # Normalize each time point
-            normalized_sequence = []
-            for metrics_point in time_series[-self.sequence_length:]:
-                normalized = self.normalize_metrics(metrics_point)
-                if normalized:
-                    normalized_sequence.append(normalized)
-
-            if len(normalized_sequence) == self.sequence_length:
-                return self.send_prediction_request(normalized_sequence)
+        with stage_duration.labels('collect').time():
+            matrix = self.collect_time_series_matrix()
+        if matrix is None or len(matrix) < self.sequence_length:
+            return None
+
+        # Model feature columns of the aligned matrix, in model input order
+        with stage_duration.labels('normalize').time():
+            metric_names = list(self.metrics_queries.keys())
+            columns = [metric_names.index(metric_name) for metric_name in FEATURE_NAMES]
+            sequence = matrix[-self.sequence_length:, columns]
+        if np.isnan(sequence).any():
+            logger.warning("Skipping sequence: a model feature is stale this cycle")
+            return None
+        return self.send_prediction_request(sequence)
+
+    def run_cycle(self, use_time_series: bool = False) -> bool:
+        """Run one collection cycle; returns True if predictions were published"""
+        if self.target_label:
+            predictions = self.run_multi_target_collection()
+            # Update Prometheus metrics with the next-step forecast
+            for target, prediction in (predictions or {}).items():
+                labels = self._target_labels(target)
+                cpu_prediction.labels(**labels).set(prediction["cpu_usage"][0])
+                mem_prediction.labels(**labels).set(prediction["mem_usage"][0])
+            if predictions:
+                logger.info(f"Updated Prometheus metrics for {len(predictions)} targets")
+            return bool(predictions)
+
+        if use_time_series:
+            prediction = self.run_time_series_collection()
+        else:
+            prediction = self.run_single_collection()
+
+        if prediction:
+            # Update Prometheus metrics
+            labels = self._target_labels()
+            predicted_cpu_usage = prediction["cpu_usage"][1]
+            predicted_mem_usage = prediction["mem_usage"][1]
+            cpu_prediction.labels(**labels).set(predicted_cpu_usage)
+            mem_prediction.labels(**labels).set(predicted_mem_usage)
+            logger.info(f"Updated Prometheus metrics with predictions: CPU={predicted_cpu_usage}, Memory={predicted_mem_usage }")
+        return bool(prediction)
 
     def run_collector(self, use_time_series: bool = False):
         """Main collection loop"""
         logger.info("Starting metrics collection...")
 
-        while self.running:
+        if self.target_label and use_time_series:
+            logger.warning("Multi-target mode uses instant queries; ignoring USE_TIME_SERIES")
+
+        missed = 0
+        for tick in self.scheduler.ticks():
+            if not self.running:
+                break
+            cycle_lag.set(tick.lag)
+            ticks_missed.inc(self.scheduler.missed - missed)
+            missed = self.scheduler.missed
+            self.cycle_deadline_at = tick.deadline
             try:
-                if use_time_series:
-                    prediction = self.run_time_series_collection()
-                else:
-                    prediction = self.run_single_collection()
-                
-                if prediction:
-                    # Get namespace and pod from environment or use defaults
-                    namespace = os.getenv('POD_NAMESPACE', 'monitoring')
-                    
-                    # Update Prometheus metrics
-                    predicted_cpu_usage = prediction["cpu_usage"][1]
-                    predicted_mem_usage = prediction["mem_usage"][1]
-                    cpu_prediction.labels(namespace=namespace).set(predicted_cpu_usage)
-                    mem_prediction.labels(namespace=namespace).set(predicted_mem_usage)
-                    logger.info(f"Updated Prometheus metrics with predictions: CPU={predicted_cpu_usage}, Memory={predicted_mem_usage }")
-                
-                time.sleep(self.collection_interval)
+                with cycle_duration.time():
+                    if self.run_cycle(use_time_series):
+                        last_success.set_to_current_time()
 
             except KeyboardInterrupt:
                 logger.info("Received interrupt signal, stopping...")
-                self.running = False
+                self.stop()
             except Exception as e:
                 logger.error(f"Error in collection loop: {e}")
-                time.sleep(self.collection_interval)
+            finally:
+                self.cycle_deadline_at = None
+
+            if time.monotonic() - tick.started > self.collection_interval:
+                cycle_overruns.inc()
+                logger.warning(
+                    f"Cycle took longer than the {self.collection_interval}s interval "
+                    f"(overrun policy: {self.scheduler.overrun})")
 
     def stop(self):
         """Stop the collector"""
         self.running = False
+        self.scheduler.stop()
+        if self.shards:
+            # Hand every shard off now rather than after the leases expire
+            try:
+                self.checkpoint_shards(sorted(self.shards.owned))
+                self.shards.leave()
+            except Exception as e:
+                logger.error(f"Error handing off shards: {e}")
+        self.alert_manager.close()
+        if self.query_executor:
+            self.query_executor.shutdown(wait=False, cancel_futures=True)
 
 
 def signal_handler(signum, frame):
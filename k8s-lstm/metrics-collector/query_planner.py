@@ -0,0 +1,126 @@
+import argparse
+import json
+import re
+from typing import Dict, List, Optional, Sequence
+
+# Python-side aggregation names mapped to PromQL aggregation operators
+AGGREGATIONS = {
+    'mean': 'avg',
+    'avg': 'avg',
+    'max': 'max',
+    'min': 'min',
+    'sum': 'sum',
+}
+
+
+class QueryPlanner:
+    """
+    Rewrites the collector's PromQL queries so Prometheus does the reduction:
+    each raw per-container/per-node vector is wrapped in the requested
+    aggregation (optionally "by (<label>)"), so one sample per group comes
+    back instead of one per series. Can also emit PrometheusRule recording
+    rules for the planned queries and reference the recorded series instead.
+    """
+
+    def __init__(self,
+                 aggregation: str = 'avg',
+                 group_by: Optional[str] = None,
+                 use_recording_rules: bool = False):
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation: {aggregation}")
+        self.aggregation = AGGREGATIONS[aggregation]
+        self.group_by = group_by
+        self.use_recording_rules = use_recording_rules
+
+    def rule_name(self, metric_name: str) -> str:
+        """Recording rule name following the level:metric:operations convention"""
+        level = self.group_by or 'cluster'
+        return f"{level}:{metric_name}:{self.aggregation}"
+
+    def aggregate(self, query: str) -> str:
+        """Wrap a raw query in the configured aggregation"""
+        query = re.sub(r'\s+', ' ', query).strip()
+        if self.group_by:
+            return f"{self.aggregation} by ({self.group_by}) ({query})"
+        return f"{self.aggregation}({query})"
+
+    def plan(self, metric_name: str, query: str) -> str:
+        """Query to send to Prometheus for a metric"""
+        if self.use_recording_rules:
+            return self.rule_name(metric_name)
+        return self.aggregate(query)
+
+    def plan_all(self, queries: Dict[str, str]) -> Dict[str, str]:
+        return {
+            metric_name: self.plan(metric_name, query)
+            for metric_name, query in queries.items()
+        }
+
+    def rules(self, queries: Dict[str, str]) -> List[str]:
+        """Recording rule entries (YAML lines) for every planned query"""
+        lines = []
+        for metric_name, query in queries.items():
+            lines.append(f"    - record: {self.rule_name(metric_name)}")
+            # JSON strings are valid double-quoted YAML scalars
+            lines.append(f"      expr: {json.dumps(self.aggregate(query))}")
+        return lines
+
+    def recording_rules(self,
+                        queries: Dict[str, str],
+                        name: str = 'metrics-collector-rules',
+                        namespace: str = 'monitoring',
+                        interval: str = '30s') -> str:
+        """PrometheusRule manifest (YAML) recording every planned query"""
+        return recording_rules([self], queries, name, namespace, interval)
+
+
+def recording_rules(planners: Sequence[QueryPlanner],
+                    queries: Dict[str, str],
+                    name: str = 'metrics-collector-rules',
+                    namespace: str = 'monitoring',
+                    interval: str = '30s') -> str:
+    """
+    PrometheusRule manifest (YAML) recording the queries as planned by each
+    planner, e.g. one per level (cluster, namespace, node) the collector
+    may run with
+    """
+    lines = [
+        "apiVersion: monitoring.coreos.com/v1",
+        "kind: PrometheusRule",
+        "metadata:",
+        f"  name: {name}",
+        f"  namespace: {namespace}",
+        "  labels:",
+        "    app: prometheus-metrics-collector",
+        "    release: prometheus",
+        "spec:",
+        "  groups:",
+        f"  - name: {name}",
+        f"    interval: {interval}",
+        "    rules:",
+    ]
+    for planner in planners:
+        lines += planner.rules(queries)
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    from prometheus_collector import METRICS_QUERIES
+
+    parser = argparse.ArgumentParser(
+        description="Print PrometheusRule recording rules for the collector queries")
+    parser.add_argument('--aggregation', default='avg', choices=sorted(AGGREGATIONS))
+    parser.add_argument('--group-by', action='append',
+                        help="namespace, node or cluster (no grouping); repeat for several levels")
+    parser.add_argument('--namespace', default='monitoring')
+    parser.add_argument('--interval', default='30s')
+    args = parser.parse_args()
+
+    planners = [QueryPlanner(args.aggregation, None if level == 'cluster' else level)
+                for level in args.group_by or ['cluster']]
+    print(recording_rules(
+        planners, METRICS_QUERIES, namespace=args.namespace, interval=args.interval), end='')
+
+
+if __name__ == "__main__":
+    main()
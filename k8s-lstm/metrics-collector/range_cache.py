@@ -0,0 +1,96 @@
+import math
+from typing import Dict, Tuple
+
+import numpy as np
+
+from alignment import EMPTY_SERIES, Series
+
+
+class RollingSeriesStore:
+    """
+    Per-metric rolling store of aggregated range query results.
+
+    The first query for a metric fetches the full window; afterwards only
+    [last_seen_ts, now] is requested and merged in. The last stored step is
+    always re-fetched so late scrapes overwrite it. Samples older than the
+    window are evicted on every merge and every cycle (evict()), whether or
+    not the query returned data, so a metric that stopped reporting ends
+    up empty instead of repeating its last values. A metric is re-seeded with a full window when it has
+    never been fetched, when its newest sample fell out of the window
+    (Prometheus outage or restart) or every reseed_every deltas, so any
+    backfilled or rewritten history is picked up again.
+    """
+
+    def __init__(self, window_seconds: float, step_seconds: float, reseed_every: int = 20):
+        self.window_seconds = window_seconds
+        self.step_seconds = step_seconds
+        self.reseed_every = reseed_every
+        self._series: Dict[str, Series] = {}
+        self._deltas_since_seed: Dict[str, int] = {}
+
+    def _align(self, timestamp: float) -> float:
+        """Snap a timestamp down to the step grid so every query shares one grid"""
+        return math.floor(timestamp / self.step_seconds) * self.step_seconds
+
+    def needs_seed(self, metric_name: str, now: float) -> bool:
+        timestamps, _ = self._series.get(metric_name, EMPTY_SERIES)
+        if timestamps.size == 0:
+            return True
+        if timestamps[-1] < now - self.window_seconds:
+            return True
+        return self._deltas_since_seed.get(metric_name, 0) >= self.reseed_every
+
+    def query_range(self, metric_name: str, now: float) -> Tuple[float, float]:
+        """Start and end timestamps of the next range query for a metric"""
+        end = self._align(now)
+        if self.needs_seed(metric_name, now):
+            return end - self.window_seconds, end
+        timestamps, _ = self._series[metric_name]
+        return float(timestamps[-1]), end
+
+    def merge(self, metric_name: str, series: Series, start: float, now: float):
+        """Merge the aggregated result of a query that started at start"""
+        timestamps, values = self._series.get(metric_name, EMPTY_SERIES)
+
+        if self.needs_seed(metric_name, now):
+            # Full window fetched: replace whatever was stored
+            timestamps, values = series
+            self._deltas_since_seed[metric_name] = 0
+        else:
+            new_timestamps, new_values = series
+            # Everything from the query start onwards is superseded
+            keep = np.searchsorted(timestamps, start, side='left')
+            timestamps = np.concatenate((timestamps[:keep], new_timestamps))
+            values = np.concatenate((values[:keep], new_values))
+            self._deltas_since_seed[metric_name] = \
+                self._deltas_since_seed.get(metric_name, 0) + 1
+
+        self._series[metric_name] = (timestamps, values)
+        self._evict(metric_name, now)
+
+    def _evict(self, metric_name: str, now: float):
+        timestamps, values = self._series[metric_name]
+        cutoff = np.searchsorted(
+            timestamps, self._align(now) - self.window_seconds, side='left')
+        if cutoff == timestamps.size:
+            # Nothing left in the window: no data until the next seed
+            self.invalidate(metric_name)
+        else:
+            self._series[metric_name] = (timestamps[cutoff:], values[cutoff:])
+
+    def evict(self, now: float):
+        """Drop the samples of every metric that slid out of the window"""
+        for metric_name in list(self._series):
+            self._evict(metric_name, now)
+
+    def series(self, metric_name: str) -> Series:
+        return self._series.get(metric_name, EMPTY_SERIES)
+
+    def invalidate(self, metric_name: str = None):
+        """Drop stored data so the next query re-seeds"""
+        if metric_name is None:
+            self._series.clear()
+            self._deltas_since_seed.clear()
+        else:
+            self._series.pop(metric_name, None)
+            self._deltas_since_seed.pop(metric_name, None)
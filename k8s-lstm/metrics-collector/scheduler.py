@@ -0,0 +1,79 @@
+import random
+import threading
+import time
+from typing import Iterator, NamedTuple
+
+# What to do when a cycle runs past one or more ticks:
+#   skip      - drop the missed ticks and wait for the next one on the grid
+#   immediate - run every missed tick right away, back to back, to catch up
+#   coalesce  - run one cycle right away for all missed ticks, then resume on the grid
+OVERRUN_POLICIES = ('skip', 'immediate', 'coalesce')
+
+
+class Tick(NamedTuple):
+    index: int  # position on the schedule grid
+    scheduled: float  # monotonic time the tick was due
+    started: float  # monotonic time the cycle actually started
+    deadline: float  # monotonic time the cycle should be done by
+
+    @property
+    def lag(self) -> float:
+        return self.started - self.scheduled
+
+
+class FixedRateScheduler:
+    """
+    Fixed-rate ticks on the monotonic clock: tick n is due at
+    start + offset + n * interval however long the cycles take, so the
+    period does not drift by the cycle's own duration.
+
+    offset is drawn once from [0, jitter) so replicas started together
+    spread their queries over the interval while each keeps a regular
+    cadence. Each tick carries a deadline (start + deadline) the cycle
+    should finish by. stop() wakes a waiting scheduler immediately.
+    """
+
+    def __init__(self,
+                 interval: float,
+                 jitter: float = 0.0,
+                 overrun: str = 'coalesce',
+                 deadline: float = None):
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(
+                f"Overrun policy must be one of {OVERRUN_POLICIES}, got {overrun}")
+        self.interval = interval
+        self.overrun = overrun
+        self.deadline = deadline or interval
+        self.offset = random.uniform(0, jitter) if jitter > 0 else 0.0
+        self.missed = 0
+        self._stopped = threading.Event()
+
+    def ticks(self) -> Iterator[Tick]:
+        """Yield one Tick per cycle until stop() is called"""
+        origin = time.monotonic() + self.offset
+        index = 0
+        while True:
+            due = origin + index * self.interval
+            now = time.monotonic()
+            if now < due and self._stopped.wait(due - now):
+                return
+            if self._stopped.is_set():
+                return
+
+            now = time.monotonic()
+            yield Tick(index, due, now, now + self.deadline)
+
+            # Ticks that came due while the cycle was running
+            overdue = int((time.monotonic() - due) // self.interval)
+            if overdue < 1 or self.overrun == 'immediate':
+                index += 1
+            elif self.overrun == 'coalesce':
+                # Run the latest overdue tick now, standing in for the others
+                self.missed += overdue - 1
+                index += overdue
+            else:
+                self.missed += overdue
+                index += overdue + 1
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,219 @@
+import json
+import time
+import zlib
+from bisect import bisect
+from hashlib import blake2b
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set
+
+from loguru import logger
+
+from lease_store import Lease, LeaseStore
+
+# The replica owning this shard also owns the failover decision: it is the
+# only one that calls the deployment trigger
+FAILOVER_SHARD = 0
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Consistent hashing with bounded loads. Each replica is placed at
+    `vnodes` points on the ring, and a key goes to the first replica
+    point after the key's own hash, skipping replicas that already hold
+    their share (ceil(keys / replicas)). Replicas joining or leaving only
+    move keys near their points, and no replica ends up with more than
+    its share, so capacity grows linearly with replicas.
+    """
+
+    def __init__(self, members: Sequence[str], vnodes: int = 64):
+        points = sorted((_hash(f"{member}#{i}"), member)
+                        for member in members for i in range(vnodes))
+        self.members = sorted(members)
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def assign(self, keys: Sequence[str]) -> Dict[str, str]:
+        """Owner of every key; the same on every replica for the same members"""
+        if not self._hashes:
+            return {}
+        capacity = -(-len(keys) // len(self.members))
+        load = dict.fromkeys(self.members, 0)
+        owners = {}
+        for key_hash, key in sorted((_hash(key), key) for key in keys):
+            point = bisect(self._hashes, key_hash)
+            while load[self._owners[point % len(self._owners)]] >= capacity:
+                point += 1
+            owner = owners[key] = self._owners[point % len(self._owners)]
+            load[owner] += 1
+        return owners
+
+
+class ShardChanges(NamedTuple):
+    acquired: List[int]  # newly owned: restore their checkpoint
+    released: List[int]  # moving to another replica: checkpoint, then release()
+    lost: List[int]  # taken over while this replica was unresponsive: drop
+
+
+class ShardCoordinator:
+    """
+    Splits targets over the collector replicas. Targets hash into a fixed
+    number of shards; live replicas (those renewing their member lease)
+    are placed on a HashRing that says which replica should own each
+    shard; and a replica only works on a shard while it holds the shard's
+    lease, so two replicas never own one at the same time.
+
+    A shard changes hands by checkpoint: the previous owner saves the
+    shard's state and releases the lease, or, if it died, the lease
+    expires and the next owner starts from the last periodic checkpoint.
+    """
+
+    def __init__(self,
+                 store: LeaseStore,
+                 identity: str,
+                 shards: int = 32,
+                 lease_seconds: float = 30.0,
+                 vnodes: int = 64):
+        self.store = store
+        self.identity = identity
+        self.shards = shards
+        self.lease_seconds = lease_seconds
+        self.vnodes = vnodes
+        self.owned: Set[int] = set()
+        self.ring = HashRing([], vnodes)
+        self.assignment: Dict[str, str] = {}
+        # Wall time of the last heartbeat that renewed the leases
+        self.renewed = 0.0
+        self._shard_of: Dict[str, int] = {}
+
+    def shard_of(self, target: str) -> int:
+        shard = self._shard_of.get(target)
+        if shard is None:
+            shard = self._shard_of[target] = _hash(target) % self.shards
+        return shard
+
+    def owns(self, target: str) -> bool:
+        return self.shard_of(target) in self.owned
+
+    @property
+    def failover_owner(self) -> bool:
+        return FAILOVER_SHARD in self.owned
+
+    @staticmethod
+    def _shard_lease(shard: int) -> str:
+        return f"shard-{shard}"
+
+    def heartbeat(self) -> ShardChanges:
+        """
+        Renew this replica's leases, rebalance against the live replicas
+        and claim the shards this replica should own that are free.
+        Called at the start of every cycle.
+        """
+        started = time.time()
+        self.store.try_acquire(f"member-{self.identity}", self.identity, self.lease_seconds)
+        leases = self.store.list_leases()
+        now = time.time()
+
+        members = sorted(lease.holder for name, lease in leases.items()
+                         if name.startswith('member-') and lease.expires > now and lease.holder)
+        if self.identity not in members:
+            members = sorted(members + [self.identity])
+        if members != self.ring.members:
+            logger.info(f"Collector replicas: {members}")
+            self.ring = HashRing(members, self.vnodes)
+            self.assignment = self.ring.assign(
+                [self._shard_lease(shard) for shard in range(self.shards)])
+
+        lost = sorted(shard for shard in self.owned
+                      if leases.get(self._shard_lease(shard), Lease('', 0.0))
+                      .held_by_other(self.identity, now))
+        self.owned.difference_update(lost)
+
+        desired = {shard for shard in range(self.shards)
+                   if self.assignment[self._shard_lease(shard)] == self.identity}
+        released = sorted(self.owned - desired)
+
+        acquired = []
+        for shard in sorted(desired):
+            name = self._shard_lease(shard)
+            lease = leases.get(name)
+            if lease and lease.held_by_other(self.identity, now):
+                # Still with its previous owner until handed off or expired
+                continue
+            if self.store.try_acquire(name, self.identity, self.lease_seconds, known=lease):
+                if shard not in self.owned:
+                    self.owned.add(shard)
+                    acquired.append(shard)
+            elif shard in self.owned:
+                self.owned.discard(shard)
+                lost.append(shard)
+
+        self.renewed = started
+        if acquired or released or lost:
+            logger.info(f"Shards acquired: {acquired}, handing off: {released}, lost: {lost}; "
+                        f"owning {len(self.owned) - len(released)}/{self.shards}")
+        return ShardChanges(acquired, released, lost)
+
+    def expire(self) -> ShardChanges:
+        """
+        When a heartbeat failed: keep the shards while their leases are
+        surely still valid, then give them all up, as another replica may
+        take them over from then on
+        """
+        if time.time() < self.renewed + self.lease_seconds or not self.owned:
+            return ShardChanges([], [], [])
+        lost = sorted(self.owned)
+        self.owned.clear()
+        logger.warning(f"Leases lapsed without renewal, dropping shards {lost}")
+        return ShardChanges([], [], lost)
+
+    def release(self, shards: Sequence[int]):
+        """Release shards after their state was checkpointed"""
+        for shard in shards:
+            self.store.release(self._shard_lease(shard), self.identity)
+            self.owned.discard(shard)
+
+    def leave(self):
+        """Release every shard and the membership (after checkpointing), on shutdown"""
+        self.release(sorted(self.owned))
+        self.store.release(f"member-{self.identity}", self.identity)
+
+    def save_shard(self, shard: int, state: Dict):
+        self.store.save_state(self._shard_lease(shard), pack_state(state))
+
+    def load_shard(self, shard: int) -> Optional[Dict]:
+        data = self.store.load_state(self._shard_lease(shard))
+        return unpack_state(data) if data else None
+
+    def request_failover(self, alerts: List[Dict]):
+        """Ask the failover owner to trigger the deployment (non-owners)"""
+        self.store.save_state('failover-request', pack_state({
+            'replica': self.identity, 'time': time.time(), 'alerts': len(alerts)}))
+
+    def take_failover_request(self) -> Optional[Dict]:
+        """The pending failover request of another replica, once, if this replica owns the decision"""
+        if not self.failover_owner:
+            return None
+        data = self.store.load_state('failover-request')
+        if not data:
+            return None
+        request = unpack_state(data)
+        if time.time() - request['time'] > 2 * self.lease_seconds:
+            # Older than any owner handover takes; the alert has gone stale
+            return None
+        handled = self.store.load_state('failover-handled')
+        if handled and unpack_state(handled)['time'] >= request['time']:
+            return None
+        # Marked handled first: a trigger must never be sent twice
+        self.store.save_state('failover-handled', pack_state({'time': request['time']}))
+        return request
+
+
+def pack_state(state: Dict) -> bytes:
+    return zlib.compress(json.dumps(state).encode())
+
+
+def unpack_state(data: bytes) -> Dict:
+    return json.loads(zlib.decompress(data))
@@ -0,0 +1,83 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Collection cycle telemetry, served by the collector's metrics server
+# next to the prediction gauges. Histograms time code blocks with
+# histogram.labels(...).time()
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+query_duration = Histogram(
+    "collector_query_duration_seconds",
+    "Duration of each Prometheus query",
+    ["metric", "query_type"],
+    buckets=LATENCY_BUCKETS
+)
+query_response_bytes = Histogram(
+    "collector_query_response_bytes",
+    "Size of Prometheus query responses",
+    ["metric", "query_type"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+)
+query_series = Gauge(
+    "collector_query_series",
+    "Series returned by the most recent query of each metric",
+    ["metric", "query_type"]
+)
+stage_duration = Histogram(
+    "collector_stage_duration_seconds",
+    "Time spent in each stage of a collection cycle",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+prediction_duration = Histogram(
+    "collector_prediction_duration_seconds",
+    "Prediction round trip (model request and response, or embedded forward pass)",
+    ["mode"],
+    buckets=LATENCY_BUCKETS
+)
+alert_dispatch_duration = Histogram(
+    "collector_alert_dispatch_duration_seconds",
+    "Time taken by one delivery attempt to an alert channel or the failover trigger",
+    ["channel"],
+    buckets=LATENCY_BUCKETS
+)
+alert_queue_depth = Gauge(
+    "collector_alert_queue_depth",
+    "Alerts waiting for delivery per channel",
+    ["channel"]
+)
+alerts_dropped = Counter(
+    "collector_alerts_dropped_total",
+    "Alerts dropped because a channel's queue was full or delivery gave up",
+    ["channel"]
+)
+cycle_duration = Histogram(
+    "collector_cycle_duration_seconds",
+    "Duration of a whole collection cycle",
+    buckets=LATENCY_BUCKETS
+)
+cycle_lag = Gauge(
+    "collector_cycle_lag_seconds",
+    "How far the start of the latest cycle was behind its scheduled tick"
+)
+cycle_overruns = Counter(
+    "collector_cycle_overruns_total",
+    "Cycles that took longer than the collection interval"
+)
+ticks_missed = Counter(
+    "collector_ticks_missed_total",
+    "Scheduled cycles skipped or coalesced because an earlier cycle overran"
+)
+last_success = Gauge(
+    "collector_last_success_timestamp_seconds",
+    "Unix time of the last cycle that published predictions"
+)
+shards_owned = Gauge(
+    "collector_shards_owned",
+    "Target shards owned by this replica (sharding mode)"
+)
+shard_handoffs = Counter(
+    "collector_shard_handoffs_total",
+    "Shards that changed hands: acquired, released to another replica, or lost",
+    ["direction"]
+)
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from alert_manager import AlertManager, failed_before_sending  # noqa: E402
+from http_transport import CircuitOpenError  # noqa: E402
+
+
+def _connection_error(reason):
+    return requests.exceptions.ConnectionError(MaxRetryError(None, '/trigger', reason=reason))
+
+
+@pytest.mark.parametrize('error', [
+    CircuitOpenError("Circuit for api_gateway is open"),
+    requests.exceptions.ConnectTimeout("connect timed out"),
+    _connection_error(NewConnectionError(None, "Connection refused")),
+])
+def test_trigger_retried_when_nothing_was_sent(error):
+    assert failed_before_sending(error)
+
+
+@pytest.mark.parametrize('error', [
+    _connection_error(ProtocolError("Connection aborted.", ConnectionResetError(104, "reset"))),
+    requests.exceptions.ConnectionError(ConnectionResetError(104, "reset")),
+    requests.exceptions.ReadTimeout("read timed out"),
+    requests.exceptions.ChunkedEncodingError("broken body"),
+    ValueError("unexpected"),
+])
+def test_trigger_not_retried_once_it_may_have_arrived(error):
+    assert not failed_before_sending(error)
+
+
+class _GatewayTransport:
+    """Answers every deployment trigger with one status, counting the POSTs"""
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.posts = 0
+
+    def register_upstream(self, name, headers=None, auth=None):
+        pass
+
+    def post(self, upstream, url, **kwargs):
+        self.posts += 1
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = b'gateway error'
+        return response
+
+
+@pytest.mark.parametrize('status_code', [500, 502, 504])
+def test_answered_trigger_is_not_retried(monkeypatch, status_code):
+    monkeypatch.setenv('API_GATEWAY_URL', 'http://gateway/trigger')
+    monkeypatch.setenv('ALERT_RETRY_BACKOFF_SECONDS', '0')
+    transport = _GatewayTransport(status_code)
+    manager = AlertManager(transport=transport)
+    lane = manager.dispatcher.trigger_lane
+
+    lane.submit([{'rule': 'cpu_high'}])
+    assert lane.flush(timeout=5)
+    manager.dispatcher.stop(timeout=5)
+    assert transport.posts == 1
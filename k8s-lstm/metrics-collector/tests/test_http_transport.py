@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from http_transport import CircuitOpenError, HTTPTransport  # noqa: E402
+
+
+class _Response:
+    status_code = 200
+
+    def close(self):
+        pass
+
+
+def _open_circuit(transport, upstream):
+    breaker = transport._get_breaker(upstream)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    # Past the reset timeout: the next request is the half-open trial
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout - 1
+    return breaker
+
+
+@pytest.mark.parametrize('error', [requests.exceptions.ChunkedEncodingError,
+                                   requests.exceptions.ContentDecodingError,
+                                   requests.exceptions.InvalidURL])
+def test_failed_half_open_trial_reopens_circuit(monkeypatch, error):
+    transport = HTTPTransport()
+    breaker = _open_circuit(transport, 'prometheus')
+
+    def fail(*args, **kwargs):
+        raise error("broken response")
+    monkeypatch.setattr(transport.session, 'request', fail)
+    with pytest.raises(error):
+        transport.get('prometheus', 'http://prometheus:9090/api/v1/query')
+
+    # The trial is over: the circuit is open again, not stuck half-open
+    assert not breaker._half_open_trial
+    with pytest.raises(CircuitOpenError):
+        transport.get('prometheus', 'http://prometheus:9090/api/v1/query')
+
+    # and lets the next trial through once the reset timeout has passed
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout - 1
+    monkeypatch.setattr(transport.session, 'request', lambda *args, **kwargs: _Response())
+    assert transport.get('prometheus', 'http://prometheus:9090/api/v1/query').status_code == 200
+    assert breaker.opened_at is None
+
+
+def _failing_session(monkeypatch, transport):
+    timeouts = []
+
+    def fail(*args, **kwargs):
+        timeouts.append(kwargs.get('timeout'))
+        raise requests.exceptions.ConnectionError("connection reset")
+    monkeypatch.setattr(transport.session, 'request', fail)
+    return timeouts
+
+
+def test_deadline_cuts_timeouts_and_retries(monkeypatch):
+    transport = HTTPTransport()
+    timeouts = _failing_session(monkeypatch, transport)
+    monkeypatch.setattr(transport, '_backoff', lambda attempt: 1.0)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transport.get('prometheus', 'http://prometheus:9090/api/v1/query',
+                      timeout=(5, 30), deadline=time.monotonic() + 0.5)
+    # A retry would only start past the deadline: one attempt, cut to it
+    assert len(timeouts) == 1
+    assert all(0 < t <= 0.5 for t in timeouts[0])
+
+
+def test_retries_within_deadline(monkeypatch):
+    transport = HTTPTransport()
+    timeouts = _failing_session(monkeypatch, transport)
+    monkeypatch.setattr(transport, '_backoff', lambda attempt: 0.0)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transport.get('prometheus', 'http://prometheus:9090/api/v1/query',
+                      timeout=30, deadline=time.monotonic() + 60)
+    assert len(timeouts) == transport.max_retries + 1
+    assert all(t == 30 for t in timeouts)
+
+
+def test_passed_deadline_sends_nothing(monkeypatch):
+    transport = HTTPTransport()
+    timeouts = _failing_session(monkeypatch, transport)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        transport.get('prometheus', 'http://prometheus:9090/api/v1/query',
+                      timeout=30, deadline=time.monotonic() - 1)
+    assert timeouts == []
+    assert transport._get_breaker('prometheus').failures == 0
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lease_store import KubernetesLeaseStore, Lease, LeaseStore  # noqa: E402
+
+
+class _Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        pass
+
+
+class _FakeTransport:
+    """Records lease PUTs and answers GETs with the lease last written"""
+
+    def __init__(self, lease):
+        self.lease = lease
+        self.puts = []
+
+    def register_upstream(self, name, headers=None, auth=None):
+        pass
+
+    def request(self, upstream, method, url, **kwargs):
+        if method == 'PUT':
+            self.puts.append(kwargs['json'])
+            return _Response(200)
+        return _Response(200, self.lease)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv('KUBERNETES_SERVICE_HOST', 'kubernetes.default')
+    monkeypatch.setattr(KubernetesLeaseStore, 'SERVICE_ACCOUNT', str(tmp_path))
+    (tmp_path / 'token').write_text('token')
+    expired = time.strftime('%Y-%m-%dT%H:%M:%S.000000Z', time.gmtime(time.time() - 120))
+    transport = _FakeTransport({
+        'metadata': {'name': 'metrics-collector-shard-3', 'resourceVersion': '41'},
+        'spec': {'holderIdentity': 'collector-a', 'leaseDurationSeconds': 30,
+                 'renewTime': expired, 'leaseTransitions': 4}})
+    return KubernetesLeaseStore('monitoring', transport=transport), transport
+
+
+def test_lease_store_is_abstract():
+    with pytest.raises(TypeError):
+        LeaseStore()
+
+
+def test_takeover_of_a_listed_lease_counts_a_transition(store):
+    store, transport = store
+    known = store._lease(transport.lease)
+    assert known.transitions == 4
+
+    assert store.try_acquire('shard-3', 'collector-b', 30, known=known)
+    assert transport.puts[-1]['spec']['leaseTransitions'] == 5
+
+    # Renewing by the same holder keeps the count
+    renewed = Lease('collector-b', time.time() + 30, '42', 5)
+    assert store.try_acquire('shard-3', 'collector-b', 30, known=renewed)
+    assert transport.puts[-1]['spec']['leaseTransitions'] == 5
+
+
+def test_takeover_after_a_read_counts_a_transition(store):
+    store, transport = store
+    assert store.try_acquire('shard-3', 'collector-b', 30)
+    assert transport.puts[-1]['spec']['leaseTransitions'] == 5
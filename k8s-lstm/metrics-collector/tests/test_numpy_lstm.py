@@ -0,0 +1,67 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from embedded_predictor import EmbeddedPredictor  # noqa: E402
+from numpy_lstm import NumpyLSTM  # noqa: E402
+from preprocessing import PreprocessingSpec  # noqa: E402
+
+tf = pytest.importorskip('tensorflow')
+
+FEATURES, TARGETS, HORIZON, HIDDEN = 3, 2, 4, 8
+
+
+def build_model(seed: int = 0):
+    """A small model of the notebook's architecture, with random (non-zero) biases"""
+    layers = tf.keras.layers
+    inputs = layers.Input(shape=(None, FEATURES), name='input_sequences')
+    x = inputs
+    for i in range(2):
+        x = layers.LSTM(HIDDEN, return_sequences=True, name=f"lstm_{i + 1}")(x)
+    x = layers.MultiHeadAttention(num_heads=4, key_dim=HIDDEN // 4, name='multi_head_attention')(x, x)
+    x = layers.Lambda(lambda x: x[:, -1, :], name='last_timestep')(x)
+    x = layers.Dropout(0.2, name='dropout_final')(x)
+    x = layers.Dense(HIDDEN // 2, activation='relu', name='dense_1')(x)
+    x = layers.Dropout(0.2, name='dropout_dense')(x)
+    x = layers.Dense(TARGETS * HORIZON, name='output_dense')(x)
+    output = layers.Reshape((HORIZON, TARGETS), name='output_reshape')(x)
+    model = tf.keras.Model(inputs=inputs, outputs=output)
+
+    rng = np.random.default_rng(seed)
+    model.set_weights([rng.normal(0, 0.5, w.shape).astype(np.float32) for w in model.get_weights()])
+    return model
+
+
+@pytest.fixture(scope='module')
+def model_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('model') / 'lstm_model.h5')
+    model = build_model()
+    model.save(path, save_format='h5')
+    return path, model
+
+
+@pytest.mark.parametrize('batch,steps', [(1, 1), (5, 24), (3, 60)])
+def test_numpy_forward_pass_matches_keras(model_path, batch, steps):
+    path, model = model_path
+    x = np.random.default_rng(steps).normal(size=(batch, steps, FEATURES)).astype(np.float32)
+
+    expected = model.predict(x, verbose=0)
+    actual = NumpyLSTM.from_h5(path).predict(x)
+    assert actual.shape == (batch, HORIZON, TARGETS)
+    np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_embedded_predictor_matches_keras(model_path, tmp_path):
+    path, model = model_path
+    spec = PreprocessingSpec([0.02, 0.4, 1e-4], [-13.8, -22.0, -13.5], [20.8, 22.7], [37.8, 38.8])
+    spec.save(str(tmp_path))
+    raw = np.random.default_rng(1).uniform([500, 50, 1e5], [900, 70, 2e5],
+                                          size=(4, 24, FEATURES)).astype(np.float32)
+
+    expected = spec.inverse_targets(model.predict(spec.transform_features(raw), verbose=0))
+    actual = EmbeddedPredictor(path, str(tmp_path)).predict(raw)
+    np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-3)
@@ -0,0 +1,27 @@
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prometheus_collector import METRICS_QUERIES, TARGET_LABELS  # noqa: E402
+from query_planner import QueryPlanner, recording_rules  # noqa: E402
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', '..', '..', 'k8s-manifests', 'collector', 'recording_rules.yml')
+
+
+@pytest.mark.parametrize('target_label', [None, *TARGET_LABELS])
+def test_recorded_series_exist_for_every_target_label(target_label):
+    with open(RULES_PATH) as f:
+        recorded = set(re.findall(r'- record: (\S+)', f.read()))
+    planner = QueryPlanner(group_by=target_label, use_recording_rules=True)
+    assert set(planner.plan_all(METRICS_QUERIES).values()) <= recorded
+
+
+def test_checked_in_rules_are_generated():
+    planners = [QueryPlanner(group_by=level) for level in (None, *TARGET_LABELS)]
+    with open(RULES_PATH) as f:
+        assert f.read() == recording_rules(planners, METRICS_QUERIES)
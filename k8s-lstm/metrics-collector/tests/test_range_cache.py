@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from range_cache import RollingSeriesStore  # noqa: E402
+
+
+def _series(start, end, step=30.0):
+    timestamps = np.arange(start, end, step)
+    return timestamps, np.full(timestamps.size, 1.0)
+
+
+def test_evict_trims_metrics_without_new_data():
+    cache = RollingSeriesStore(window_seconds=600, step_seconds=30)
+    now = 1_800_000_000.0
+    cache.merge('cpu', _series(now - 600, now), now - 600, now)
+    assert cache.series('cpu')[0].size == 20
+
+    # Deltas come back empty: only what is still in the window is kept
+    cache.evict(now + 300)
+    assert cache.series('cpu')[0].min() >= now + 300 - 600
+    assert not cache.needs_seed('cpu', now + 300)
+
+
+def test_vanished_metric_ends_up_empty():
+    cache = RollingSeriesStore(window_seconds=600, step_seconds=30)
+    now = 1_800_000_000.0
+    cache.merge('cpu', _series(now - 600, now), now - 600, now)
+
+    cache.evict(now + 3600)
+    assert cache.series('cpu')[0].size == 0
+    assert cache.needs_seed('cpu', now + 3600)
+    assert cache.query_range('cpu', now + 3600) == (now + 3600 - 600, now + 3600)
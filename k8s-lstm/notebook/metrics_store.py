@@ -0,0 +1,263 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from training_data import NUMERIC_COLUMNS
+
+# Labels stored as their own dictionary-encoded columns; any other labels
+# of a series go to the JSON `labels` column. The exporter CronJob
+# (k8s-manifests/metrics-data/data-sync.yml) writes the same schema.
+LABEL_COLUMNS = ['instance', 'node', 'namespace', 'pod', 'container']
+
+SCHEMA = pa.schema(
+    [('timestamp', pa.timestamp('ms', tz='UTC')), ('value', pa.float64())]
+    + [(label, pa.dictionary(pa.int32(), pa.string())) for label in LABEL_COLUMNS]
+    + [('labels', pa.string())])
+
+# <root>/date=YYYY-MM-DD/metric=<name>/part-<run>-<n>.parquet: a query for
+# a time range and a set of metrics only lists and opens those directories
+PARTITIONING = ds.partitioning(
+    pa.schema([('date', pa.string()), ('metric', pa.string())]), flavor='hive')
+
+# Scan batch size and readahead bound the memory a scan holds at any time
+BATCH_SIZE = 64 * 1024
+BATCH_READAHEAD = 2
+FRAGMENT_READAHEAD = 1
+
+
+def filesystem(uri: str):
+    """
+    Filesystem and path of a store: a local directory (memory-mapped
+    reads) or s3://bucket/prefix. S3_ENDPOINT_URL points the S3 client at
+    an S3-compatible server (MinIO, ...) instead of AWS; credentials come
+    from the usual AWS_* variables.
+    """
+    if uri.startswith('s3://'):
+        endpoint = os.getenv('S3_ENDPOINT_URL')
+        options = {}
+        if endpoint:
+            scheme, _, host = endpoint.rpartition('://')
+            options.update(endpoint_override=host, scheme=scheme or 'https')
+        return fs.S3FileSystem(region=os.getenv('AWS_REGION', 'us-east-1'), **options), uri[len('s3://'):]
+    return fs.LocalFileSystem(use_mmap=True), os.path.abspath(uri)
+
+
+def samples_table(rows: Sequence[Dict]) -> pa.Table:
+    """
+    Exporter rows (timestamp in epoch seconds, metric_name, value and one
+    key per label) as a table of SCHEMA plus the date and metric partition
+    columns, sorted by metric and time
+    """
+    timestamps = np.array([float(row['timestamp']) for row in rows])
+    columns = {
+        'timestamp': pa.array((timestamps * 1000).astype(np.int64), pa.timestamp('ms', tz='UTC')),
+        'value': pa.array([float(row['value']) for row in rows], pa.float64()),
+    }
+    reserved = {'timestamp', 'metric_name', 'value'}.union(LABEL_COLUMNS)
+    for label in LABEL_COLUMNS:
+        columns[label] = pa.array([row.get(label) or None for row in rows],
+                                  pa.string()).dictionary_encode()
+    extra = [{k: v for k, v in sorted(row.items()) if k not in reserved and v} for row in rows]
+    columns['labels'] = pa.array([json.dumps(labels) if labels else None for labels in extra],
+                                 pa.string())
+    columns['date'] = pa.array(
+        timestamps.astype(np.int64).astype('datetime64[s]').astype('datetime64[D]').astype(str),
+        pa.string())
+    columns['metric'] = pa.array([row['metric_name'] for row in rows], pa.string())
+    table = pa.table(columns)
+    return table.sort_by([('metric', 'ascending'), ('timestamp', 'ascending')])
+
+
+def write_samples(table: pa.Table, uri: str, run_id: str):
+    """Add a table from samples_table() to the store as new zstd Parquet files"""
+    filesystem_, root = filesystem(uri)
+    ds.write_dataset(
+        table, root, filesystem=filesystem_, format='parquet', partitioning=PARTITIONING,
+        basename_template=f"part-{run_id}-{{i}}.parquet",
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+        existing_data_behavior='overwrite_or_ignore',
+        # Several row groups per compacted file, each skippable by time
+        max_rows_per_group=128 * 1024,
+        # Keeps rows in time order within every file, for row group statistics
+        use_threads=False)
+
+
+def open_store(uri: str) -> ds.Dataset:
+    filesystem_, root = filesystem(uri)
+    # With the schema given up front only the directory tree is listed;
+    # files are opened when a scan reaches them
+    schema = SCHEMA.append(pa.field('date', pa.string())).append(pa.field('metric', pa.string()))
+    return ds.dataset(root, schema=schema, format='parquet', filesystem=filesystem_,
+                      partitioning=PARTITIONING)
+
+
+def _utc(t) -> pd.Timestamp:
+    t = pd.Timestamp(t)
+    return t.tz_localize('UTC') if t.tzinfo is None else t.tz_convert('UTC')
+
+
+def time_filter(start=None, end=None, metrics: Optional[Sequence[str]] = None) -> Optional[ds.Expression]:
+    """
+    Samples at start <= timestamp < end (naive times are UTC) of metrics.
+    The date and metric terms prune partitions, the timestamp terms skip
+    row groups by their statistics.
+    """
+    terms = []
+    if start is not None:
+        start = _utc(start)
+        terms += [ds.field('date') >= start.strftime('%Y-%m-%d'),
+                  ds.field('timestamp') >= pa.scalar(start, pa.timestamp('ms', tz='UTC'))]
+    if end is not None:
+        end = _utc(end)
+        terms += [ds.field('date') <= (end - pd.Timedelta(1, 'ms')).strftime('%Y-%m-%d'),
+                  ds.field('timestamp') < pa.scalar(end, pa.timestamp('ms', tz='UTC'))]
+    if metrics is not None:
+        terms.append(ds.field('metric').isin(list(metrics)))
+    expression = None
+    for term in terms:
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def scan(store, start=None, end=None, metrics: Optional[Sequence[str]] = None,
+         columns: Sequence[str] = ('timestamp', 'metric', 'value'),
+         batch_size: int = BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+    """Record batches of only the given columns, one store fragment at a time"""
+    if isinstance(store, str):
+        store = open_store(store)
+    return store.to_batches(columns=list(columns), filter=time_filter(start, end, metrics),
+                            batch_size=batch_size, batch_readahead=BATCH_READAHEAD,
+                            fragment_readahead=FRAGMENT_READAHEAD)
+
+
+def read_resampled(store, start, end,
+                   metrics: Sequence[str] = NUMERIC_COLUMNS,
+                   freq: str = '1min',
+                   batch_size: int = BATCH_SIZE) -> pd.DataFrame:
+    """
+    Mean of every metric over all its series per freq bucket between
+    start and end, the frame training_data.resample() makes from the
+    dataset CSV (without event_type, which is not exported); buckets
+    missing a metric are dropped.
+
+    Samples are streamed and added into per-bucket sums and counts, so
+    memory is those (16 bytes per metric and bucket: about 42 MB for five
+    metrics over a year of minutes) plus a few scan batches, however
+    many samples the range holds.
+    """
+    start, end = _utc(start), _utc(end)
+    step = pd.Timedelta(freq).value // 1_000_000
+    origin = start.floor(freq).value // 1_000_000
+    num_buckets = -(-(end.value // 1_000_000 - origin) // step)
+    sums = np.zeros(len(metrics) * num_buckets)
+    counts = np.zeros(len(metrics) * num_buckets, dtype=np.int64)
+    metric_names = pa.array(list(metrics), pa.string())
+
+    for batch in scan(store, start, end, metrics, batch_size=batch_size):
+        values = batch.column('value').to_numpy(zero_copy_only=False)
+        times = batch.column('timestamp').cast(pa.int64()).to_numpy()
+        metric_rows = pc.index_in(batch.column('metric'), value_set=metric_names).to_numpy(
+            zero_copy_only=False)
+        present = ~np.isnan(values)
+        flat = (metric_rows[present] * num_buckets + (times[present] - origin) // step).astype(np.int64)
+        if not flat.size:
+            continue
+        # A batch comes from one file, so one metric over a few minutes:
+        # count over that span only
+        low = flat.min()
+        batch_counts = np.bincount(flat - low)
+        counts[low:low + batch_counts.size] += batch_counts
+        sums[low:low + batch_counts.size] += np.bincount(flat - low, weights=values[present])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    frame = pd.DataFrame(means.reshape(len(metrics), num_buckets).T, columns=list(metrics))
+    frame.insert(0, 'timestamp', pd.to_datetime(origin + step * np.arange(num_buckets), unit='ms'))
+    return frame.dropna().reset_index(drop=True)
+
+
+def read_samples(store, start=None, end=None, metrics: Optional[Sequence[str]] = None,
+                 columns: Sequence[str] = ('timestamp', 'metric', 'value', *LABEL_COLUMNS, 'labels')
+                 ) -> pa.Table:
+    """The samples themselves, for ranges that fit in memory"""
+    if isinstance(store, str):
+        store = open_store(store)
+    return store.to_table(columns=list(columns), filter=time_filter(start, end, metrics))
+
+
+def convert_csv(paths: Sequence[str], uri: str) -> int:
+    """Add CSV files of the former exporter (prometheus_metrics.csv) to the store"""
+    total = 0
+    for path in paths:
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            # The exporter wrote naive ISO times in the pod's time zone, UTC
+            row['timestamp'] = datetime.fromisoformat(row['timestamp']).replace(
+                tzinfo=timezone.utc).timestamp()
+        if rows:
+            # Every export was named prometheus_metrics.csv: name the files
+            # after the whole path, so converting again replaces them
+            run_id = 'csv-' + hashlib.blake2b(os.path.abspath(path).encode(), digest_size=6).hexdigest()
+            write_samples(samples_table(rows), uri, run_id)
+        total += len(rows)
+        print(f"{path}: {len(rows)} samples")
+    return total
+
+
+def compact(uri: str, date: str):
+    """
+    Rewrite every metric partition of a date as one file, sorted by time.
+    The exporter adds small files every run; reading a year is much
+    faster over one file per day and metric.
+    """
+    filesystem_, root = filesystem(uri)
+    store = open_store(uri)
+    # A name of its own, as files of an earlier compaction are replaced too
+    run_id = f"compact-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}"
+    for info in filesystem_.get_file_info(fs.FileSelector(f"{root}/date={date}")):
+        if info.type != fs.FileType.Directory:
+            continue
+        metric = info.base_name.split('=', 1)[1]
+        old = [f.path for f in filesystem_.get_file_info(fs.FileSelector(info.path))
+               if f.type == fs.FileType.File]
+        if len(old) <= 1:
+            continue
+        table = store.to_table(filter=(ds.field('date') == date) & (ds.field('metric') == metric))
+        write_samples(table.sort_by('timestamp'), uri, run_id)
+        for path in old:
+            filesystem_.delete_file(path)
+        print(f"date={date}/metric={metric}: {len(old)} files, {table.num_rows} samples")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the partitioned Parquet metrics store")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="add CSV files of the former exporter")
+    convert.add_argument('store', help="directory or s3://bucket/prefix")
+    convert.add_argument('csv', nargs='+')
+    compact_ = commands.add_parser('compact', help="merge the files of past dates")
+    compact_.add_argument('store', help="directory or s3://bucket/prefix")
+    compact_.add_argument('dates', nargs='+', help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        print(f"{convert_csv(args.csv, args.store)} samples added to {args.store}")
+    else:
+        for date in args.dates:
+            compact(args.store, date)
+
+
+if __name__ == '__main__':
+    main()
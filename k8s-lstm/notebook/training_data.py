@@ -0,0 +1,175 @@
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Model inputs and outputs, in model order (FEATURE_NAMES / TARGET_NAMES of
+# the model service and collector)
+FEATURE_COLUMNS = ['disk_io', 'node_temperature', 'pod_lifetime_seconds']
+TARGET_COLUMNS = ['node_cpu_usage', 'node_memory_usage']
+
+# Columns averaged when resampling
+NUMERIC_COLUMNS = [
+    'disk_io',
+    'node_temperature',
+    'node_cpu_usage',
+    'node_memory_usage',
+    'pod_lifetime_seconds',
+]
+
+
+def bucket_mode(buckets: np.ndarray, values: np.ndarray, num_buckets: int) -> np.ndarray:
+    """
+    Most frequent value per bucket, ties going to the smallest value as
+    with Series.mode().iloc[0], None where a bucket has no values. Counts
+    every (bucket, value) pair in one bincount instead of calling mode()
+    per bucket.
+    """
+    present = pd.notna(values)
+    categories, codes = np.unique(values[present], return_inverse=True)
+    modes = np.full(num_buckets, None, dtype=object)
+    if not len(categories):
+        return modes
+    counts = np.bincount(buckets[present] * len(categories) + codes,
+                         minlength=num_buckets * len(categories))
+    counts = counts.reshape(num_buckets, len(categories))
+    # categories are sorted, and argmax takes the first of equal counts
+    filled = counts.any(axis=1)
+    modes[filled] = categories[counts.argmax(axis=1)[filled]]
+    return modes
+
+
+def resample(df: pd.DataFrame, freq: str = '1min') -> pd.DataFrame:
+    """
+    Mean of the numeric columns and most frequent event_type per time
+    bucket of freq; buckets with a missing value are dropped
+    """
+    df = df.set_index('timestamp')
+    resampled = df[NUMERIC_COLUMNS].resample(freq).mean()
+
+    if 'event_type' in df:
+        # Bucket of every row: resample bins are closed on the left
+        buckets = resampled.index.searchsorted(df.index, side='right') - 1
+        resampled['event_type'] = bucket_mode(
+            buckets, df['event_type'].to_numpy(), len(resampled))
+
+    return resampled.reset_index().dropna()
+
+
+class SlidingWindows:
+    """
+    Training windows over a time-ordered series: window i takes
+    features[i:i + sequence_length] as input and the prediction_horizon
+    target rows after it as output.
+
+    The rows are stored once, as contiguous float32 arrays. X and y are
+    read-only sliding-window views over them rather than copies, and
+    dataset() gathers each batch from the rows inside the tf.data
+    pipeline, so memory grows with the rows, not rows x sequence_length.
+    """
+
+    def __init__(self,
+                 features: np.ndarray,
+                 targets: np.ndarray,
+                 timestamps: np.ndarray,
+                 sequence_length: int = 24,
+                 prediction_horizon: int = 12):
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.targets = np.ascontiguousarray(targets, dtype=np.float32)
+        self.timestamps = np.asarray(timestamps)
+        self.sequence_length = sequence_length
+        self.prediction_horizon = prediction_horizon
+
+    def __len__(self) -> int:
+        return max(0, len(self.features) - self.sequence_length - self.prediction_horizon + 1)
+
+    @property
+    def num_features(self) -> int:
+        return self.features.shape[1]
+
+    @property
+    def X(self) -> np.ndarray:
+        """[windows, sequence_length, features] view"""
+        windows = sliding_window_view(self.features, self.sequence_length, axis=0)
+        return windows[:len(self)].transpose(0, 2, 1)
+
+    @property
+    def y(self) -> np.ndarray:
+        """[windows, prediction_horizon, targets] view"""
+        windows = sliding_window_view(
+            self.targets[self.sequence_length:], self.prediction_horizon, axis=0)
+        return windows[:len(self)].transpose(0, 2, 1)
+
+    @property
+    def window_timestamps(self) -> np.ndarray:
+        """Time of the first predicted step of every window"""
+        return self.timestamps[self.sequence_length:self.sequence_length + len(self)]
+
+    def windows(self, start: int, stop: int) -> 'SlidingWindows':
+        """Windows start..stop, over only the rows they cover (no copy)"""
+        stop = min(stop, len(self))
+        end = stop + self.sequence_length + self.prediction_horizon - 1
+        return SlidingWindows(self.features[start:end], self.targets[start:end],
+                              self.timestamps[start:end],
+                              self.sequence_length, self.prediction_horizon)
+
+    def split(self, *fractions: float) -> List['SlidingWindows']:
+        """Chronological split at fractions of the windows: split(0.7, 0.9) -> train, val, test"""
+        bounds = [0] + [int(fraction * len(self)) for fraction in fractions] + [len(self)]
+        return [self.windows(start, stop) for start, stop in zip(bounds, bounds[1:])]
+
+    def fit_scalers(self, scaler_features, scaler_targets):
+        """Fit scikit-learn scalers on the rows the windows read features and targets from"""
+        scaler_features.fit(self.features[:len(self) + self.sequence_length - 1])
+        scaler_targets.fit(self.targets[self.sequence_length:])
+
+    def scaled(self, scaler_features, scaler_targets) -> 'SlidingWindows':
+        """The same windows over scaled rows (the rows are scaled once, not per window)"""
+        return SlidingWindows(scaler_features.transform(self.features),
+                              scaler_targets.transform(self.targets),
+                              self.timestamps, self.sequence_length, self.prediction_horizon)
+
+    def dataset(self, batch_size: int = 64, shuffle: bool = True, seed: int = None):
+        """
+        tf.data pipeline of (X, y) batches. Only window start indices go
+        through the pipeline; each batch is gathered from the rows in
+        the graph and prefetched while the previous one trains. With
+        shuffle the windows are reshuffled every epoch, as
+        model.fit(shuffle=True) does for arrays.
+        """
+        import tensorflow as tf
+
+        features = tf.constant(self.features)
+        targets = tf.constant(self.targets)
+        inputs = tf.range(self.sequence_length, dtype=tf.int64)
+        outputs = tf.range(self.prediction_horizon, dtype=tf.int64) + self.sequence_length
+
+        def gather(starts):
+            starts = starts[:, tf.newaxis]
+            return tf.gather(features, starts + inputs), tf.gather(targets, starts + outputs)
+
+        starts = tf.data.Dataset.range(len(self))
+        if shuffle:
+            starts = starts.shuffle(len(self), seed=seed, reshuffle_each_iteration=True)
+        return (starts.batch(batch_size)
+                .map(gather, num_parallel_calls=tf.data.AUTOTUNE)
+                .prefetch(tf.data.AUTOTUNE))
+
+
+def prepare_windows(df: pd.DataFrame,
+                    sequence_length: int = 24,
+                    prediction_horizon: int = 12,
+                    feature_columns: Sequence[str] = FEATURE_COLUMNS,
+                    target_columns: Sequence[str] = TARGET_COLUMNS) -> SlidingWindows:
+    """SlidingWindows over the rows of df in timestamp order"""
+    if len(df) < sequence_length + prediction_horizon:
+        raise ValueError(
+            f"Insufficient data: need at least "
+            f"{sequence_length + prediction_horizon} rows, got {len(df)}")
+
+    df = df.sort_values('timestamp', kind='stable')
+    return SlidingWindows(df[list(feature_columns)].to_numpy(np.float32),
+                          df[list(target_columns)].to_numpy(np.float32),
+                          df['timestamp'].to_numpy(),
+                          sequence_length, prediction_horizon)